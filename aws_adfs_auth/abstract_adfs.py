@@ -1,149 +1,259 @@
-from robobrowser import RoboBrowser
 import sys
-import boto3
-import xml.etree.ElementTree as ET
-import configparser
 import getpass
-import base64
-from . import configuration
+import os
+import http.cookiejar
+import requests
+import time
+from urllib.parse import urljoin, urlsplit
+import fnmatch
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import account_aliases, configuration, cache, credentials_file, events, html_extract, role_selection, saml, \
+    secret, sts, timings, transport
+
+
+class AuthenticationError(Exception):
+    """Raised when the authentication can not continue, e.g. because a prompt is needed in non-interactive mode."""
+    pass
+
+
+class AssumeRoleError(AuthenticationError):
+    """Raised when none of the roles could be assumed with the SAML assertion."""
+    pass
+
+
+class RoleNotFoundError(AuthenticationError):
+    """Raised when the requested role is not part of the SAML assertion."""
+    pass
+
+
+class StsRequestError(AuthenticationError):
+    """Raised when STS did not return the credentials of a role, code is the STS error code (or the exception class)."""
+
+    def __init__(self, role_arn, error):
+        AuthenticationError.__init__(self, 'could not assume {0}: {1}'.format(role_arn, error))
+        self.code = sts.error_code(error)
 
 
 class AbstractADFS(object):
-    def __init__(self, logger, config):
+    def __init__(self, logger, config, options=None):
         self.logger = logger
         self.config = config
+        self.options = options
         self.configure = configuration.Configure(logger)
+        self.cache = cache.create(logger, config)
+        self.role_history = role_selection.RoleHistory(logger)
         if not self.config.has_section('aws_accounts'):
             self.config.add_section('aws_accounts')
-        self.aws_accounts = config._sections['aws_accounts']
+        self.aws_accounts = account_aliases.known(config)
+
+    def interactive(self):
+        """Function to check if we are allowed to prompt the user."""
+        return not (self.options is not None and getattr(self.options, 'non_interactive', False))
+
+    def prompts_on_stdio(self):
+        """Function to check if we may ask for input on stdin/stdout (the username, the role). The AWS SDKs pipe
+        both for --credential-process, only the password prompt works there as it uses the terminal."""
+        return self.interactive() and not (self.options is not None and getattr(self.options, 'credential_process', False))
+
+    def set_username_password(self, username, password):
+        """Function to provide the credentials up front, e.g. for batch refreshes."""
+        self.preset_credentials = (username, password)
 
     def get_username_password(self):
-        print('Please enter your federation credentials')
-        self.username = self.configure.input_and_set(self.config, 'msadfs', 'username', 'Username')
-        self.password = getpass.getpass()
-        print('')
+        if getattr(self, 'preset_credentials', None) is not None:
+            self.username, self.password = self.preset_credentials
+            self.preset_credentials = None
+            return self.username, self.password
+        # credentials can be given without prompting by the environment, stdin or the keyring
+        username = os.environ.get('AWS_ADFS_USERNAME')
+        password = os.environ.get('AWS_ADFS_PASSWORD')
+        if username is None and not self.prompts_on_stdio():
+            username = self.config.get('msadfs', 'username', fallback=None)
+            if not username:
+                raise AuthenticationError('no username given, please set AWS_ADFS_USERNAME or [msadfs] username')
+        if password is None and self.options is not None and getattr(self.options, 'password_stdin', False):
+            password = sys.stdin.readline().rstrip('\r\n')
+        if password is None and username is not None:
+            password = self.keyring_password(username)
+
+        if username is None or password is None:
+            if not self.interactive():
+                raise AuthenticationError('no password given, please use AWS_ADFS_PASSWORD, --password-stdin or the keyring')
+            print('Please enter your federation credentials')
+        if username is None:
+            username = self.configure.input_and_set(self.config, 'msadfs', 'username', 'Username')
+        if password is None:
+            password = getpass.getpass()
+            print('')
+        self.username, self.password = username, password
         return self.username, self.password
 
+    def keyring_password(self, username):
+        """Function to look up the password in the system keyring if enabled with [provider] use_keyring."""
+        if not self.config.getboolean('provider', 'use_keyring', fallback=False):
+            return None
+        try:
+            import keyring
+        except ImportError:
+            self.logger.warning("use_keyring is set, but the keyring package is not installed")
+            return None
+        return keyring.get_password('aws_adfs_auth', username)
+
     def delete_username_password(self):
-        self.username = '##############################################'
-        self.password = '##############################################'
-        del self.username
-        del self.password
+        """Function to drop the references to the credentials. Python strings cannot be overwritten, so the
+        password is passed on to the IdP in a SecretBuffer, which is zeroed after the login."""
+        self.username = None
+        self.password = None
 
     def init_browser(self):
-        # Using RoboBrowser to get the SAML token
-        self.browser = RoboBrowser(parser='lxml')
-        self.browser.open(self.config.get('provider', 'idpentryurl'))
-        return self.browser
+        # Using a plain http session to get the SAML token, with the cookies of the last session
+        # so that a still valid ADFS SSO cookie skips the login form
+        self.session = self.get_transport().session()
+        self.load_cookies(self.session)
+        return self.open(self.config.get('provider', 'idpentryurl'))
 
-    def handle_saml(self):
-        self.logger.debug("handling saml response and finding out aws roles")
-        browser = self.browser
-        # Decode the response and extract the SAML assertion
-        assertion = ''
+    def open(self, url, method='GET', data=None, headers=None):
+        """Function to request a page and extract its forms and the SAMLResponse in one streaming pass."""
+        self.logger.debug("%s %s" % (method, url))
+        start = time.monotonic()
+        try:
+            with timings.span('idp_' + method.lower()):
+                response = self.session.request(method, url, data=data, headers=headers, stream=True)
+        except requests.RequestException as e:
+            events.emit('idp', idp=urlsplit(url).netloc, method=method, status=None,
+                        duration=round(time.monotonic() - start, 3), error=type(e).__name__)
+            raise AuthenticationError('could not reach the IdP at {0}: {1}'.format(url, e))
+        events.emit('idp', idp=urlsplit(url).netloc, method=method, status=response.status_code,
+                    duration=round(time.monotonic() - start, 3), error=None)
+        self.page_url = response.url
+        try:
+            # the body is streamed, so this includes reading it
+            with timings.span('html_parse'):
+                self.page = html_extract.extract_response(response, stop_after_form='loginForm')
+        except requests.RequestException as e:
+            raise AuthenticationError('could not read the response of the IdP at {0}: {1}'.format(url, e))
+        return self.page
+
+    def get_form(self, form_id):
+        """Function to return a form of the current page or None."""
+        return self.page.get_form(form_id)
 
-        # Look for the SAMLResponse attribute of the input tag (determined by
-        # analyzing the debug print lines above)
-        for inputtag in browser.find_all('input'):
-            if(inputtag.get('name') == 'SAMLResponse'):
-                assertion = inputtag.get('value')
+    def submit_form(self, form, secrets=None):
+        """Function to submit a form of the current page. The secrets (field name -> SecretBuffer) are
+        url encoded into a SecretBuffer as well, which is zeroed as soon as the response was read."""
+        url = urljoin(self.page_url, form.action)
+        if not secrets:
+            return self.open(url, method=form.method, data=form.fields)
+        with secret.encode_form(form.fields, secrets) as body:
+            return self.open(url, method=form.method, data=body, headers={'Content-Type': secret.FORM_CONTENT_TYPE})
 
-        # Better error handling is required for production use.
+    def persist_session(self):
+        """Function to check if the ADFS session cookies should be kept between runs."""
+        return self.config.getboolean('provider', 'persist_session', fallback=True)
+
+    def cookie_file(self):
+        return self.config.get('provider', 'cookie_file', fallback=self.configure.aws_folder + '/adfs_auth_cookies')
+
+    def load_cookies(self, session):
+        """Function to load the cookies of the last session into the http session."""
+        cookiejar = http.cookiejar.LWPCookieJar(self.cookie_file())
+        if self.persist_session() and os.path.isfile(self.cookie_file()):
+            try:
+                with timings.span('cookies_load'):
+                    cookiejar.load(ignore_discard=True)
+                self.logger.debug("loaded %d cookies from %s" % (len(cookiejar), self.cookie_file()))
+            except (IOError, http.cookiejar.LoadError) as e:
+                self.logger.info("could not load cookies from %s: %s" % (self.cookie_file(), e))
+        session.cookies = cookiejar
+
+    def save_cookies(self):
+        """Function to store the cookies of the http session, readable only by the current user."""
+        if not self.persist_session():
+            return
+        cookiejar = http.cookiejar.LWPCookieJar(self.cookie_file())
+        for cookie in self.session.cookies:
+            cookiejar.set_cookie(cookie)
+        self.logger.debug("storing %d cookies to %s" % (len(cookiejar), self.cookie_file()))
+        os.close(os.open(self.cookie_file(), os.O_WRONLY | os.O_CREAT, 0o600))
+        os.chmod(self.cookie_file(), 0o600)
+        with timings.span('cookies_save'):
+            cookiejar.save(ignore_discard=True)
+
+    def has_saml_response(self):
+        """Function to check if the current page already carries the SAML assertion."""
+        return self.page.saml_response is not None
+
+    def handle_saml(self, assertion):
+        self.logger.debug("handling saml response and finding out aws roles")
+        assertion = assertion or ''
+
+        # e.g. the IdP shows the login form again because of a wrong password or an expired account
         if (assertion == ''):
-            # TODO: Insert valid error checking/handling
-            print('Response did not contain a valid SAML assertion')
-            sys.exit(0)
+            raise AuthenticationError('the response did not contain a valid SAML assertion, the login was rejected')
 
         # Debug only
         # print(base64.b64decode(assertion))
 
-        # Parse the returned assertion and extract the authorized roles
-        awsroles = []
-        root = ET.fromstring(base64.b64decode(assertion))
-        for saml2attribute in root.iter('{urn:oasis:names:tc:SAML:2.0:assertion}Attribute'):
-            if (saml2attribute.get('Name') == 'https://aws.amazon.com/SAML/Attributes/Role'):
-                for saml2attributevalue in saml2attribute.iter('{urn:oasis:names:tc:SAML:2.0:assertion}AttributeValue'):
-                    awsroles.append(saml2attributevalue.text)
-
-        # Note the format of the attribute value should be role_arn,principal_arn
-        # but lots of blogs list it as principal_arn,role_arn so let's reverse
-        # them if needed
-        for awsrole in awsroles:
-            chunks = awsrole.split(',')
-            if'saml-provider' in chunks[0]:
-                newawsrole = chunks[1] + ',' + chunks[0]
-                index = awsroles.index(awsrole)
-                awsroles.insert(index, newawsrole)
-                awsroles.remove(awsrole)
-
-        # If I have more than one role, ask the user which one they want,
-        # otherwise just proceed
+        awsroles = self.parse_roles(assertion)
+
+        if self.options is not None and getattr(self.options, 'all_roles', False):
+            self.handle_all_roles(awsroles, assertion)
+            return
+
+        # We are using the specified profile in the config file (or the requested one) for the credentials
+        profile = self.profile_name()
+
+        # If the profile was assumed before, we reuse its role, otherwise if I have
+        # more than one role, ask the user which one they want, otherwise just proceed
+        cached = self.cache.get(profile)
+        cached_role = self.saml.by_arn.get(cached['RoleArn']) if cached is not None else None
         print("")
-        if len(awsroles) > 1:
-            i = 0
-            print("Please choose the role you would like to assume:")
-            for awsrole in awsroles:
-                role = awsrole.split(',')[0]
-                roleName = role.split(':')[5]
-                accountId = role.split(':')[4]
-                if accountId in self.aws_accounts:
-                    print('[{:2d}]: {:10s} {:30s}:{:10s}'.format(i, accountId, self.aws_accounts.get(accountId), roleName))
-                else:
-                    print('[', i, ']: ', role)
-                i += 1
-
-            selectedroleindex = self.configure.input_and_set(config=self.config, section='msadfs', option='selectedroleindex', label='Selection')
-
-            # Basic sanity check of input
-            if int(selectedroleindex) > (len(awsroles) - 1):
-                print('You selected an invalid role index, please try again')
-                sys.exit(0)
-
-            role_arn = awsroles[int(selectedroleindex)].split(',')[0]
-            principal_arn = awsroles[int(selectedroleindex)].split(',')[1]
+        requested_role = self.options is not None and getattr(self.options, 'role', None)
+        if requested_role:
+            matching = self.saml.find(requested_role)
+            if not matching:
+                raise RoleNotFoundError('no role matches {0}'.format(requested_role))
+            if len(matching) != 1:
+                raise AuthenticationError('{0} roles match {1}, please use the role ARN or <account alias>:<role name>'.format(
+                    len(matching), requested_role))
+            role = matching[0]
+        elif len(awsroles) > 1 and (self.cache_only() or not self.prompts_on_stdio()) and cached_role is not None:
+            role = cached_role
+        elif len(awsroles) > 1 and not self.prompts_on_stdio():
+            raise AuthenticationError('the SAML assertion contains {0} roles, please choose one with --role'.format(len(awsroles)))
+        elif len(awsroles) > 1:
+            # includes the time the user needs to choose
+            with timings.span('role_selection'):
+                role = role_selection.RolePicker(self.logger, self.role_history).pick(awsroles)
         else:
-            role_arn = awsroles[0].split(',')[0]
-            principal_arn = awsroles[0].split(',')[1]
+            role = awsroles[0]
+        role_arn = role.role_arn
+        self.role_history.record(role_arn)
+        self.role_history.save()
 
-        self.configure.store_config(self.config)
+        # e.g. the username entered at the prompt
+        if self.configure.changed:
+            self.configure.store_config(self.config)
 
         # Use the assertion to get an AWS STS token using Assume Role with SAML
-        stsResponse = boto3.client('sts').assume_role_with_saml(
-            RoleArn=role_arn,
-            PrincipalArn=principal_arn,
-            SAMLAssertion=assertion,
-            DurationSeconds=3600  # is currently the maximum
-        )
-
-        # Write the AWS STS token into the AWS credential file
-        filename = self.config.get('aws', 'credentials_file')
-
-        # Read in the existing config file
-        awsconfig = configparser.RawConfigParser()
-        awsconfig.read(filename)
+        stsResponse = self.assume_role(role.role_arn, role.principal_arn, assertion)
 
-        # We are using the specified profile in the config file to write the credentials
-        profile = self.config.get('provider', 'profile_name')
+        self.cache.store(profile, role_arn, stsResponse['Credentials'])
+        self.cache.save()
+        self.written_profiles = {profile: role_arn}
+        self.resolve_aliases(assertion, {role.account_id: stsResponse['Credentials']})
+        if self.cache_only():
+            # credential_process and exec take the credentials from the cache, nothing to write
+            return
+        if not self.writes_credentials_file():
+            print('The new access key pair of the {0} profile has been stored in the credential store {1}, it expires at {2}.'.format(
+                profile, self.cache.cache_file, stsResponse['Credentials']['Expiration']))
+            print('Use it with "aws_adfs_auth exec --profile {0} -- <command>" or write it to the credentials file with '
+                  '"aws_adfs_auth export --format ini --output {1}".'.format(profile, self.config.get('aws', 'credentials_file')))
+            return
 
-        if not awsconfig.has_section(profile):
-            awsconfig.add_section(profile)
-        else:
-            # we should backup the profile ones
-            if not awsconfig.has_section(profile+'.backup'):
-                awsconfig.add_section(profile+'.backup')
-                items = awsconfig.items(profile)
-                for item in items:
-                    awsconfig.set(profile+'.backup', item[0], item[1])
-
-        awsconfig.set(profile, 'output', self.config.get('aws', 'outputformat'))
-        awsconfig.set(profile, 'region', self.config.get('aws', 'region'))
-        awsconfig.set(profile, 'aws_access_key_id', stsResponse['Credentials']['AccessKeyId'])
-        awsconfig.set(profile, 'aws_secret_access_key', stsResponse['Credentials']['SecretAccessKey'])
-        awsconfig.set(profile, 'aws_session_token', stsResponse['Credentials']['SessionToken'])
-
-        # Write the updated config file
-        with open(filename, 'w+') as configfile:
-            awsconfig.write(configfile)
+        filename = self.write_credentials({profile: stsResponse['Credentials']})
 
         set_environment_variables = self.config.getboolean('aws', 'set_environment_variables')
         # Check if we should set the system properties as well
@@ -167,3 +277,240 @@ class AbstractADFS(object):
         if set_environment_variables:
             print('(UNIX/Mac Only) You can also use the environment variables in your shell with "source {0}"'.format(self.config.get('aws', 'environment_file')))
         print('----------------------------------------------------------------\n\n')
+
+    def parse_roles(self, assertion):
+        """Function to parse the assertion once and return its authorized roles."""
+        with timings.span('saml_decode'):
+            self.saml = saml.SamlAssertion(assertion, self.aws_accounts)
+        return self.saml.roles
+
+    def cache_only(self):
+        """Function to check if the credentials are only cached (for credential_process or exec) and not
+        written to the credentials file."""
+        return self.options is not None and (getattr(self.options, 'credential_process', False) or
+                                             getattr(self.options, 'command', None) == 'exec')
+
+    def profile_name(self):
+        """Function to return the profile to use for a single role."""
+        if self.options is not None and getattr(self.options, 'profile', None):
+            return self.options.profile
+        return self.config.get('provider', 'profile_name')
+
+    def get_transport(self):
+        """Function to return the transport (http settings and connection pools) of the IdP and STS requests."""
+        if getattr(self, 'transport', None) is None:
+            self.transport = transport.Transport(self.config)
+        return self.transport
+
+    def get_sts_client(self):
+        """Function to return the sts client, created once and shared by all threads."""
+        if getattr(self, 'sts_client', None) is None:
+            self.sts_client = sts.create_client(self.config, self.get_transport())
+        return self.sts_client
+
+    def assume_role(self, role_arn, principal_arn, assertion):
+        """Function to exchange the SAML assertion for temporary credentials of one role."""
+        self.logger.debug("assuming role %s" % role_arn)
+        start = time.monotonic()
+        duration = self.duration_seconds()
+        try:
+            try:
+                response = self.request_credentials(role_arn, principal_arn, assertion, duration)
+            except Exception as e:
+                if duration <= 3600 or not sts.is_duration_error(e):
+                    raise
+                # the MaxSessionDuration of the role is shorter than the requested lifetime
+                self.logger.warning("%s does not allow sessions of %d seconds, requesting 3600 seconds: %s" % (
+                    role_arn, duration, e))
+                response = self.request_credentials(role_arn, principal_arn, assertion, 3600)
+        except Exception as e:
+            events.emit('sts', role_arn=role_arn, duration=round(time.monotonic() - start, 3), error=sts.error_code(e))
+            if sts.is_request_error(e):
+                raise StsRequestError(role_arn, e)
+            raise
+        events.emit('sts', role_arn=role_arn, duration=round(time.monotonic() - start, 3), error=None)
+        return response
+
+    def request_credentials(self, role_arn, principal_arn, assertion, duration):
+        with timings.span('sts', role_arn=role_arn):
+            return self.get_sts_client().assume_role_with_saml(
+                RoleArn=role_arn,
+                PrincipalArn=principal_arn,
+                SAMLAssertion=assertion,
+                DurationSeconds=duration
+            )
+
+    def duration_seconds(self):
+        """Function to return the requested lifetime: [aws] duration_seconds or the SessionDuration of the assertion."""
+        configured = self.config.getint('aws', 'duration_seconds', fallback=None)
+        if getattr(self, 'saml', None) is None:
+            return configured or 3600
+        return self.saml.duration(configured)
+
+    def role_profile_name(self, role):
+        """Function to build the profile name for a role, using the account alias if there is one."""
+        return '-'.join(('{0}-{1}'.format(role.alias or role.account_id, role.role_name)).split())
+
+    def role_profiles(self, awsroles):
+        """Function to return the profile names of the roles (profile -> role). Names used by several roles, e.g.
+        for two accounts with the same alias, get the account id (and if still ambiguous the role path) appended."""
+        names = [self.role_profile_name(awsrole) for awsrole in awsroles]
+        counts = Counter(names)
+        names = [name if counts[name] == 1 else '{0}-{1}'.format(name, awsrole.account_id)
+                 for name, awsrole in zip(names, awsroles)]
+        # the same role name under several paths of one account
+        counts = Counter(names)
+        names = [name if counts[name] == 1 else '-'.join([name] + awsrole.resource.split('/')[1:-1])
+                 for name, awsrole in zip(names, awsroles)]
+        return OrderedDict(zip(names, awsroles))
+
+    def filter_roles(self, awsroles):
+        """Function to reduce the roles to the ones matching the role_patterns configuration (if any)."""
+        patterns = self.config.get('aws', 'role_patterns', fallback='').replace(',', '\n').split()
+        if not patterns:
+            return awsroles
+        selected = []
+        for awsrole in awsroles:
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns for name in awsrole.names()):
+                selected.append(awsrole)
+        return selected
+
+    def resolve_aliases(self, assertion, credentials):
+        """Function to look up the aliases of the accounts of the assertion which have none yet (with
+        [aws] resolve_aliases = True) and keep them in the config for the role listings of the next runs.
+
+        credentials are the STS credentials already obtained per account, for the other accounts a role
+        is assumed with the assertion."""
+        if self.cache_only() or not self.config.getboolean('aws', 'resolve_aliases', fallback=False):
+            return
+        looked_up = account_aliases.cached(self.config)
+        accounts = {}
+        for account_id, roles in self.saml.by_account.items():
+            if account_id in self.aws_accounts or account_id in looked_up:
+                continue
+            if account_id in credentials:
+                accounts[account_id] = lambda credentials=credentials[account_id]: credentials
+            else:
+                accounts[account_id] = lambda role=roles[0]: self.assume_role(
+                    role.role_arn, role.principal_arn, assertion)['Credentials']
+        if not accounts:
+            return
+        with timings.span('resolve_aliases', accounts=len(accounts)):
+            resolved = account_aliases.AliasResolver(self.logger, self.config, self.get_transport()).resolve(accounts)
+        if resolved:
+            account_aliases.store(self.config, resolved)
+            self.aws_accounts.update((account_id, alias) for account_id, alias in resolved.items() if alias)
+            self.configure.store_config(self.config)
+
+    def handle_all_roles(self, awsroles, assertion):
+        """Function to assume all (selected) roles in parallel with one assertion and store one profile per role."""
+        awsroles = self.filter_roles(awsroles)
+        if not awsroles:
+            if not self.interactive():
+                raise AuthenticationError('none of the roles in the SAML assertion matched the configured role_patterns')
+            print('None of the roles in the SAML assertion matched the configured role_patterns')
+            sys.exit(0)
+
+        roles = self.role_profiles(awsroles)
+        for profile, awsrole in roles.items():
+            if profile != self.role_profile_name(awsrole):
+                print('{0} is used by several roles, {1} is stored as {2}'.format(
+                    self.role_profile_name(awsrole), awsrole.role_arn, profile))
+        profiles, failed = self.assume_roles(roles, assertion)
+        if not profiles:
+            raise AssumeRoleError('none of the {0} roles could be assumed'.format(len(roles)))
+
+        self.cache.set_batch(profiles)
+        self.cache.save()
+        self.resolve_aliases(assertion, dict((roles[profile].account_id, credentials)
+                                             for profile, credentials in profiles.items()))
+        if self.cache_only():
+            return
+        if not self.writes_credentials_file():
+            print('The new access key pairs of {0} profiles have been stored in the credential store {1}.'.format(
+                len(profiles), self.cache.cache_file))
+            return
+        filename = self.write_credentials(profiles)
+
+        print('\n\n----------------------------------------------------------------')
+        print('Your new access key pairs have been stored in the AWS configuration file {0} under the following profiles:'.format(filename))
+        for profile in sorted(profiles):
+            print('  {0:40s} (expires at {1})'.format(profile, profiles[profile]['Expiration']))
+        for role_arn in failed:
+            print('  failed to assume {0}'.format(role_arn))
+        print('After this time, you may safely rerun this script to refresh your access key pairs.')
+        print('----------------------------------------------------------------\n\n')
+
+    def assume_roles(self, roles, assertion):
+        """Function to assume the roles (profile -> role) in parallel, failed roles are logged."""
+        max_workers = self.config.getint('aws', 'max_workers', fallback=8)
+        self.logger.info("assuming %d roles with %d workers" % (len(roles), max_workers))
+
+        self.get_sts_client()
+        profiles = {}
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(roles)))) as executor:
+            futures = {}
+            for profile, awsrole in roles.items():
+                futures[executor.submit(self.assume_role, awsrole.role_arn, awsrole.principal_arn, assertion)] = \
+                    (profile, awsrole.role_arn)
+            for future in as_completed(futures):
+                profile, role_arn = futures[future]
+                try:
+                    profiles[profile] = future.result()['Credentials']
+                    self.cache.store(profile, role_arn, profiles[profile])
+                except StsRequestError as e:
+                    self.logger.error(str(e))
+                    failed.append(role_arn)
+                except Exception as e:
+                    self.logger.error("could not assume role %s: %s" % (role_arn, e))
+                    failed.append(role_arn)
+        self.written_profiles = dict((profile, self.cache.get(profile)['RoleArn']) for profile in profiles)
+        return profiles, failed
+
+    def fetch_assertion(self):
+        """Function to get a new SAML assertion with the current session, without asking for credentials.
+
+        Returns None if the IdP does not accept the session anymore."""
+        if getattr(self, 'session', None) is None:
+            # e.g. the login was done with a reused assertion, the cookies of the last session are loaded
+            self.init_browser()
+        else:
+            self.open(self.config.get('provider', 'idpentryurl'))
+        if not self.has_saml_response():
+            return None
+        self.save_cookies()
+        return self.page.saml_response
+
+    def refresh_profiles(self, profiles, assertion):
+        """Function to renew the credentials of the profiles (profile -> role_arn) with a new assertion."""
+        self.parse_roles(assertion)
+        roles = {}
+        failed = []
+        for profile, role_arn in profiles.items():
+            if role_arn in self.saml.by_arn:
+                roles[profile] = self.saml.by_arn[role_arn]
+            else:
+                self.logger.error("role %s of profile %s is not part of the SAML assertion anymore" % (role_arn, profile))
+                failed.append(role_arn)
+        refreshed, failed_roles = self.assume_roles(roles, assertion) if roles else ({}, [])
+        self.cache.save()
+        if refreshed and not self.cache_only() and self.writes_credentials_file():
+            self.write_credentials(refreshed)
+        return refreshed, failed + failed_roles
+
+    def writes_credentials_file(self):
+        """Function to check if the credentials are written to the credentials file, with [aws]
+        write_credentials_file = False they are only kept in the credential store (see export --format ini)."""
+        return self.config.getboolean('aws', 'write_credentials_file', fallback=True)
+
+    def write_credentials(self, profiles):
+        """Function to write the credentials of one or more profiles with a single write of the credentials file."""
+        # Write the AWS STS token into the AWS credential file, only the sections of the profiles are touched
+        filename = self.config.get('aws', 'credentials_file')
+        values = {}
+        for profile, credentials in profiles.items():
+            values[profile] = credentials_file.profile_values(credentials, self.config.get('aws', 'region'),
+                                                              self.config.get('aws', 'outputformat'))
+        credentials_file.CredentialsFile(self.logger, filename).update(values)
+        return filename
@@ -0,0 +1,112 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# the looked up aliases as <account id> = <alias>,<unix time of the lookup>, accounts without
+# an alias are kept as well (with an empty alias) so that they are not looked up on every run
+CACHE_SECTION = 'aws_account_cache'
+
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def cached(config, now=None):
+    """Function to return the looked up aliases (account id -> alias) which are younger than [aws] alias_ttl."""
+    if not config.has_section(CACHE_SECTION):
+        return {}
+    ttl = config.getint('aws', 'alias_ttl', fallback=DEFAULT_TTL)
+    now = time.time() if now is None else now
+    aliases = {}
+    for account_id in config.options(CACHE_SECTION):
+        alias, _, resolved = config.get(CACHE_SECTION, account_id).rpartition(',')
+        try:
+            if now - float(resolved) < ttl:
+                aliases[account_id] = alias
+        except ValueError:
+            continue
+    return aliases
+
+
+def known(config, now=None):
+    """Function to return the aliases of the accounts: the looked up ones, overridden by [aws_accounts]."""
+    aliases = dict((account_id, alias) for account_id, alias in cached(config, now).items() if alias)
+    if config.has_section('aws_accounts'):
+        aliases.update((account_id, config.get('aws_accounts', account_id)) for account_id in config.options('aws_accounts'))
+    return aliases
+
+
+def store(config, aliases, now=None):
+    """Function to remember looked up aliases (account id -> alias or '') in the configuration."""
+    if not config.has_section(CACHE_SECTION):
+        config.add_section(CACHE_SECTION)
+    now = time.time() if now is None else now
+    for account_id, alias in aliases.items():
+        config.set(CACHE_SECTION, account_id, '{0},{1}'.format(alias, int(now)))
+
+
+class AliasResolver(object):
+    """Looks up the aliases of many accounts concurrently with IAM ListAccountAliases, each with the
+    credentials of a role in that account."""
+
+    def __init__(self, logger, config, shared_transport):
+        self.logger = logger
+        self.config = config
+        self.transport = shared_transport
+        self.max_workers = config.getint('aws', 'max_workers', fallback=8)
+        self.lock = threading.Lock()
+        self.session = None
+
+    def client(self, credentials):
+        # boto3 sessions are not thread safe, the clients created from them are
+        with self.lock:
+            if self.session is None:
+                import boto3
+                self.session = boto3.session.Session()
+            from botocore.config import Config
+            return self.session.client(
+                'iam', endpoint_url=self.config.get('aws', 'iam_endpoint', fallback=None) or None,
+                region_name='us-east-1', verify=self.transport.verify,
+                aws_access_key_id=credentials['AccessKeyId'], aws_secret_access_key=credentials['SecretAccessKey'],
+                aws_session_token=credentials['SessionToken'],
+                config=Config(connect_timeout=self.transport.connect_timeout, read_timeout=self.transport.read_timeout,
+                              retries={'max_attempts': self.transport.retries + 1, 'mode': 'standard'}))
+
+    def lookup(self, account_id, get_credentials):
+        """Function to return the alias of the account, '' if it has none."""
+        aliases = self.client(get_credentials()).list_account_aliases()['AccountAliases']
+        self.logger.debug("account %s has the aliases %s" % (account_id, aliases))
+        return aliases[0] if aliases else ''
+
+    def resolve(self, accounts):
+        """Function to look up the aliases of the accounts (account id -> function returning credentials of the
+        account), returns account id -> alias of the accounts which could be looked up."""
+        aliases = {}
+        if not accounts:
+            return aliases
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(accounts)))) as executor:
+            futures = dict((executor.submit(self.lookup, account_id, get_credentials), account_id)
+                           for account_id, get_credentials in accounts.items())
+            for future, account_id in futures.items():
+                try:
+                    aliases[account_id] = future.result()
+                except Exception as e:
+                    self.logger.info("could not look up the alias of account %s: %s" % (account_id, e))
+        return aliases
@@ -0,0 +1,267 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import argparse
+import configparser
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from . import cache, credentials_file, events, providers, sts, transport
+from .abstract_adfs import AuthenticationError
+
+TARGET_PREFIX = 'target:'
+
+
+class Target(object):
+    """One provider/user/role combination to refresh, read from a [target:<name>] section."""
+
+    def __init__(self, name, section, config):
+        self.name = name
+        self.provider = section.get('provider', config.get('provider', 'name', fallback='Microsoft'))
+        self.idpentryurl = section.get('idpentryurl', config.get('provider', 'idpentryurl', fallback=None))
+        self.username = section.get('username', config.get('msadfs', 'username', fallback=None))
+        self.password_env = section.get('password_env', 'AWS_ADFS_PASSWORD')
+        self.role = section.get('role')
+        self.role_patterns = section.get('role_patterns')
+        self.profile = section.get('profile', name)
+        self.cookie_file = section.get('cookie_file')
+
+    @property
+    def host(self):
+        return urlparse(self.idpentryurl).netloc
+
+    def password(self, adfs):
+        password = os.environ.get(self.password_env)
+        if password is None:
+            password = adfs.keyring_password(self.username)
+        if password is None:
+            raise AuthenticationError('no password for {0}, please set {1} or use the keyring'.format(
+                self.username, self.password_env))
+        return password
+
+    def config(self, config):
+        """Function to build the configuration of this target on top of the main configuration."""
+        target_config = configparser.RawConfigParser()
+        target_config.read_dict(dict((section, dict(config.items(section, raw=True))) for section in config.sections()
+                                     if not section.startswith(TARGET_PREFIX)))
+        for section in ('provider', 'msadfs', 'aws'):
+            if not target_config.has_section(section):
+                target_config.add_section(section)
+        target_config.set('provider', 'name', self.provider)
+        target_config.set('provider', 'idpentryurl', self.idpentryurl)
+        target_config.set('provider', 'profile_name', self.profile)
+        target_config.set('msadfs', 'username', self.username or '')
+        # sessions of different targets must not share one cookie file
+        target_config.set('provider', 'persist_session', str(self.cookie_file is not None))
+        if self.cookie_file is not None:
+            target_config.set('provider', 'cookie_file', self.cookie_file)
+        if self.role_patterns is not None:
+            target_config.set('aws', 'role_patterns', self.role_patterns)
+        return target_config
+
+
+class TargetResult(object):
+    def __init__(self, target):
+        self.target = target
+        self.profiles = {}
+        self.error = None
+        self.start = time.monotonic()
+        self.sts_start = None
+        self.login_time = 0.0
+        self.sts_time = 0.0
+        self.total_time = 0.0
+
+
+def read_targets(config, targets_file=None, names=None):
+    """Function to read the targets of the config file (and the optional targets file)."""
+    if targets_file is not None:
+        merged = configparser.RawConfigParser()
+        merged.read_dict(dict((section, dict(config.items(section, raw=True))) for section in config.sections()))
+        merged.read(targets_file)
+        config = merged
+    targets = []
+    for section in config.sections():
+        if section.startswith(TARGET_PREFIX):
+            name = section[len(TARGET_PREFIX):].strip()
+            if not names or name in names:
+                targets.append(Target(name, dict(config.items(section, raw=True)), config))
+    return targets
+
+
+class BatchRefresher(object):
+    """Refreshes many targets concurrently in one thread pool: the logins are limited per IdP host, the STS
+    calls globally (with semaphores, as the requests block).
+
+    All credentials are written with a single update of the credentials file and the cache."""
+
+    def __init__(self, logger, config, targets):
+        self.logger = logger
+        self.config = config
+        self.targets = targets
+        self.max_workers = config.getint('batch', 'max_workers', fallback=32)
+        self.per_host_limit = config.getint('batch', 'per_host_limit', fallback=4)
+        self.sts_limit = config.getint('batch', 'sts_limit', fallback=16)
+        self.cache = cache.create(logger, config)
+        self.transport = None
+        self.sts_client = None
+        self.lock = threading.Lock()
+
+    def login(self, target, provider):
+        if not target.username:
+            raise AuthenticationError('no username for target {0}, please set username in its section or in '
+                                      '[msadfs]'.format(target.name))
+        provider.adfs.set_username_password(target.username, target.password(provider.adfs))
+        assertion = provider.get_assertion()
+        if assertion is None:
+            raise AuthenticationError('login of {0} at {1} failed'.format(target.username, target.host))
+        return assertion
+
+    def select_roles(self, target, provider, assertion):
+        """Function to return the roles (profile -> role) of the target in the assertion."""
+        adfs = provider.adfs
+        awsroles = adfs.parse_roles(assertion)
+        if target.role:
+            matching = adfs.saml.find(target.role)
+            if len(matching) != 1:
+                raise AuthenticationError('{0} roles match {1}'.format(len(matching), target.role))
+            return {target.profile: matching[0]}
+        if target.role_patterns:
+            roles = adfs.role_profiles(adfs.filter_roles(awsroles))
+            for profile, awsrole in roles.items():
+                if profile != adfs.role_profile_name(awsrole):
+                    self.logger.warning("%s is used by several roles, %s is stored as %s" % (
+                        adfs.role_profile_name(awsrole), awsrole.role_arn, profile))
+            return roles
+        if len(awsroles) == 1:
+            return {target.profile: awsroles[0]}
+        raise AuthenticationError('the SAML assertion contains {0} roles, please set role or role_patterns'.format(
+            len(awsroles)))
+
+    def login_target(self, result, host_limits):
+        """Function to log in to the IdP of the target (at most per_host_limit logins per host at a time) and
+        return the provider and the roles to assume, None if it failed."""
+        target = result.target
+        provider = None
+        events.emit('login_start', provider=target.provider, idp=target.host)
+        try:
+            options = argparse.Namespace(non_interactive=True, role=target.role, profile=target.profile,
+                                         all_roles=False, credential_process=False)
+            provider = providers.create(target.provider, self.logger, target.config(self.config), options)
+            provider.adfs.cache = self.cache
+            provider.adfs.transport = self.transport
+            provider.adfs.sts_client = self.sts_client
+            with host_limits[target.host]:
+                assertion = self.login(target, provider)
+            result.login_time = time.monotonic() - result.start
+            roles = self.select_roles(target, provider, assertion)
+        except Exception as e:
+            events.emit('login', provider=target.provider, idp=target.host, source=getattr(provider, 'source', None),
+                        duration=round(time.monotonic() - result.start, 3), roles=None, error=type(e).__name__)
+            self.fail(result, e)
+            return None
+        events.emit('login', provider=target.provider, idp=target.host, source=provider.source,
+                    duration=round(result.login_time, 3), roles=len(provider.adfs.saml.roles), error=None)
+        return provider, roles, assertion
+
+    def assume_role(self, result, provider, awsrole, assertion, sts_limit):
+        """Function to assume one role of a target, at most sts_limit STS calls run at a time."""
+        with sts_limit:
+            sts_start = time.monotonic()
+            credentials = provider.adfs.assume_role(awsrole.role_arn, awsrole.principal_arn, assertion)['Credentials']
+            with self.lock:
+                result.sts_start = min(result.sts_start or sts_start, sts_start)
+                result.sts_time = time.monotonic() - result.sts_start
+        return credentials
+
+    def fail(self, result, error):
+        self.logger.error("refresh of target %s failed: %s" % (result.target.name, error))
+        result.error = error
+
+    def refresh(self):
+        """Function to refresh the targets with a single thread pool: the logins are submitted first, the STS
+        calls of a target as soon as its login is done. No task waits for another one, so the pool cannot
+        run out of workers."""
+        # one transport (connection pools) and sts client for all targets
+        self.transport = transport.Transport(self.config)
+        self.sts_client = sts.create_client(self.config, self.transport)
+        host_limits = dict((target.host, threading.Semaphore(self.per_host_limit)) for target in self.targets)
+        sts_limit = threading.Semaphore(self.sts_limit)
+        results = [TargetResult(target) for target in self.targets]
+        calls = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            logins = dict((executor.submit(self.login_target, result, host_limits), result) for result in results)
+            for future in as_completed(logins):
+                login = future.result()
+                if login is None:
+                    continue
+                provider, roles, assertion = login
+                for profile, awsrole in roles.items():
+                    call = executor.submit(self.assume_role, logins[future], provider, awsrole, assertion, sts_limit)
+                    calls[call] = (logins[future], profile, awsrole)
+
+        assumed = dict((result, {}) for result in results)
+        failed = dict((result, []) for result in results)
+        for call, (result, profile, awsrole) in calls.items():
+            try:
+                assumed[result][profile] = (awsrole.role_arn, call.result())
+            except Exception as e:
+                self.logger.error("could not assume role %s: %s" % (awsrole.role_arn, e))
+                failed[result].append(awsrole.role_arn)
+        for result in results:
+            if failed[result]:
+                self.fail(result, AuthenticationError('could not assume {0}'.format(', '.join(failed[result]))))
+            elif result.error is None:
+                for profile, (role_arn, credentials) in assumed[result].items():
+                    self.cache.store(profile, role_arn, credentials)
+                    result.profiles[profile] = credentials
+            result.total_time = time.monotonic() - result.start
+        return results
+
+    def run(self):
+        """Function to refresh all targets and write their credentials, returns the results per target."""
+        results = self.refresh()
+        profiles = {}
+        for result in results:
+            profiles.update(result.profiles)
+        if profiles:
+            self.cache.save()
+        if profiles and self.config.getboolean('aws', 'write_credentials_file', fallback=True):
+            values = {}
+            for profile, credentials in profiles.items():
+                values[profile] = credentials_file.profile_values(
+                    credentials, self.config.get('aws', 'region', fallback=''),
+                    self.config.get('aws', 'outputformat', fallback='json'))
+            credentials_file.CredentialsFile(self.logger, self.config.get('aws', 'credentials_file')).update(values)
+        return results
+
+
+def print_report(results):
+    """Function to print the timing and the outcome of every target."""
+    print('{0:30s} {1:8s} {2:>9s} {3:>9s} {4:>9s}  {5}'.format('target', 'status', 'login[s]', 'sts[s]', 'total[s]', 'profiles / error'))
+    for result in sorted(results, key=lambda r: r.target.name):
+        status = 'failed' if result.error is not None else 'ok'
+        detail = '{0}: {1}'.format(type(result.error).__name__, result.error) if result.error is not None \
+            else ', '.join(sorted(result.profiles))
+        print('{0:30s} {1:8s} {2:9.3f} {3:9.3f} {4:9.3f}  {5}'.format(
+            result.target.name, status, result.login_time, result.sts_time, result.total_time, detail))
+    failed = len([result for result in results if result.error is not None])
+    print('{0} targets refreshed, {1} failed'.format(len(results) - failed, failed))
@@ -0,0 +1,96 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import hmac
+import json
+import os
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote
+
+
+class CredentialBroker(ThreadingMixIn, HTTPServer):
+    """Local http endpoint serving the cached credentials in the container credentials format.
+
+    SDKs use it with AWS_CONTAINER_CREDENTIALS_FULL_URI=http://127.0.0.1:<port>/<profile> and
+    AWS_CONTAINER_AUTHORIZATION_TOKEN (or AWS_CONTAINER_AUTHORIZATION_TOKEN_FILE)."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, logger, credential_cache, host='127.0.0.1', port=9911, token=None):
+        HTTPServer.__init__(self, (host, port), CredentialBrokerHandler)
+        self.logger = logger
+        self.cache = credential_cache
+        self.token = token or secrets.token_urlsafe(32)
+        self.thread = None
+
+    def url(self, profile):
+        return 'http://{0}:{1}/{2}'.format(self.server_address[0], self.server_address[1], profile)
+
+    def write_token(self, token_file):
+        """Function to store the authorization token in a file readable only by the current user."""
+        fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod(token_file, 0o600)
+        with os.fdopen(fd, 'w') as token:
+            token.write(self.token)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='CredentialBroker')
+        self.thread.daemon = True
+        self.thread.start()
+        self.logger.info("serving credentials on %s:%d" % self.server_address)
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class CredentialBrokerHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        self.server.logger.debug("broker: " + format % args)
+
+    def send_json(self, status, document):
+        body = json.dumps(document).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        authorization = self.headers.get('Authorization') or ''
+        if not hmac.compare_digest(authorization.encode('utf-8'), self.server.token.encode('utf-8')):
+            return self.send_json(403, {'code': 'AccessDenied', 'message': 'invalid authorization token'})
+        profile = unquote(self.path.split('?')[0].strip('/'))
+        entry = self.server.cache.get(profile)
+        if entry is None:
+            return self.send_json(404, {'code': 'NotFound', 'message': 'no credentials for profile ' + profile})
+        self.send_json(200, {
+            'AccessKeyId': entry['AccessKeyId'],
+            'SecretAccessKey': entry['SecretAccessKey'],
+            'Token': entry['SessionToken'],
+            'Expiration': entry['Expiration'],
+            'RoleArn': entry['RoleArn'],
+        })
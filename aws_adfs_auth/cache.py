@@ -0,0 +1,297 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import os
+import json
+import datetime
+import threading
+from os.path import expanduser
+
+from . import timings
+from .credentials_file import locked, replace_file
+
+
+def parse_expiration(expiration):
+    """Function to turn the STS expiration (datetime or ISO 8601 string) into an aware datetime."""
+    if isinstance(expiration, datetime.datetime):
+        value = expiration
+    else:
+        value = datetime.datetime.fromisoformat(str(expiration).replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+class CredentialStore(object):
+    """Base class of the credential caches, which implement get(), profiles(), batch(), store(), set_batch()
+    and save()."""
+
+    def remaining(self, profile):
+        """Function to return the seconds the credentials of the profile remain valid, None if there are none."""
+        entry = self.get(profile)
+        if entry is None:
+            return None
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return (parse_expiration(entry['Expiration']) - now).total_seconds()
+
+    def is_valid(self, profile, margin=0):
+        """Function to check if the profile has credentials valid for at least margin seconds."""
+        remaining = self.remaining(profile)
+        if remaining is None:
+            return False
+        self.logger.debug("cached credentials of profile %s remain valid for %d seconds" % (profile, remaining))
+        return remaining > margin
+
+    def is_batch_valid(self, margin=0):
+        """Function to check if all profiles of the last --all-roles run are still valid."""
+        batch = self.batch()
+        return len(batch) > 0 and all(self.is_valid(profile, margin) for profile in batch)
+
+    def credential_process_document(self, profile):
+        """Function to return the cached credentials in the credential_process (version 1) format."""
+        entry = self.get(profile)
+        return {
+            'Version': 1,
+            'AccessKeyId': entry['AccessKeyId'],
+            'SecretAccessKey': entry['SecretAccessKey'],
+            'SessionToken': entry['SessionToken'],
+            'Expiration': entry['Expiration'],
+        }
+
+
+class CredentialCache(CredentialStore):
+    """Local cache of the temporary credentials with their expiration, keyed by profile."""
+    cache_file = expanduser("~") + '/.aws/adfs_auth_cache.json'
+
+    def __init__(self, logger, cache_file=None):
+        self.logger = logger
+        if cache_file is not None:
+            self.cache_file = cache_file
+        self.data = None
+        # the profiles (and the batch) changed since the last save, only they are merged into the file
+        self.changed = set()
+        self.batch_changed = False
+
+    def read(self):
+        try:
+            with open(self.cache_file) as cache_file:
+                data = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            data = {}
+        data.setdefault('profiles', {})
+        data.setdefault('batch', [])
+        return data
+
+    def load(self):
+        """Function to read the cache file, an unreadable cache is treated as empty."""
+        if self.data is None:
+            self.data = self.read()
+        return self.data
+
+    def save(self):
+        """Function to write the cache file, readable only by the current user.
+
+        Other processes (credential_process, exec, the daemon) write the same file, so it is read again
+        under a lock and only the profiles changed by this process are replaced."""
+        self.logger.debug("storing credential cache to %s" % self.cache_file)
+        folder = os.path.dirname(os.path.abspath(self.cache_file))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        data = self.load()
+        with timings.span('cache_write'), locked(self.cache_file):
+            merged = self.read()
+            for profile in self.changed:
+                merged['profiles'][profile] = data['profiles'][profile]
+            if self.batch_changed:
+                merged['batch'] = data['batch']
+            replace_file(self.cache_file, json.dumps(merged))
+        self.data = merged
+        self.changed = set()
+        self.batch_changed = False
+
+    def store(self, profile, role_arn, credentials):
+        """Function to remember the credentials of a profile, call save() to persist them."""
+        self.changed.add(profile)
+        self.load()['profiles'][profile] = {
+            'RoleArn': role_arn,
+            'AccessKeyId': credentials['AccessKeyId'],
+            'SecretAccessKey': credentials['SecretAccessKey'],
+            'SessionToken': credentials['SessionToken'],
+            'Expiration': parse_expiration(credentials['Expiration']).isoformat(),
+        }
+
+    def set_batch(self, profiles):
+        """Function to remember the profiles written by the last --all-roles run."""
+        self.batch_changed = True
+        self.load()['batch'] = sorted(profiles)
+
+    def profiles(self):
+        """Function to return the names of the cached profiles."""
+        return sorted(self.load()['profiles'])
+
+    def get(self, profile):
+        """Function to return the cached entry of a profile or None."""
+        return self.load()['profiles'].get(profile)
+
+    def batch(self):
+        """Function to return the profiles of the last --all-roles run."""
+        return self.load()['batch']
+
+
+class SqliteCredentialCache(CredentialStore):
+    """Credential cache in an indexed SQLite database, for users with many profiles: checking or
+    reading a profile is a single keyed lookup instead of reading and parsing all profiles.
+
+    It has the same interface as the CredentialCache, store() and set_batch() are buffered and written
+    in one short transaction by save(), so that concurrent writers are not blocked during the STS calls."""
+    cache_file = expanduser("~") + '/.aws/adfs_auth_cache.db'
+
+    def __init__(self, logger, cache_file=None):
+        self.logger = logger
+        if cache_file is not None:
+            self.cache_file = cache_file
+        self.connection = None
+        self.lock = threading.Lock()
+        # the rows stored (profile -> row) and the batch set since the last save
+        self.pending = {}
+        self.pending_batch = None
+
+    def connect(self):
+        if self.connection is None:
+            # only needed with credential_store = sqlite
+            import sqlite3
+            folder = os.path.dirname(self.cache_file)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            os.close(os.open(self.cache_file, os.O_WRONLY | os.O_CREAT, 0o600))
+            self.connection = sqlite3.connect(self.cache_file, timeout=30, check_same_thread=False)
+            self.connection.executescript(
+                'CREATE TABLE IF NOT EXISTS profiles (profile TEXT PRIMARY KEY, role_arn TEXT, access_key_id TEXT,'
+                ' secret_access_key TEXT, session_token TEXT, expiration TEXT);'
+                'CREATE TABLE IF NOT EXISTS batch (profile TEXT PRIMARY KEY);')
+        return self.connection
+
+    def execute(self, statement, parameters=()):
+        with self.lock:
+            return self.connect().execute(statement, parameters).fetchall()
+
+    def save(self):
+        """Function to write the stored profiles (and the batch) in one transaction."""
+        self.logger.debug("storing credential cache to %s" % self.cache_file)
+        with timings.span('cache_write'), self.lock:
+            connection = self.connect()
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?)',
+                                       list(self.pending.values()))
+                if self.pending_batch is not None:
+                    connection.execute('DELETE FROM batch')
+                    connection.executemany('INSERT INTO batch VALUES (?)',
+                                           [(profile,) for profile in self.pending_batch])
+            self.pending = {}
+            self.pending_batch = None
+
+    def store(self, profile, role_arn, credentials):
+        """Function to remember the credentials of a profile, call save() to persist them."""
+        with self.lock:
+            self.pending[profile] = (profile, role_arn, credentials['AccessKeyId'], credentials['SecretAccessKey'],
+                                     credentials['SessionToken'], parse_expiration(credentials['Expiration']).isoformat())
+
+    def set_batch(self, profiles):
+        """Function to remember the profiles written by the last --all-roles run."""
+        with self.lock:
+            self.pending_batch = sorted(profiles)
+
+    def profiles(self):
+        """Function to return the names of the cached profiles."""
+        stored = [row[0] for row in self.execute('SELECT profile FROM profiles ORDER BY profile')]
+        return sorted(set(stored) | set(self.pending))
+
+    def get(self, profile):
+        """Function to return the cached entry of a profile or None."""
+        row = self.pending.get(profile)
+        if row is None:
+            rows = self.execute('SELECT * FROM profiles WHERE profile = ?', (profile,))
+            if not rows:
+                return None
+            row = rows[0]
+        return dict(zip(('RoleArn', 'AccessKeyId', 'SecretAccessKey', 'SessionToken', 'Expiration'), row[1:]))
+
+    def batch(self):
+        """Function to return the profiles of the last --all-roles run."""
+        if self.pending_batch is not None:
+            return self.pending_batch
+        return [row[0] for row in self.execute('SELECT profile FROM batch')]
+
+
+# the credential caches selectable with [aws] credential_store
+STORES = {'json': CredentialCache, 'sqlite': SqliteCredentialCache}
+
+
+def create(logger, config):
+    """Function to create the credential cache selected with [aws] credential_store (json or sqlite)."""
+    store = config.get('aws', 'credential_store', fallback='json')
+    if store not in STORES:
+        raise Exception('unknown credential_store {0}, please use {1}'.format(store, ' or '.join(sorted(STORES))))
+    return STORES[store](logger, config.get('aws', 'credential_cache_file', fallback=None))
+
+
+def runtime_folder():
+    """Function to return the folder for short-lived secrets: the per-login XDG_RUNTIME_DIR (a tmpfs
+    removed at logout on most systems) if there is one, ~/.aws otherwise."""
+    return os.environ.get('XDG_RUNTIME_DIR') or expanduser("~") + '/.aws'
+
+
+class AssertionCache(object):
+    """Local cache of the last SAML assertion of an IdP, so that another role can be assumed with it
+    until its NotOnOrAfter without another round trip to the IdP.
+
+    The assertion is a bearer token, it is stored (not encrypted) readable only by the current user."""
+
+    def __init__(self, logger, cache_file=None):
+        self.logger = logger
+        self.cache_file = cache_file or runtime_folder() + '/adfs_auth_assertion.json'
+
+    def get(self, idp, margin=60, username=None):
+        """Function to return the cached assertion of the IdP and user if it is valid for at least margin seconds."""
+        try:
+            with open(self.cache_file) as cache_file:
+                entry = json.load(cache_file)
+            remaining = (parse_expiration(entry['NotOnOrAfter']) -
+                         datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+        if entry.get('Idp') != idp or entry.get('Username') != username or remaining <= margin:
+            return None
+        self.logger.debug("reusing the SAML assertion of %s, valid for %d seconds" % (idp, remaining))
+        return entry['Assertion']
+
+    def store(self, idp, assertion, not_on_or_after, username=None):
+        """Function to remember the assertion of the IdP and user until not_on_or_after (a datetime)."""
+        if not assertion or not_on_or_after is None:
+            return
+        self.logger.debug("storing SAML assertion to %s" % self.cache_file)
+        replace_file(self.cache_file, json.dumps({'Idp': idp, 'Username': username,
+                                                  'NotOnOrAfter': not_on_or_after.isoformat(), 'Assertion': assertion}))
+
+    def clear(self):
+        """Function to forget the cached assertion, e.g. after STS rejected it."""
+        try:
+            os.remove(self.cache_file)
+        except OSError:
+            pass
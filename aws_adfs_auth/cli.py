@@ -24,7 +24,7 @@ def init():
     """ process command line arguments """
     parser = argparse.ArgumentParser(description="Request temporary AWS account credentials "
                                                  "for a federated account",
-                                     usage="%(prog)s [options]",
+                                     usage="%(prog)s [options] [exec ... | export ... | stats ...]",
                                      formatter_class=argparse.RawDescriptionHelpFormatter,
                                      epilog="""
 NOTE: If you have several aws accounts where you have access to, you can map them in the config file (~/.aws/adfs_auth.ini) to a suitable name.
@@ -35,6 +35,87 @@ EXAMPLE:
 234567890 = Staging
 345678901 = Development
 ...
+Accounts without a name are looked up (IAM account alias) after the login and kept for alias_ttl seconds with:
+[aws]
+resolve_aliases = True
+
+With --all-roles every role is assumed with a single login and stored under a profile
+named after the account alias and the role (e.g. Production-Admin). To limit the roles,
+add glob patterns matching the role ARN or <account>:<role> to the config file:
+[aws]
+role_patterns = Production:*, *:ReadOnly
+max_workers = 8
+
+Credentials are cached together with their expiration (~/.aws/adfs_auth_cache.json). As long as
+they are valid for longer than refresh_margin seconds (default 300) no login is done, use --force
+to authenticate anyway:
+[aws]
+refresh_margin = 300
+
+For unattended use (cron, CI) use --non-interactive with --role. The username is taken from
+AWS_ADFS_USERNAME or the config file, the password from AWS_ADFS_PASSWORD, stdin (--password-stdin)
+or, with use_keyring = True in [provider], from the system keyring (service aws_adfs_auth).
+
+To use aws_adfs_auth as credential_process provider add the following to ~/.aws/config:
+[profile saml]
+credential_process = aws_adfs_auth --credential-process --profile saml
+
+With --daemon the credentials are refreshed refresh_margin seconds (minus up to jitter seconds)
+before they expire, using the ADFS session of the initial login:
+[aws]
+duration_seconds = 3600     (default: the SessionDuration of the SAML assertion, or 3600)
+[daemon]
+jitter = 60
+retry_interval = 30
+max_backoff = 900
+
+With --batch many provider/user/role targets are refreshed concurrently (logins are limited per
+IdP host, STS calls globally) and written with a single update of the credentials file:
+[target:prod-eu]
+idpentryurl = https://adfs-eu.example.com/adfs/ls/IdpInitiatedSignOn.aspx?loginToRp=urn:amazon:webservices
+username = svc-build@example.com
+password_env = PROD_EU_PASSWORD
+role = Production:Deploy
+profile = prod-eu
+[batch]
+max_workers = 32
+per_host_limit = 4
+sts_limit = 16
+
+With --serve the refreshed credentials are additionally served from memory to the AWS SDKs on
+http://127.0.0.1:9911/<profile> (container credentials format). The authorization token is
+written to ~/.aws/adfs_auth_broker_token:
+[broker]
+host = 127.0.0.1
+port = 9911
+
+"exec" runs a command with the credentials of a role (or cached profile) in its environment,
+without writing them to disk. A login is only done if the cached credentials expired:
+aws_adfs_auth exec --role Production:ReadOnly -- aws s3 ls
+
+"export" prints the cached credentials of many profiles at once (env, dotenv or json):
+eval "$(aws_adfs_auth export Production-Admin)"
+aws_adfs_auth export --format json --output credentials.json
+
+Many profiles are kept faster in an indexed SQLite credential store. With write_credentials_file = False
+the credentials file is only written on request with "export --format ini --output ~/.aws/credentials":
+[aws]
+credential_store = sqlite
+write_credentials_file = False
+
+Requests to the IdP and STS use keep-alive connections, timeouts and retries with backoff:
+[transport]
+connect_timeout = 5
+read_timeout = 30
+retries = 3
+ca_bundle = /etc/ssl/certs/corporate-ca.pem     (optional, sslverification = False in [aws] disables the checks)
+
+Logins, cache hits and misses, IdP and STS latencies and errors are appended as JSON lines to
+~/.aws/adfs_auth_events.jsonl (or file), rotated at max_bytes. "stats" aggregates them:
+[events]
+enabled = True
+max_bytes = 5242880
+backups = 3
 
 """)
 
@@ -46,9 +127,105 @@ EXAMPLE:
                         dest="configure", action="store_true",
                         help="Configures the AWS ADFS Auth application")
 
+    parser.add_argument("-a", "--all-roles",
+                        dest="all_roles", action="store_true",
+                        help="Assume all roles of the SAML assertion (or the ones matching role_patterns "
+                             "in the config file) and store one profile per role")
+
+    parser.add_argument("-f", "--force",
+                        dest="force", action="store_true",
+                        help="Authenticate again even if the cached credentials are still valid")
+
+    parser.add_argument("-p", "--profile",
+                        dest="profile", metavar="PROFILE",
+                        help="Profile to use instead of the profile_name of the config file")
+
+    parser.add_argument("-r", "--role",
+                        dest="role", metavar="ROLE",
+                        help="Role to assume, as role ARN, <account id>:<role name> or <account alias>:<role name>")
+
+    parser.add_argument("-n", "--non-interactive",
+                        dest="non_interactive", action="store_true",
+                        help="Never prompt, fail instead. The credentials are taken from AWS_ADFS_USERNAME/"
+                             "AWS_ADFS_PASSWORD, --password-stdin or the keyring")
+
+    parser.add_argument("--password-stdin",
+                        dest="password_stdin", action="store_true",
+                        help="Read the password from the first line of stdin")
+
+    parser.add_argument("--credential-process",
+                        dest="credential_process", action="store_true",
+                        help="Print the credentials as JSON for the credential_process setting of the AWS CLI/SDKs "
+                             "instead of writing the credentials file")
+
+    parser.add_argument("-d", "--daemon",
+                        dest="daemon", action="store_true",
+                        help="Keep running and refresh the credentials before they expire")
+
+    parser.add_argument("-s", "--serve",
+                        dest="serve", action="store_true",
+                        help="Like --daemon, but also serve the credentials on a local http endpoint "
+                             "for AWS_CONTAINER_CREDENTIALS_FULL_URI")
+
+    parser.add_argument("-b", "--batch",
+                        dest="batch", metavar="TARGET", nargs="*",
+                        help="Refresh all (or the given) [target:<name>] sections concurrently, without prompting")
+
+    parser.add_argument("--targets",
+                        dest="targets_file", metavar="FILE",
+                        help="Read the batch targets from this file in addition to the config file")
+
+    parser.add_argument("--timings",
+                        dest="timings", metavar="FORMAT", nargs="?", const="table", choices=("table", "json", "openmetrics"),
+                        help="Report the duration of every phase (IdP requests, HTML parsing, SAML decoding, STS calls, "
+                             "file writes) at exit as table (default), JSON lines or OpenMetrics")
+
+    parser.add_argument("--timings-file",
+                        dest="timings_file", metavar="FILE",
+                        help="Write the timings to this file instead of stderr (JSON lines and tables are appended)")
+
     parser.add_argument("-v", "--verbose",
                         dest="verbosity", action="count",
                         help="Output debug messages, increase messages with -v -v")
+
+    parser.set_defaults(command=None, exec_command=None, export_format="env", export_file=None, profiles=None,
+                        stats_json=False, event_files=None)
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    # --role and --profile of the commands must not reset the ones given before the command
+    exec_parser = subparsers.add_parser("exec",
+                                        usage="%(prog)s [--role ROLE | --profile PROFILE] -- command [args ...]",
+                                        help="Run a command with the credentials of a role in its environment, "
+                                             "taken from the cache (a login is only done if they expired)")
+    exec_parser.add_argument("-r", "--role",
+                             dest="role", metavar="ROLE", default=argparse.SUPPRESS,
+                             help="Role, as role ARN, <account id>:<role name> or <account alias>:<role name>")
+    exec_parser.add_argument("-p", "--profile",
+                             dest="profile", metavar="PROFILE", default=argparse.SUPPRESS,
+                             help="Cached profile to use instead of a role")
+    exec_parser.add_argument("exec_command", metavar="command", nargs=argparse.REMAINDER,
+                             help="Command to run, after --")
+
+    export_parser = subparsers.add_parser("export",
+                                          help="Print the cached credentials of many profiles for shells and tools")
+    export_parser.add_argument("--format",
+                               dest="export_format", choices=("env", "dotenv", "json", "ini"), default="env",
+                               help="env (export statements, default), dotenv, json or ini (with --output the "
+                                    "profiles are merged into an existing credentials file)")
+    export_parser.add_argument("-o", "--output",
+                               dest="export_file", metavar="FILE",
+                               help="Write to this file (readable only by you) instead of stdout")
+    export_parser.add_argument("profiles", metavar="PROFILE", nargs="*",
+                               help="Profiles to export, default: all cached profiles which are still valid")
+
+    stats_parser = subparsers.add_parser("stats",
+                                         help="Aggregate the event log into cache hit ratios and latency percentiles")
+    stats_parser.add_argument("--json",
+                              dest="stats_json", action="store_true",
+                              help="Print the statistics as JSON")
+    stats_parser.add_argument("event_files", metavar="FILE", nargs="*",
+                              help="Event logs to aggregate, e.g. collected from many workstations, "
+                                   "default: the configured event log and its backups")
     return parser
 
 def show_version():
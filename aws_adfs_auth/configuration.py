@@ -17,25 +17,34 @@ specific language governing permissions and limitations
 under the License.
 '''
 
+import io
 import os
 import configparser
+import stat
 from os.path import expanduser
 
+from . import providers
+from .credentials_file import replace_file
+
 
 class Configure(object):
     home = expanduser("~")
     aws_folder = home + '/.aws'
     aws_adfs_auth_config_file = aws_folder + '/adfs_auth.ini'
-    adfs_poviders = ['Microsoft']
 
     def __init__(self, logger):
         self.logger = logger
+        # the config file is parsed only once per run
+        self.config = None
+        # set when a value was changed which is not stored yet
+        self.changed = False
 
     def open_config(self):
-        self.logger.debug('Opening config from file %s' % self.aws_adfs_auth_config_file)
-        config = configparser.RawConfigParser()
-        config.read(self.aws_adfs_auth_config_file)
-        return config
+        if self.config is None:
+            self.logger.debug('Opening config from file %s' % self.aws_adfs_auth_config_file)
+            self.config = configparser.RawConfigParser()
+            self.config.read(self.aws_adfs_auth_config_file)
+        return self.config
 
     def check_config(self):
         """Function to check if the configuration is set."""
@@ -56,17 +65,31 @@ class Configure(object):
         return True
 
     def store_config(self, config):
-        """Function to store the configuration."""
+        """Function to store the configuration, atomically and only if it differs from the file."""
+        content = io.StringIO()
+        config.write(content)
+        content = content.getvalue()
+        try:
+            with open(self.aws_adfs_auth_config_file) as adfs_auth_config_file:
+                if adfs_auth_config_file.read() == content:
+                    self.logger.debug("config file %s is up to date" % self.aws_adfs_auth_config_file)
+                    self.changed = False
+                    return False
+            mode = stat.S_IMODE(os.stat(self.aws_adfs_auth_config_file).st_mode)
+        except (IOError, OSError):
+            mode = 0o600
         self.logger.debug("storing config file to %s" % self.aws_adfs_auth_config_file)
-        with open(self.aws_adfs_auth_config_file, 'w+') as adfs_auth_config_file:
-            config.write(adfs_auth_config_file)
+        replace_file(self.aws_adfs_auth_config_file, content, mode)
+        self.changed = False
+        return True
 
     def setup_provider(self, config):
         """Function to setup the provider."""
-        print("Please choose which ADFS provider you want to use (currently only Microsoft is supported)")
-        if len(self.adfs_poviders) > 1:
+        adfs_providers = providers.names()
+        print("Please choose which ADFS provider you want to use")
+        if len(adfs_providers) > 1:
             i = 0
-            for adfs_provider in self.adfs_poviders:
+            for adfs_provider in adfs_providers:
                 print('[{:2d}]: {:30s}'.format(i, adfs_provider))
                 i += 1
             selected_provider_index = int(input('Selection: '))
@@ -74,7 +97,7 @@ class Configure(object):
             selected_provider_index = 0
         if not config.has_section('provider'):
             config.add_section('provider')
-        config.set('provider', 'name', self.adfs_poviders[selected_provider_index])
+        config.set('provider', 'name', adfs_providers[selected_provider_index])
 
     def setup_idpentryurl(self, config):
         """Function to setup the idp entry url."""
@@ -100,7 +123,9 @@ class Configure(object):
             value = input('{:s} [{:s}]: '.format(label, last_value)) or last_value
         else:
             value = input('{:s}: '.format(label))
-        config.set(section, option, value)
+        if not config.has_option(section, option) or config.get(section, option) != value:
+            config.set(section, option, value)
+            self.changed = True
         return value
 
     def set_value(self, config, section, option, value):
@@ -109,6 +134,7 @@ class Configure(object):
             config.add_section(section)
         if not config.has_option(section, option):
             config.set(section, option, value)
+            self.changed = True
 
     def setup_variables(self, config):
         """Function to setup additional variables."""
@@ -135,34 +161,36 @@ class Configure(object):
         return config
 
     def migrate_020_030(self, config):
-        self.set_value(config, 'info', 'version', '0.3.0')
         self.set_value(config, 'provider', 'profile_name', 'saml')
-        self.store_config(config)
 
     def migrate_030_040(self, config):
-        self.set_value(config, 'info', 'version', '0.4.0')
         self.set_value(config, 'aws', 'set_environment_variables', False)
         self.set_value(config, 'aws', 'environment_file', self.home + '/.aws/environment.sh')
-        self.store_config(config)
+
+    # version -> (next version, migration)
+    MIGRATIONS = {
+        '0.2.0': ('0.3.0', migrate_020_030),
+        '0.3.0': ('0.4.0', migrate_030_040),
+    }
+    LATEST_VERSION = '0.4.0'
 
     def migrate(self, config):
-        """Function to migrate the configuration to the next version."""
-        self.logger.info('migrating configuration file to the latest version if necessary')
+        """Function to migrate the configuration to the latest version, the file is written once at the end
+        and only if something changed."""
         # checking if config has a version number, if not we start to migrate from 0.2.0
         if not config.has_section('info'):
             config.add_section('info')
-        if not config.has_option('info', 'version'):
-            version = '0.2.0'
-        else:
-            version = config.get('info', 'version')
-        if version == '0.4.0':
+        version = config.get('info', 'version', fallback='0.2.0')
+        if version == self.LATEST_VERSION:
             # all good, we are on the latest version
-            self.logger.info('migration of configuration not necessary.')
-        elif version == '0.2.0':
-            self.logger.info('migrating configuration from 0.2.0 to 0.3.0')
-            self.migrate_020_030(config)
-        elif version == '0.3.0':
-            self.logger.info('migrating configuration from 0.3.0 to 0.4.0')
-            self.migrate_030_040(config)
-        else:
-            raise Exception('configuration file corrupted, please re-configure application')
+            self.logger.debug('migration of configuration not necessary.')
+            return False
+        while version != self.LATEST_VERSION:
+            if version not in self.MIGRATIONS:
+                raise Exception('configuration file corrupted, please re-configure application')
+            next_version, migration = self.MIGRATIONS[version]
+            self.logger.info('migrating configuration from %s to %s' % (version, next_version))
+            migration(self, config)
+            version = next_version
+        config.set('info', 'version', version)
+        return self.store_config(config)
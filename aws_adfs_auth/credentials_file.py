@@ -0,0 +1,168 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import os
+import re
+import stat
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from . import timings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SECTION = re.compile(r'^\s*\[([^\]]+)\]')
+OPTION = re.compile(r'^\s*([^=:\s#;\[][^=:]*?)\s*[=:]\s*(.*?)\s*$')
+
+
+def profile_values(credentials, region, output):
+    """Function to return the options of a credentials file profile for the STS credentials (or a cache entry)."""
+    return OrderedDict([
+        ('output', output),
+        ('region', region),
+        ('aws_access_key_id', credentials['AccessKeyId']),
+        ('aws_secret_access_key', credentials['SecretAccessKey']),
+        ('aws_session_token', credentials['SessionToken']),
+    ])
+
+
+@contextmanager
+def locked(filename):
+    """Context manager holding an exclusive lock on filename.lock while the file is updated."""
+    with open(filename + '.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def replace_file(filename, content, mode=0o600, sync=False):
+    """Function to atomically replace filename with content. It is written to a unique temporary file in
+    the same folder, so that concurrent writers never truncate each other's temporary file."""
+    folder = os.path.dirname(os.path.abspath(filename))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    fd, temp_file = tempfile.mkstemp(dir=folder, prefix='.' + os.path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'w') as target:
+            target.write(content)
+            if sync:
+                target.flush()
+                os.fsync(target.fileno())
+        os.chmod(temp_file, mode)
+        os.replace(temp_file, filename)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+class CredentialsFile(object):
+    """The AWS credentials file, updated in place: only the sections of the written profiles are
+    touched, comments and all other profiles are kept. Updates are serialized with a lock file and
+    written to a temporary file which then atomically replaces the credentials file."""
+
+    def __init__(self, logger, filename):
+        self.logger = logger
+        self.filename = filename
+
+    def read_lines(self):
+        try:
+            with open(self.filename) as credentials_file:
+                return credentials_file.read().splitlines()
+        except (IOError, OSError):
+            return []
+
+    def sections(self, lines):
+        """Function to split the lines into the lines before the first section and the sections as
+        name -> lines of the section (starting with its header), in the order of the file."""
+        preamble = []
+        sections = OrderedDict()
+        current = preamble
+        for line in lines:
+            match = SECTION.match(line)
+            if match:
+                current = sections.setdefault(match.group(1).strip(), [])
+            current.append(line)
+        return preamble, sections
+
+    def options(self, section):
+        """Function to return the options of a section as key -> (line index, value)."""
+        options = {}
+        for index in range(1, len(section)):
+            match = OPTION.match(section[index])
+            if match:
+                options[match.group(1).lower()] = (index, match.group(2))
+        return options
+
+    def update_section(self, preamble, sections, profile, values, backup):
+        if profile not in sections:
+            last = sections[next(reversed(sections))] if sections else preamble
+            while last and not last[-1].strip():
+                last.pop()
+            if last:
+                last.append('')
+            sections[profile] = ['[{0}]'.format(profile)]
+            sections[profile].extend('{0} = {1}'.format(key, value) for key, value in values.items())
+            return
+
+        section = sections[profile]
+        options = self.options(section)
+        if backup and profile + '.backup' not in sections and options:
+            # we keep a backup of the profile when we overwrite it the first time
+            self.update_section(preamble, sections, profile + '.backup',
+                                OrderedDict((key, value) for key, (index, value) in sorted(options.items(), key=lambda o: o[1][0])),
+                                backup=False)
+
+        insert_at = max([index + 1 for index, value in options.values()] or [1])
+        for key, value in values.items():
+            if key in options:
+                section[options[key][0]] = '{0} = {1}'.format(key, value)
+            else:
+                section.insert(insert_at, '{0} = {1}'.format(key, value))
+                insert_at += 1
+
+    def update_lines(self, lines, profiles, backup):
+        """Function to apply the values of many profiles to the lines of the file in a single pass."""
+        preamble, sections = self.sections(lines)
+        for profile, values in profiles.items():
+            self.update_section(preamble, sections, profile, values, backup)
+        for section in sections.values():
+            preamble.extend(section)
+        return preamble
+
+    def update(self, profiles, backup=True):
+        """Function to write the values (profile -> key -> value) of many profiles in one locked, atomic write."""
+        folder = os.path.dirname(os.path.abspath(self.filename))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with timings.span('credentials_write'), locked(self.filename):
+            lines = self.update_lines(self.read_lines(), profiles, backup)
+            try:
+                mode = stat.S_IMODE(os.stat(self.filename).st_mode)
+            except OSError:
+                mode = 0o600
+            replace_file(self.filename, '\n'.join(lines) + '\n', mode, sync=True)
+        self.logger.debug("updated profiles %s in %s" % (', '.join(sorted(profiles)), self.filename))
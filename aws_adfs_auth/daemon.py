@@ -0,0 +1,103 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import random
+import threading
+import time
+
+from .cache import parse_expiration
+
+
+class RefreshDaemon(object):
+    """Keeps the credentials of the profiles of an authenticated session fresh.
+
+    Every profile is refreshed refresh_margin seconds (minus a random jitter) before it
+    expires, using the ADFS session of the initial login. Failed refreshes are retried
+    with an exponential backoff, the daemon never asks for credentials."""
+
+    def __init__(self, logger, config, adfs):
+        self.logger = logger
+        self.adfs = adfs
+        self.margin = config.getint('aws', 'refresh_margin', fallback=300)
+        self.jitter = config.getint('daemon', 'jitter', fallback=60)
+        self.retry_interval = config.getint('daemon', 'retry_interval', fallback=30)
+        self.max_backoff = config.getint('daemon', 'max_backoff', fallback=900)
+        self.profiles = dict(adfs.written_profiles)
+        self.schedule = {}
+        self.failures = {}
+        self.stop_event = threading.Event()
+        self.clock = time.time
+        for profile in self.profiles:
+            self.schedule_refresh(profile)
+
+    def schedule_refresh(self, profile):
+        """Function to plan the next refresh of a profile ahead of the expiration of its credentials."""
+        expiration = parse_expiration(self.adfs.cache.get(profile)['Expiration']).timestamp()
+        self.schedule[profile] = expiration - self.margin - random.uniform(0, self.jitter)
+        self.failures.pop(profile, None)
+        self.logger.info("next refresh of profile %s in %d seconds" % (profile, self.schedule[profile] - self.clock()))
+
+    def schedule_retry(self, profile):
+        """Function to plan a retry of a failed refresh with exponential backoff."""
+        self.failures[profile] = self.failures.get(profile, 0) + 1
+        backoff = min(self.retry_interval * 2 ** (self.failures[profile] - 1), self.max_backoff)
+        self.schedule[profile] = self.clock() + backoff * random.uniform(0.8, 1.2)
+        self.logger.warning("refresh of profile %s failed %d times, retrying in %d seconds" %
+                            (profile, self.failures[profile], self.schedule[profile] - self.clock()))
+
+    def due_profiles(self):
+        now = self.clock()
+        return dict((profile, role_arn) for profile, role_arn in self.profiles.items() if self.schedule[profile] <= now)
+
+    def refresh(self):
+        """Function to refresh all profiles which are due, with a single new SAML assertion."""
+        due = self.due_profiles()
+        if not due:
+            return
+        self.logger.info("refreshing profiles %s" % ', '.join(sorted(due)))
+        try:
+            assertion = self.adfs.fetch_assertion()
+            if assertion is None:
+                self.logger.error("the ADFS session is not valid anymore, please login again")
+                refreshed = {}
+            else:
+                refreshed, failed = self.adfs.refresh_profiles(due, assertion)
+        except Exception as e:
+            self.logger.error("could not refresh the credentials: %s" % e)
+            refreshed = {}
+        for profile in due:
+            if profile in refreshed:
+                self.schedule_refresh(profile)
+            else:
+                self.schedule_retry(profile)
+
+    def run(self):
+        """Function to refresh the profiles until stop() is called or the process is interrupted."""
+        print('Refreshing the profiles {0} in the background, press Ctrl-C to stop.'.format(', '.join(sorted(self.profiles))))
+        try:
+            while not self.stop_event.is_set() and self.profiles:
+                wait = max(0, min(self.schedule.values()) - self.clock())
+                if self.stop_event.wait(wait):
+                    break
+                self.refresh()
+        except KeyboardInterrupt:
+            print('Stopped refreshing the profiles.')
+
+    def stop(self):
+        self.stop_event.set()
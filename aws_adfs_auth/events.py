@@ -0,0 +1,211 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import datetime
+import json
+import math
+import os
+import socket
+from collections import OrderedDict
+from os.path import expanduser
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+# the percentiles of the stats command
+PERCENTILES = (50, 90, 99)
+
+
+class EventLog(object):
+    """Append-only log of the authentication events as JSON lines, rotated at max_bytes with backups
+    file.1 (newest) to file.<backups>.
+
+    Logging is off until a filename is set, writing it never makes a run fail."""
+
+    def __init__(self, filename=None, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.host = None
+
+    def rotate(self, size):
+        # imported here, the lock is only needed for the rare rotation
+        from .credentials_file import locked
+        with locked(self.filename):
+            # another process may have rotated the file while we waited for the lock
+            if not os.path.exists(self.filename) or os.path.getsize(self.filename) + size <= self.max_bytes:
+                return
+            for index in range(self.backups - 1, 0, -1):
+                if os.path.exists('{0}.{1}'.format(self.filename, index)):
+                    os.replace('{0}.{1}'.format(self.filename, index), '{0}.{1}'.format(self.filename, index + 1))
+            if self.backups > 0:
+                os.replace(self.filename, self.filename + '.1')
+            else:
+                os.remove(self.filename)
+
+    def emit(self, event, **fields):
+        """Function to append an event with the time, host and process to the log."""
+        if self.filename is None:
+            return
+        if self.host is None:
+            self.host = socket.gethostname()
+        record = OrderedDict([('ts', datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds')),
+                              ('event', event), ('host', self.host), ('pid', os.getpid())])
+        record.update(fields)
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        try:
+            if os.path.exists(self.filename) and os.path.getsize(self.filename) + len(line) > self.max_bytes:
+                self.rotate(len(line))
+            # a single write with O_APPEND, so that lines of concurrent runs do not interleave
+            fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def files(self):
+        """Function to return the log file and its backups, oldest first."""
+        names = ['{0}.{1}'.format(self.filename, index) for index in range(self.backups, 0, -1)] + [self.filename]
+        return [name for name in names if os.path.exists(name)]
+
+
+LOG = EventLog()
+
+
+def configure(config):
+    """Function to enable the event log with [events] enabled = True (or a file)."""
+    filename = config.get('events', 'file', fallback=None)
+    if filename is None and config.getboolean('events', 'enabled', fallback=False):
+        filename = expanduser("~") + '/.aws/adfs_auth_events.jsonl'
+    LOG.filename = expanduser(filename) if filename else None
+    LOG.max_bytes = config.getint('events', 'max_bytes', fallback=DEFAULT_MAX_BYTES)
+    LOG.backups = config.getint('events', 'backups', fallback=DEFAULT_BACKUPS)
+
+
+def emit(event, **fields):
+    """Function to log an event with the event log of the process."""
+    LOG.emit(event, **fields)
+
+
+def read(filenames):
+    """Generator returning the events of the files, lines which cannot be parsed are skipped."""
+    for filename in filenames:
+        with open(filename, encoding='utf-8', errors='replace') as log_file:
+            for line in log_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and 'event' in record:
+                    yield record
+
+
+def percentile(values, p):
+    """Function to return the p-th percentile (nearest rank) of the values, None if there are none."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def distribution(values):
+    result = OrderedDict([('count', len(values))])
+    for p in PERCENTILES:
+        result['p{0}'.format(p)] = percentile(values, p)
+    result['max'] = max(values) if values else None
+    return result
+
+
+def aggregate(records):
+    """Function to aggregate the events into cache hit ratios, latency percentiles and error counts."""
+    cache = OrderedDict()
+    remaining_at_miss = []
+    logins = {'duration': [], 'roles': [], 'sources': {}}
+    idp = {}
+    sts = []
+    errors = {}
+    hosts = set()
+    for record in records:
+        event = record['event']
+        hosts.add(record.get('host'))
+        if record.get('error'):
+            errors[record['error']] = errors.get(record['error'], 0) + 1
+        if event == 'cache':
+            counts = cache.setdefault(record.get('mode') or 'login', [0, 0])
+            counts[0 if record.get('hit') else 1] += 1
+            if not record.get('hit') and record.get('remaining') is not None:
+                remaining_at_miss.append(record['remaining'])
+        elif event == 'login' and not record.get('error'):
+            logins['duration'].append(record['duration'])
+            if record.get('roles') is not None:
+                logins['roles'].append(record['roles'])
+            source = record.get('source') or 'unknown'
+            logins['sources'][source] = logins['sources'].get(source, 0) + 1
+        elif event == 'idp' and record.get('duration') is not None:
+            idp.setdefault(record.get('idp') or 'unknown', []).append(record['duration'])
+        elif event == 'sts' and not record.get('error'):
+            sts.append(record['duration'])
+
+    stats = OrderedDict()
+    stats['hosts'] = len(hosts)
+    stats['cache'] = OrderedDict((mode, OrderedDict([('hits', hits), ('misses', misses),
+                                                     ('hit_ratio', hits / float(hits + misses))]))
+                                 for mode, (hits, misses) in sorted(cache.items()))
+    stats['remaining_at_miss'] = distribution(remaining_at_miss)
+    stats['login'] = distribution(logins['duration'])
+    stats['login']['sources'] = OrderedDict(sorted(logins['sources'].items()))
+    stats['roles'] = distribution(logins['roles'])
+    stats['idp'] = OrderedDict((host, distribution(durations)) for host, durations in sorted(idp.items()))
+    stats['sts'] = distribution(sts)
+    stats['errors'] = OrderedDict(sorted(errors.items(), key=lambda error: (-error[1], error[0])))
+    return stats
+
+
+def format_value(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return '{0:.3f}'.format(value)
+    return str(value)
+
+
+def table(stats):
+    """Function to render the aggregated events as text tables."""
+    lines = ['events of {0} hosts'.format(stats['hosts']), '', '{0:<20s} {1:>8s} {2:>8s} {3:>9s}'.format(
+        'cache', 'hits', 'misses', 'hit ratio')]
+    for mode, counts in stats['cache'].items():
+        lines.append('{0:<20s} {1:>8d} {2:>8d} {3:>8.1f}%'.format(mode, counts['hits'], counts['misses'],
+                                                                  100 * counts['hit_ratio']))
+    lines.extend(['', '{0:<40s} {1:>7s}'.format('distribution', 'count') +
+                  ''.join(' {0:>9s}'.format(name) for name in ['p{0}'.format(p) for p in PERCENTILES] + ['max'])])
+    rows = [('login seconds', stats['login']), ('roles per login', stats['roles']),
+            ('remaining seconds at cache miss', stats['remaining_at_miss']), ('sts seconds', stats['sts'])]
+    rows.extend(('idp seconds {0}'.format(host), distribution) for host, distribution in stats['idp'].items())
+    for name, values in rows:
+        lines.append('{0:<40s} {1:>7d}'.format(name, values['count']) +
+                     ''.join(' {0:>9s}'.format(format_value(values[key])) for key in list(values)[1:len(PERCENTILES) + 2]))
+    if stats['login']['sources']:
+        lines.extend(['', 'login sources: ' + ', '.join('{0} {1}'.format(source, count)
+                                                        for source, count in stats['login']['sources'].items())])
+    if stats['errors']:
+        lines.extend(['', '{0:<40s} {1:>7s}'.format('errors', 'count')])
+        lines.extend('{0:<40s} {1:>7d}'.format(error, count) for error, count in stats['errors'].items())
+    return '\n'.join(lines) + '\n'
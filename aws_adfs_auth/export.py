@@ -0,0 +1,134 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import json
+import os
+import re
+import shlex
+from collections import OrderedDict
+
+FORMATS = ('env', 'dotenv', 'json', 'ini')
+
+# variables which would make the SDKs use a profile instead of the injected credentials
+PROFILE_VARIABLES = ('AWS_PROFILE', 'AWS_DEFAULT_PROFILE')
+
+
+def role_names(role_arn, aliases):
+    """Function to return the names of a cached role, as accepted by --role."""
+    # the Role model is only needed (and its xml parser only imported) when looking up roles
+    from .saml import Role
+    return Role(role_arn, None, aliases).names()
+
+
+def profile_for_role(role):
+    """Function to build the profile name under which exec caches the credentials of a --role."""
+    return re.sub(r'[^\w.-]+', '-', role).strip('-')
+
+
+def find_profile(credential_cache, role, aliases, margin=0):
+    """Function to return the cached profile of role (ARN, <account>:<role> or <alias>:<role>) which is
+    valid for at least margin seconds and expires last, None if there is none."""
+    found = None
+    for profile in credential_cache.profiles():
+        entry = credential_cache.get(profile)
+        if role in role_names(entry['RoleArn'], aliases) and credential_cache.is_valid(profile, margin):
+            if found is None or entry['Expiration'] > credential_cache.get(found)['Expiration']:
+                found = profile
+    return found
+
+
+def variables(entry, region=None, suffix=''):
+    """Function to return the environment variables of the cached credentials of a profile."""
+    values = OrderedDict([
+        ('AWS_ACCESS_KEY_ID', entry['AccessKeyId']),
+        ('AWS_SECRET_ACCESS_KEY', entry['SecretAccessKey']),
+        ('AWS_SESSION_TOKEN', entry['SessionToken']),
+        ('AWS_CREDENTIAL_EXPIRATION', entry['Expiration']),
+    ])
+    if region:
+        values['AWS_REGION'] = region
+        values['AWS_DEFAULT_REGION'] = region
+    return OrderedDict((name + suffix, value) for name, value in values.items())
+
+
+def environment(entry, region=None, base=None):
+    """Function to build the environment of a child process with the credentials of a profile."""
+    env = dict(os.environ if base is None else base)
+    for name in PROFILE_VARIABLES:
+        env.pop(name, None)
+    env.update(variables(entry, region))
+    return env
+
+
+def profiles_values(entries, region=None, output=None):
+    """Function to return the credentials file options of many profiles (profile -> cache entry)."""
+    from .credentials_file import profile_values
+    values = OrderedDict()
+    for profile, entry in entries.items():
+        values[profile] = OrderedDict((key, value) for key, value in profile_values(entry, region, output).items()
+                                      if value is not None)
+    return values
+
+
+def render(entries, output_format, region=None, output=None):
+    """Function to format the cached credentials of many profiles (profile -> cache entry), output is
+    the AWS CLI output format of the ini format.
+
+    In the env and dotenv formats the variables of a single profile have the usual names, with
+    several profiles they get the profile as suffix, e.g. AWS_ACCESS_KEY_ID_PRODUCTION_ADMIN."""
+    if output_format == 'json':
+        document = OrderedDict()
+        for profile, entry in entries.items():
+            document[profile] = OrderedDict([
+                ('RoleArn', entry['RoleArn']),
+                ('AccessKeyId', entry['AccessKeyId']),
+                ('SecretAccessKey', entry['SecretAccessKey']),
+                ('SessionToken', entry['SessionToken']),
+                ('Expiration', entry['Expiration']),
+                ('Region', region),
+            ])
+        return json.dumps(document, indent=2) + '\n'
+
+    lines = []
+    if output_format == 'ini':
+        for profile, values in profiles_values(entries, region, output).items():
+            lines.append('[{0}]'.format(profile))
+            lines.extend('{0} = {1}'.format(key, value) for key, value in values.items())
+            lines.append('')
+        return ''.join(line + '\n' for line in lines)
+
+    for profile, entry in entries.items():
+        suffix = '_' + re.sub(r'[^A-Z0-9]+', '_', profile.upper()).strip('_') if len(entries) > 1 else ''
+        for name, value in variables(entry, region, suffix).items():
+            if output_format == 'env':
+                lines.append('export {0}={1}'.format(name, shlex.quote(value)))
+            else:
+                lines.append('{0}="{1}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"')))
+    return ''.join(line + '\n' for line in lines)
+
+
+def write(output, filename=None):
+    """Function to write the export to stdout or to a file readable only by the current user."""
+    if filename is None:
+        print(output, end='')
+        return
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.chmod(filename, 0o600)
+    with os.fdopen(fd, 'w') as export_file:
+        export_file.write(output)
@@ -0,0 +1,129 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import codecs
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+
+class Form(object):
+    """A html form with its action, method and the values of its input fields."""
+
+    def __init__(self, attrs):
+        self.id = attrs.get('id')
+        self.name = attrs.get('name')
+        self.action = attrs.get('action') or ''
+        self.method = (attrs.get('method') or 'get').upper()
+        self.fields = OrderedDict()
+
+    def __getitem__(self, key):
+        return self.fields[key]
+
+    def __setitem__(self, key, value):
+        self.fields[key] = value
+
+
+class StopParsing(Exception):
+    pass
+
+
+class PageExtractor(HTMLParser):
+    """Streaming parser collecting the forms and the SAMLResponse of an ADFS page.
+
+    Parsing stops as soon as the SAMLResponse is found or, if stop_after_form is
+    given, when that form has been read completely."""
+
+    def __init__(self, stop_after_form=None):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.stop_after_form = stop_after_form
+        self.forms = []
+        self.saml_response = None
+        self.form = None
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'form':
+            self.form = Form(dict(attrs))
+            self.forms.append(self.form)
+        elif tag == 'input':
+            attrs = dict(attrs)
+            name = attrs.get('name')
+            if name == 'SAMLResponse':
+                self.saml_response = attrs.get('value') or ''
+                raise StopParsing()
+            if self.form is not None and name:
+                if attrs.get('type', '').lower() in ('checkbox', 'radio') and 'checked' not in attrs:
+                    return
+                if attrs.get('type', '').lower() in ('submit', 'button', 'image', 'reset'):
+                    return
+                self.form[name] = attrs.get('value') or ''
+
+    handle_startendtag = handle_starttag
+
+    def handle_endtag(self, tag):
+        if tag == 'form' and self.form is not None:
+            form, self.form = self.form, None
+            if self.stop_after_form is not None and self.stop_after_form in (form.id, form.name):
+                raise StopParsing()
+
+    def feed(self, data):
+        if self.done:
+            return
+        try:
+            HTMLParser.feed(self, data)
+        except StopParsing:
+            self.done = True
+
+    def get_form(self, form_id):
+        """Function to return the form with the given id (or name) or None."""
+        for form in self.forms:
+            if form_id in (form.id, form.name):
+                return form
+        return None
+
+
+def extract(chunks, encoding='utf-8', stop_after_form=None):
+    """Function to parse an iterable of byte (or str) chunks until everything needed was found."""
+    extractor = PageExtractor(stop_after_form=stop_after_form)
+    decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        extractor.feed(chunk)
+        if extractor.done:
+            break
+    else:
+        extractor.feed(decoder.decode(b'', final=True))
+        extractor.close()
+    return extractor
+
+
+def extract_response(response, stop_after_form=None, chunk_size=16384, drain_limit=262144):
+    """Function to parse a streamed requests response. The remaining body is only read (to keep the
+    connection alive) if it is smaller than drain_limit, otherwise the connection is closed."""
+    try:
+        return extract(response.iter_content(chunk_size=chunk_size), encoding=response.encoding,
+                       stop_after_form=stop_after_form)
+    finally:
+        length = response.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) <= drain_limit:
+            response.raw.drain_conn()
+            response.raw.release_conn()
+        else:
+            response.close()
@@ -17,39 +17,252 @@ specific language governing permissions and limitations
 under the License.
 """
 
+import os
 import sys
+import json
+import contextlib
+from collections import OrderedDict
 
-from . import cli, configuration, utils, ms_adfs
+from . import cli, configuration, utils, cache, events, timings
 
 
-def main():
-    """ main function """
+def credentials_cached(logger, config, options):
+    """ check if the credentials of the requested profile(s) are still valid """
+    if options.force:
+        return False
+    credential_cache = cache.create(logger, config)
+    margin = config.getint('aws', 'refresh_margin', fallback=300)
+    if options.all_roles and not options.credential_process:
+        valid = credential_cache.is_batch_valid(margin)
+        events.emit('cache', mode=run_mode(options), hit=valid, profile=None, remaining=None)
+        return valid
+    profile = options.profile or config.get('provider', 'profile_name')
+    valid = credential_cache.is_valid(profile, margin) and cached_role_matches(config, options, credential_cache.get(profile))
+    events.emit('cache', mode=run_mode(options), hit=valid, profile=profile, remaining=credential_cache.remaining(profile))
+    return valid
 
-    # process command line arguments...
-    options = cli.check_args()
 
-    # setup logging
-    logger = utils.setup_logging(options)
-    logger.debug("Got options: %s", options)
+def cached_role_matches(config, options, entry):
+    """ check if the cached credentials are the ones of the role requested with --role (if any) """
+    role = getattr(options, 'role', None)
+    if not role:
+        return True
+    from . import account_aliases, export
+    return role in export.role_names(entry['RoleArn'], account_aliases.known(config))
+
+
+def run_mode(options):
+    """ the mode of the run for the event log """
+    if options.command:
+        return options.command
+    if options.credential_process:
+        return 'credential_process'
+    return 'all_roles' if options.all_roles else 'login'
+
+
+def authenticate(logger, config, options):
+    """ authenticate with the configured provider unless the cached credentials are still valid """
+    if credentials_cached(logger, config, options):
+        print('The cached credentials are still valid, use --force to authenticate anyway.')
+        return None
+    name = config.get('provider', 'name')
+    logger.info('Using %s federation' % name)
+    # imported here as the login dependencies are only needed when we really authenticate
+    from . import providers, abstract_adfs
+    try:
+        return providers.create(name, logger, config, options).authenticate()
+    except (providers.UnknownProviderError, abstract_adfs.AuthenticationError) as e:
+        events.emit('error', mode=run_mode(options), error=type(e).__name__)
+        cli.error("error: {0}".format(e))
+    return None
+
+
+def run_daemon(logger, config, options):
+    """ authenticate once and keep the credentials fresh in the background """
+    # the daemon needs a live ADFS session for the refreshes, so we always login first
+    options.force = True
+    provider = authenticate(logger, config, options)
+    if provider is None:
+        return
+    from . import daemon
+    refresh_daemon = daemon.RefreshDaemon(logger, config, provider.adfs)
+    if not options.serve:
+        refresh_daemon.run()
+        return
+
+    from . import broker
+    credential_broker = broker.CredentialBroker(logger, provider.adfs.cache,
+                                                host=config.get('broker', 'host', fallback='127.0.0.1'),
+                                                port=config.getint('broker', 'port', fallback=9911))
+    token_file = config.get('broker', 'token_file', fallback=configuration.Configure.aws_folder + '/adfs_auth_broker_token')
+    credential_broker.write_token(token_file)
+    credential_broker.start()
+    print('Serving the credentials for the AWS SDKs, e.g. with')
+    for profile in sorted(refresh_daemon.profiles):
+        print('  AWS_CONTAINER_CREDENTIALS_FULL_URI={0} AWS_CONTAINER_AUTHORIZATION_TOKEN_FILE={1}'.format(
+            credential_broker.url(profile), token_file))
+    try:
+        refresh_daemon.run()
+    finally:
+        credential_broker.stop()
+
+
+def run_batch(logger, config, options):
+    """ refresh all (or the selected) targets of the config file concurrently """
+    from . import batch
+    targets = batch.read_targets(config, options.targets_file, options.batch)
+    if not targets:
+        cli.error("error: No targets found, please add [target:<name>] sections to the config or targets file")
+    results = batch.BatchRefresher(logger, config, targets).run()
+    batch.print_report(results)
+    if any(result.error is not None for result in results):
+        sys.exit(1)
+
+
+def credential_process(logger, config, options):
+    """ print the credentials for the credential_process setting, stdout is reserved for the JSON document """
+    # the SDKs only report stderr, so the messages and errors go there as well
+    with contextlib.redirect_stdout(sys.stderr):
+        authenticate(logger, config, options)
+        profile = options.profile or config.get('provider', 'profile_name')
+        credential_cache = cache.create(logger, config)
+        if credential_cache.get(profile) is None:
+            cli.error("error: No credentials for profile {0}".format(profile))
+    print(json.dumps(credential_cache.credential_process_document(profile)))
+
+
+def run_exec(logger, config, options):
+    """ run a command with the credentials of a role (or profile) in its environment, a login is only done if
+    the cached credentials are not valid anymore """
+    from . import account_aliases, export
+    command = options.exec_command or []
+    if command and command[0] == '--':
+        command = command[1:]
+    if not command:
+        cli.error("error: No command given, e.g. aws_adfs_auth exec --role Production:ReadOnly -- aws s3 ls")
+    margin = config.getint('aws', 'refresh_margin', fallback=300)
+    credential_cache = cache.create(logger, config)
+    aliases = account_aliases.known(config)
+    if options.profile:
+        profile = options.profile if credential_cache.is_valid(options.profile, margin) else None
+    elif options.role:
+        profile = export.find_profile(credential_cache, options.role, aliases, margin)
+    else:
+        options.profile = config.get('provider', 'profile_name')
+        profile = options.profile if credential_cache.is_valid(options.profile, margin) else None
+    cached_profile = profile or options.profile
+    events.emit('cache', mode='exec', hit=profile is not None, profile=cached_profile,
+                remaining=credential_cache.remaining(cached_profile) if cached_profile else None)
 
-    configure = configuration.Configure(logger)
+    if profile is None:
+        # the output of the login must not mix with the output of the command
+        options.profile = options.profile or export.profile_for_role(options.role)
+        options.force = True
+        with contextlib.redirect_stdout(sys.stderr):
+            authenticate(logger, config, options)
+        profile = options.profile
+        credential_cache = cache.create(logger, config)
+        if credential_cache.get(profile) is None:
+            cli.error("error: No credentials for profile {0}".format(profile))
 
-    # checking the configuration file...
-    config_ok = configure.check_config()
-    if not config_ok and not options.configure:
-        cli.error("error: Not configured yet. Please configure with -C")
+    env = export.environment(credential_cache.get(profile), config.get('aws', 'region', fallback=None))
+    logger.debug("running %s with the credentials of profile %s" % (command[0], profile))
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        os.execvpe(command[0], command, env)
+    except OSError as e:
+        cli.error("error: Could not run {0}: {1}".format(command[0], e))
+
+
+def run_export(logger, config, options):
+    """ print the cached credentials of many profiles for shells and tools """
+    from . import export
+    credential_cache = cache.create(logger, config)
+    profiles = options.profiles or [profile for profile in credential_cache.profiles() if credential_cache.is_valid(profile)]
+    missing = [profile for profile in profiles if not credential_cache.is_valid(profile)]
+    if missing:
+        cli.error("error: No valid credentials for {0}, please authenticate first".format(', '.join(missing)))
+    entries = OrderedDict((profile, credential_cache.get(profile)) for profile in profiles)
+    region = config.get('aws', 'region', fallback=None)
+    output = config.get('aws', 'outputformat', fallback=None)
+    if options.export_format == 'ini' and options.export_file:
+        # only the exported profiles are replaced, e.g. in ~/.aws/credentials
+        from .credentials_file import CredentialsFile
+        CredentialsFile(logger, options.export_file).update(export.profiles_values(entries, region, output))
+        return
+    export.write(export.render(entries, options.export_format, region, output), options.export_file)
+
+
+def run_stats(logger, config, options):
+    """ aggregate the event log (or the given logs, e.g. collected from many workstations) """
+    filenames = options.event_files or events.LOG.files()
+    if not filenames:
+        cli.error("error: No event log found, please enable it with enabled = True in the [events] section")
+    try:
+        stats = events.aggregate(events.read(filenames))
+    except (IOError, OSError) as e:
+        cli.error("error: Could not read the event log: {0}".format(e))
+    if options.stats_json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print(events.table(stats), end='')
+
+
+def run(logger, options):
+    """ run the requested mode with the configuration """
+    with timings.span('config'):
+        configure = configuration.Configure(logger)
+
+        # checking the configuration file...
+        config_ok = configure.check_config()
+        if not config_ok and not options.configure:
+            cli.error("error: Not configured yet. Please configure with -C")
 
     if options.configure:
         logger.debug("creating configuration")
         configure.setup()
     else:
         logger.debug("running application with configuration")
-        config = configure.open_config()
-        # migrating the configuration if necessary
-        configure.migrate(config)
-        if config.get('provider', 'name') == 'Microsoft':
-            logger.info('Using Microsoft federation')
-            provider = ms_adfs.MicrosoftADFS(logger, config)
+        with timings.span('config'):
+            config = configure.open_config()
+            # migrating the configuration if necessary
+            configure.migrate(config)
+        events.configure(config)
+        if options.command == 'exec':
+            run_exec(logger, config, options)
+        elif options.command == 'export':
+            run_export(logger, config, options)
+        elif options.command == 'stats':
+            run_stats(logger, config, options)
+        elif options.credential_process:
+            credential_process(logger, config, options)
+        elif options.batch is not None:
+            run_batch(logger, config, options)
+        elif options.daemon or options.serve:
+            run_daemon(logger, config, options)
+        else:
+            authenticate(logger, config, options)
+
+
+def main():
+    """ main function """
+
+    # process command line arguments...
+    options = cli.check_args()
+
+    # setup logging
+    logger = utils.setup_logging(options)
+    logger.debug("Got options: %s", options)
+
+    if options.timings:
+        timings.RECORDER.enable()
+    try:
+        with timings.span('total'):
+            run(logger, options)
+    finally:
+        if options.timings:
+            timings.report(options.timings, options.timings_file)
 
 
 if __name__ == '__main__':
@@ -1,26 +1,39 @@
-from . import abstract_adfs
+from . import abstract_adfs, providers, secret, timings
 
-class MicrosoftADFS:
+class MicrosoftADFS(providers.Provider):
+    """Microsoft ADFS with forms based authentication (loginForm)."""
+    name = 'Microsoft'
 
-    def __init__(self, logger, config):
-        logger.info("initialize MicrosoftADFS")
-        self.logger = logger
-        self.config = config
-        self.adfs = abstract_adfs.AbstractADFS(logger,config)
+    def fetch_assertion(self):
+        """Function to open the IdP with the cookies of the last session, the SAMLResponse is returned if
+        the ADFS SSO session is still valid."""
+        with timings.span('fetch_assertion'):
+            self.adfs.init_browser()
+            if not self.adfs.has_saml_response():
+                return None
+            # the ADFS SSO cookie of the last session is still valid, no need to login again
+            self.logger.info("reusing the existing ADFS session")
+            self.adfs.save_cookies()
+        return self.adfs.page.saml_response
 
-        username, password = self.adfs.get_username_password()
+    def login(self):
+        """Function to fill in and submit the loginForm of the ADFS until the page carries the SAML assertion."""
+        with timings.span('login'):
+            if getattr(self.adfs, 'session', None) is None:
+                self.adfs.init_browser()
+            # includes the time the user needs to type the password
+            with timings.span('credentials'):
+                username, password = self.adfs.get_username_password()
+            form = self.adfs.get_form('loginForm')
+            if (form is not None):
+                form["UserName"] = username
+            else:
+                raise abstract_adfs.AuthenticationError('Could not find the required forms. Maybe different provider')
 
-        browser = self.adfs.init_browser()
-        if (browser.find(id='loginForm')):
-            form = browser.get_form(id='loginForm')
-            form["UserName"] = username
-            form["Password"] = password
-        else:
-            print ('Could not find the required forms. Maybe different provider')
-            sys.exit(1)
+            # Submitting the form, from here on the password is only kept in a buffer which is zeroed afterwards
+            with secret.SecretBuffer.from_str(password) as password:
+                self.adfs.delete_username_password()
+                self.adfs.submit_form(form, secrets={"Password": password})
 
-        # Submitting the form
-        browser.submit_form(form)
-
-        self.adfs.delete_username_password()
-        self.adfs.handle_saml()
+            self.adfs.save_cookies()
+        return self.adfs.page.saml_response
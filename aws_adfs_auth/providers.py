@@ -0,0 +1,172 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import importlib
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from . import events
+
+# third party providers register a Provider subclass in this entry point group, e.g. in setup.py:
+# entry_points={'aws_adfs_auth.providers': ['Okta = aws_adfs_okta:OktaProvider']}
+ENTRY_POINT_GROUP = 'aws_adfs_auth.providers'
+
+# the built-in providers are loaded without scanning the installed packages for entry points
+BUILTIN_PROVIDERS = OrderedDict([
+    ('Microsoft', 'aws_adfs_auth.ms_adfs:MicrosoftADFS'),
+])
+
+
+class UnknownProviderError(Exception):
+    pass
+
+
+class Provider(object):
+    """Base class of the identity providers.
+
+    Getting the SAML assertion is split in two steps: fetch_assertion() reuses an existing IdP
+    session without any user interaction, login() asks for the credentials and signs in. The roles
+    of the assertion are then handled by the shared AbstractADFS code (self.adfs)."""
+    name = None
+
+    def __init__(self, logger, config, options=None):
+        # the login dependencies are only imported when a provider is really used
+        from .abstract_adfs import AbstractADFS
+        logger.info("initialize %s provider" % self.name)
+        self.logger = logger
+        self.config = config
+        self.options = options
+        self.adfs = AbstractADFS(logger, config, options)
+        self.assertions = None
+        if config.getboolean('provider', 'reuse_assertion', fallback=False):
+            from .cache import AssertionCache
+            self.assertions = AssertionCache(logger, config.get('provider', 'assertion_file', fallback=None))
+
+    def fetch_assertion(self):
+        """Function to return a SAML assertion of the existing IdP session, None if a login is needed."""
+        return None
+
+    def login(self):
+        """Function to sign in with the credentials of the user and return the SAML assertion."""
+        raise NotImplementedError()
+
+    def get_assertion(self):
+        """Function to return a SAML assertion, signing in only if the IdP session cannot be reused."""
+        assertion = self.fetch_assertion()
+        self.source = 'session'
+        if assertion is None:
+            assertion = self.login()
+            self.source = 'login'
+        return assertion
+
+    def idp(self):
+        return self.config.get('provider', 'idpentryurl')
+
+    def username(self):
+        """Function to return the user the assertions are kept for, an assertion of another user is never reused."""
+        return os.environ.get('AWS_ADFS_USERNAME') or self.config.get('msadfs', 'username', fallback=None)
+
+    def cached_assertion(self):
+        """Function to return the assertion of an earlier run which is still valid, None if there is none
+        or the reuse is not enabled with [provider] reuse_assertion (or --force asks for a new login)."""
+        if self.assertions is None or getattr(self.options, 'force', False):
+            return None
+        return self.assertions.get(self.idp(), self.config.getint('provider', 'reuse_margin', fallback=60),
+                                   self.username())
+
+    def authenticate(self):
+        """Function to get the AWS credentials of the selected role(s) and record the login in the event log."""
+        start = time.monotonic()
+        self.source = None
+        # logins without a matching login event were interrupted
+        events.emit('login_start', provider=self.name, idp=self.idp_host())
+        try:
+            self.get_credentials()
+        except Exception as e:
+            events.emit('login', provider=self.name, idp=self.idp_host(), source=self.source,
+                        duration=round(time.monotonic() - start, 3), roles=None, error=type(e).__name__)
+            raise
+        saml = getattr(self.adfs, 'saml', None)
+        events.emit('login', provider=self.name, idp=self.idp_host(), source=self.source,
+                    duration=round(time.monotonic() - start, 3), roles=len(saml.roles) if saml else None, error=None)
+        return self
+
+    def idp_host(self):
+        return urlsplit(self.idp()).netloc
+
+    def get_credentials(self):
+        """Function to get a SAML assertion, a still valid one of an earlier run if possible, and turn it
+        into AWS credentials of the selected role(s)."""
+        from .abstract_adfs import AssumeRoleError, AuthenticationError, RoleNotFoundError, StsRequestError
+        assertion = self.cached_assertion()
+        if assertion is not None:
+            self.source = 'assertion'
+            try:
+                self.adfs.handle_saml(assertion)
+                return
+            except (AssumeRoleError, RoleNotFoundError, StsRequestError) as e:
+                # STS did not accept it for the role(s), e.g. because of a clock skew, or the role was
+                # granted after it was issued
+                self.logger.info("the reused SAML assertion was rejected: %s" % e)
+                self.assertions.clear()
+            except AuthenticationError:
+                raise
+            except Exception as e:
+                # a new one is fetched instead
+                self.logger.info("the reused SAML assertion was rejected: %s" % e)
+                self.assertions.clear()
+        assertion = self.get_assertion()
+        self.adfs.handle_saml(assertion)
+        if self.assertions is not None:
+            self.assertions.store(self.idp(), assertion, self.adfs.saml.not_on_or_after, self.username())
+
+
+def entry_points():
+    from importlib import metadata
+    try:
+        return list(metadata.entry_points(group=ENTRY_POINT_GROUP))
+    except TypeError:  # python < 3.10
+        return list(metadata.entry_points().get(ENTRY_POINT_GROUP, []))
+
+
+def names():
+    """Function to return the names of all available providers, built-in ones first."""
+    available = list(BUILTIN_PROVIDERS)
+    for entry_point in entry_points():
+        if entry_point.name not in available:
+            available.append(entry_point.name)
+    return available
+
+
+def load(name):
+    """Function to import the provider class registered under name."""
+    if name in BUILTIN_PROVIDERS:
+        module, _, attribute = BUILTIN_PROVIDERS[name].partition(':')
+        return getattr(importlib.import_module(module), attribute)
+    for entry_point in entry_points():
+        if entry_point.name == name:
+            return entry_point.load()
+    raise UnknownProviderError('unknown provider {0}, available providers: {1}'.format(name, ', '.join(names())))
+
+
+def create(name, logger, config, options=None):
+    """Function to create the provider registered under name."""
+    return load(name)(logger, config, options)
@@ -0,0 +1,185 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import json
+import os
+import time
+from os.path import expanduser
+
+from .credentials_file import locked, replace_file
+
+# the weight of a selection halves every week
+HALF_LIFE = 7 * 24 * 3600
+
+
+class RoleHistory(object):
+    """The roles selected in the past, remembered by role ARN with their use count and last use."""
+    history_file = expanduser("~") + '/.aws/adfs_auth_roles.json'
+
+    def __init__(self, logger, history_file=None):
+        self.logger = logger
+        if history_file is not None:
+            self.history_file = history_file
+        self.data = None
+        # the selections since the last save (role ARN -> count, last use), added to the file by save()
+        self.pending = {}
+
+    def read(self):
+        try:
+            with open(self.history_file) as history_file:
+                return json.load(history_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def load(self):
+        if self.data is None:
+            self.data = self.read()
+        return self.data
+
+    def save(self):
+        """Function to add the selections of this run to the history file, read again under a lock so that
+        the selections of concurrent runs are kept."""
+        self.logger.debug("storing role history to %s" % self.history_file)
+        folder = os.path.dirname(os.path.abspath(self.history_file))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with locked(self.history_file):
+            merged = self.read()
+            for role_arn, (count, last_used) in self.pending.items():
+                entry = merged.setdefault(role_arn, {'count': 0, 'last_used': 0})
+                entry['count'] += count
+                entry['last_used'] = max(entry['last_used'], last_used)
+            replace_file(self.history_file, json.dumps(merged))
+        self.data = merged
+        self.pending = {}
+
+    def record(self, role_arn, now=None):
+        """Function to remember that a role was selected."""
+        now = now or time.time()
+        entry = self.load().setdefault(role_arn, {'count': 0, 'last_used': 0})
+        entry['count'] += 1
+        entry['last_used'] = now
+        count, _ = self.pending.get(role_arn, (0, 0))
+        self.pending[role_arn] = (count + 1, now)
+
+    def score(self, role_arn, now=None):
+        """Function to rank a role by frequency and recency of its use (frecency)."""
+        entry = self.load().get(role_arn)
+        if entry is None:
+            return 0.0
+        age = max(0.0, (now or time.time()) - entry['last_used'])
+        return entry['count'] * 0.5 ** (age / HALF_LIFE) + 1.0
+
+    def last_used(self, roles):
+        """Function to return the most recently used of the roles or None."""
+        used = [role for role in roles if role.role_arn in self.load()]
+        if not used:
+            return None
+        return max(used, key=lambda role: self.load()[role.role_arn]['last_used'])
+
+
+def fuzzy_score(query, text):
+    """Function to score how well query matches text, None if the characters of query are not all in text (in order).
+
+    Substring matches score best, then matches with the fewest gaps."""
+    if not query:
+        return 0
+    position = text.find(query)
+    if position >= 0:
+        return 1000 - position
+    score = 0
+    position = -1
+    for character in query:
+        found = text.find(character, position + 1)
+        if found < 0:
+            return None
+        score -= found - position - 1
+        position = found
+    return score
+
+
+class RolePicker(object):
+    """Interactive role selection: roles are ranked by their history and can be filtered with fuzzy text."""
+
+    def __init__(self, logger, history, page_size=30, input_function=None):
+        self.logger = logger
+        self.history = history
+        self.page_size = page_size
+        self.input_function = input_function or input
+
+    def label(self, role):
+        return '{0} {1}:{2}'.format(role.account_id, role.alias or '', role.role_name).lower()
+
+    def rank(self, roles, now=None):
+        """Function to sort the roles by frecency, then by alias (or account) and role name."""
+        now = now or time.time()
+        return sorted(roles, key=lambda role: (-self.history.score(role.role_arn, now),
+                                               (role.alias or role.account_id).lower(), role.role_name.lower()))
+
+    def filter(self, roles, query):
+        """Function to return the roles fuzzy matching the query, best matches first (stable for equal scores)."""
+        query = query.lower()
+        scored = []
+        for index, role in enumerate(roles):
+            score = fuzzy_score(query, self.label(role))
+            if score is None:
+                score = fuzzy_score(query, role.role_arn.lower())
+            if score is not None:
+                scored.append((-score, index, role))
+        scored.sort(key=lambda item: item[:2])
+        return [role for score, index, role in scored]
+
+    def show(self, roles, default):
+        for i, awsrole in enumerate(roles[:self.page_size]):
+            marker = '*' if awsrole is default else ' '
+            if awsrole.alias is not None:
+                print('[{:2d}]:{} {:10s} {:30s}:{:10s}'.format(i, marker, awsrole.account_id, awsrole.alias, awsrole.resource))
+            else:
+                print('[{:2d}]:{} {}'.format(i, marker, awsrole.role_arn))
+        if len(roles) > self.page_size:
+            print('... {0} more roles, type a part of the account alias or role name to filter'.format(len(roles) - self.page_size))
+
+    def pick(self, roles):
+        """Function to let the user choose one of the roles, by number or by filtering."""
+        ranked = self.rank(roles)
+        default = self.history.last_used(ranked)
+        shown = ranked
+        print("Please choose the role you would like to assume (type text to filter):")
+        while True:
+            self.show(shown, default)
+            if default is not None:
+                answer = self.input_function('Selection [{0}]: '.format(default.role_arn)).strip()
+            else:
+                answer = self.input_function('Selection: ').strip()
+            if not answer and default is not None:
+                return default
+            # a number is an index of the listed roles, otherwise e.g. a part of an account id to filter with
+            if answer.isdigit() and int(answer) < min(len(shown), self.page_size):
+                return shown[int(answer)]
+            matching = self.filter(ranked, answer)
+            if len(matching) == 1:
+                return matching[0]
+            if not matching and answer.isdigit():
+                print('You selected an invalid role index, please try again')
+                shown = ranked
+            elif not matching:
+                print('No role matches {0}'.format(answer))
+                shown = ranked
+            else:
+                shown = matching
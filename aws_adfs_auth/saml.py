@@ -0,0 +1,150 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import xml.etree.ElementTree as ET
+
+from .cache import parse_expiration
+from .secret import decode_base64
+
+SAML_NAMESPACE = '{urn:oasis:names:tc:SAML:2.0:assertion}'
+ROLE_ATTRIBUTE = 'https://aws.amazon.com/SAML/Attributes/Role'
+SESSION_DURATION_ATTRIBUTE = 'https://aws.amazon.com/SAML/Attributes/SessionDuration'
+ROLE_SESSION_NAME_ATTRIBUTE = 'https://aws.amazon.com/SAML/Attributes/RoleSessionName'
+
+# the maximum DurationSeconds accepted by AssumeRoleWithSAML
+MAX_DURATION = 43200
+
+
+class Role(object):
+    """A role of the assertion with the principal (SAML provider) to assume it with."""
+    __slots__ = ('role_arn', 'principal_arn', 'account_id', 'resource', 'role_name', 'alias')
+
+    def __init__(self, role_arn, principal_arn, aliases=None):
+        self.role_arn = role_arn
+        self.principal_arn = principal_arn
+        parts = role_arn.split(':', 5)
+        self.account_id = parts[4]
+        self.resource = parts[5]
+        self.role_name = self.resource.rsplit('/', 1)[-1]
+        self.alias = (aliases or {}).get(self.account_id)
+
+    @classmethod
+    def from_attribute(cls, value, aliases=None):
+        # Note the format of the attribute value should be role_arn,principal_arn
+        # but lots of blogs list it as principal_arn,role_arn so let's reverse
+        # them if needed
+        first, second = [chunk.strip() for chunk in value.split(',', 1)]
+        if 'saml-provider' in first:
+            first, second = second, first
+        return cls(first, second, aliases)
+
+    def names(self):
+        """Function to return the names the role can be referred to: ARN, <account>:<role> and <alias>:<role>."""
+        return (self.role_arn,
+                '{0}:{1}'.format(self.account_id, self.role_name),
+                '{0}:{1}'.format(self.alias or self.account_id, self.role_name))
+
+    def __repr__(self):
+        return '{0},{1}'.format(self.role_arn, self.principal_arn)
+
+    def __eq__(self, other):
+        return isinstance(other, Role) and self.role_arn == other.role_arn and self.principal_arn == other.principal_arn
+
+    def __hash__(self):
+        return hash((self.role_arn, self.principal_arn))
+
+
+class SamlAssertion(object):
+    """The SAML assertion, decoded and parsed once, with its roles indexed by ARN, account, role name and alias."""
+
+    def __init__(self, encoded, aliases=None):
+        self.encoded = encoded
+        self.roles = []
+        self.session_duration = None
+        self.not_on_or_after = None
+        self.role_session_name = None
+        self.by_arn = {}
+        self.by_account = {}
+        self.by_role_name = {}
+        self.by_alias = {}
+        self.parse(decode_base64(encoded), aliases)
+
+    def parse(self, chunks, aliases):
+        """Function to parse the decoded assertion chunk by chunk. Every element is cleared once it was
+        handled, so neither the decoded document nor its tree (e.g. the signature) are kept as a whole."""
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        self.attribute_name = None
+        for chunk in chunks:
+            parser.feed(chunk)
+            self.handle_elements(parser.read_events(), aliases)
+        parser.close()
+        self.handle_elements(parser.read_events(), aliases)
+
+    def handle_elements(self, events, aliases):
+        for event, element in events:
+            if event == 'start':
+                if element.tag == SAML_NAMESPACE + 'Attribute':
+                    self.attribute_name = element.get('Name')
+                continue
+            if element.tag == SAML_NAMESPACE + 'AttributeValue':
+                if element.text:
+                    self.handle_attribute(self.attribute_name, element.text, aliases)
+            elif element.tag == SAML_NAMESPACE + 'Attribute':
+                self.attribute_name = None
+            elif element.tag in (SAML_NAMESPACE + 'Conditions', SAML_NAMESPACE + 'SubjectConfirmationData'):
+                if element.get('NotOnOrAfter'):
+                    not_on_or_after = parse_expiration(element.get('NotOnOrAfter'))
+                    if self.not_on_or_after is None or not_on_or_after < self.not_on_or_after:
+                        self.not_on_or_after = not_on_or_after
+            element.clear()
+
+    def handle_attribute(self, name, value, aliases):
+        if name == ROLE_ATTRIBUTE:
+            self.add_role(Role.from_attribute(value, aliases))
+        elif name == SESSION_DURATION_ATTRIBUTE and self.session_duration is None:
+            self.session_duration = int(value)
+        elif name == ROLE_SESSION_NAME_ATTRIBUTE and self.role_session_name is None:
+            self.role_session_name = value
+
+    def add_role(self, role):
+        if role.role_arn in self.by_arn:
+            return
+        self.roles.append(role)
+        self.by_arn[role.role_arn] = role
+        self.by_account.setdefault(role.account_id, []).append(role)
+        self.by_role_name.setdefault(role.role_name, []).append(role)
+        if role.alias:
+            self.by_alias.setdefault(role.alias, []).append(role)
+
+    def find(self, name):
+        """Function to return the roles matching a role ARN, <account>:<role> or <alias>:<role>."""
+        if name in self.by_arn:
+            return [self.by_arn[name]]
+        account, _, role_name = name.rpartition(':')
+        candidates = self.by_account.get(account, []) + self.by_alias.get(account, [])
+        return [role for role in candidates if role.role_name == role_name]
+
+    def duration(self, requested=None):
+        """Function to return the DurationSeconds to request: the configured value, otherwise the
+        SessionDuration of the assertion (3600 without one).
+
+        STS rejects a DurationSeconds above the MaxSessionDuration of the role, the caller then retries
+        with 3600."""
+        duration = requested or self.session_duration or 3600
+        return max(900, min(duration, MAX_DURATION))
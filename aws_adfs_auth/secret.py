@@ -0,0 +1,145 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import binascii
+import re
+
+# the bytes quote_plus leaves as they are
+SAFE_BYTES = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-~')
+HEX_DIGITS = b'0123456789ABCDEF'
+
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+
+
+def utf8_length(code):
+    return 1 if code < 0x80 else 2 if code < 0x800 else 3 if code < 0x10000 else 4
+
+
+def quoted_length(data):
+    return sum(1 if byte in SAFE_BYTES or byte == 0x20 else 3 for byte in data)
+
+
+class SecretBuffer(object):
+    """A secret in a mutable buffer of fixed size, which is zeroed by clear() or when leaving a with block.
+
+    It can be passed as body of a request: requests streams it, read() returns views into the buffer
+    instead of copies, and urllib3 rewinds it with seek() when it repeats the request."""
+
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.position = 0
+
+    @classmethod
+    def from_str(cls, value):
+        """Function to copy a str into a new buffer, encoded as UTF-8 without a temporary bytes copy."""
+        secret = cls(sum(utf8_length(ord(char)) for char in value))
+        buffer, offset = secret.buffer, 0
+        for char in value:
+            code = ord(char)
+            length = utf8_length(code)
+            if length == 1:
+                buffer[offset] = code
+            else:
+                for index in range(length - 1, 0, -1):
+                    buffer[offset + index] = 0x80 | (code & 0x3F)
+                    code >>= 6
+                buffer[offset] = (0xF00 >> length) & 0xFF | code
+            offset += length
+        return secret
+
+    def view(self):
+        return memoryview(self.buffer)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __iter__(self):
+        yield self.view()
+
+    def read(self, size=-1):
+        end = len(self.buffer) if size is None or size < 0 else min(len(self.buffer), self.position + size)
+        chunk = self.view()[self.position:end]
+        self.position = end
+        return chunk
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        self.position = max(0, min(len(self.buffer), offset + (0, self.position, len(self.buffer))[whence]))
+        return self.position
+
+    def clear(self):
+        """Function to overwrite the secret with zeros."""
+        self.buffer[:] = bytes(len(self.buffer))
+        self.position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.clear()
+
+    def __repr__(self):
+        return '<SecretBuffer of {0} bytes>'.format(len(self.buffer))
+
+
+def quote_into(buffer, offset, data):
+    """Function to write the data (bytes-like) quote_plus encoded into the buffer at offset, returns the new offset."""
+    for byte in data:
+        if byte in SAFE_BYTES:
+            buffer[offset] = byte
+            offset += 1
+        elif byte == 0x20:
+            buffer[offset] = 0x2B
+            offset += 1
+        else:
+            buffer[offset] = 0x25
+            buffer[offset + 1] = HEX_DIGITS[byte >> 4]
+            buffer[offset + 2] = HEX_DIGITS[byte & 0x0F]
+            offset += 3
+    return offset
+
+
+def encode_form(fields, secrets):
+    """Function to url encode the form fields (name -> str) and the secrets (name -> SecretBuffer) into a
+    SecretBuffer. Its size is computed up front, so the buffer is never grown (which would leave a copy behind)."""
+    parts = [(name.encode('utf-8'), secrets[name].view() if name in secrets else str(value).encode('utf-8'))
+             for name, value in fields.items()]
+    parts.extend((name.encode('utf-8'), secret.view()) for name, secret in secrets.items() if name not in fields)
+    body = SecretBuffer(sum(quoted_length(name) + 1 + quoted_length(value) for name, value in parts) + len(parts) - 1)
+    offset = 0
+    for index, (name, value) in enumerate(parts):
+        if index:
+            body.buffer[offset] = 0x26
+            offset += 1
+        offset = quote_into(body.buffer, offset, name)
+        body.buffer[offset] = 0x3D
+        offset = quote_into(body.buffer, offset + 1, value)
+    return body
+
+
+def decode_base64(encoded, chunk_size=65536):
+    """Generator decoding base64 in chunks of chunk_size characters, so that the decoded data (e.g. the
+    SAML assertion) never exists as a whole in memory."""
+    if re.search(r'\s', encoded):
+        encoded = re.sub(r'\s+', '', encoded)
+    chunk_size -= chunk_size % 4
+    for start in range(0, len(encoded), chunk_size):
+        yield binascii.a2b_base64(encoded[start:start + chunk_size])
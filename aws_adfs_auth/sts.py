@@ -0,0 +1,165 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import xml.etree.ElementTree as ET
+from urllib.parse import quote_plus
+
+import requests
+
+from . import transport
+from .cache import parse_expiration
+
+STS_NAMESPACE = '{https://sts.amazonaws.com/doc/2011-06-15/}'
+
+# errors of the Query API which are worth another try
+RETRY_CODES = ('Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'ServiceUnavailable', 'InternalFailure',
+               'IDPCommunicationError')
+
+# the DNS suffixes of the partitions other than aws, by the prefix of their regions
+PARTITION_SUFFIXES = (('cn-', 'amazonaws.com.cn'), ('us-isob-', 'sc2s.sgov.gov'), ('us-iso-', 'c2s.ic.gov'))
+
+
+class StsError(Exception):
+    """Error returned by the STS Query API."""
+
+    def __init__(self, code, message, status_code=None):
+        Exception.__init__(self, '{0}: {1}'.format(code, message))
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+
+
+def is_request_error(error):
+    """Function to check if the error is one of STS or of the connection to it, of this client or of boto3."""
+    return isinstance(error, (StsError, requests.RequestException)) or type(error).__module__ == 'botocore.exceptions'
+
+
+def error_code(error):
+    """Function to return the STS error code of the error (e.g. AccessDenied), its class name for other errors."""
+    if isinstance(error, StsError):
+        return error.code
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict) and response.get('Error', {}).get('Code'):
+        # botocore ClientError
+        return response['Error']['Code']
+    return getattr(error, 'code', None) or type(error).__name__
+
+
+def is_duration_error(error):
+    """Function to check if STS rejected the DurationSeconds, e.g. as it exceeds the MaxSessionDuration of the role."""
+    return error_code(error) == 'ValidationError' and ('DurationSeconds' in str(error) or
+                                                       'MaxSessionDuration' in str(error))
+
+
+def regional_endpoint(region=None):
+    """Function to return the STS endpoint of the region, in the DNS suffix of its partition (e.g.
+    sts.cn-north-1.amazonaws.com.cn), the global endpoint without a region."""
+    if not region:
+        return 'https://sts.amazonaws.com/'
+    suffix = next((suffix for prefix, suffix in PARTITION_SUFFIXES if region.startswith(prefix)), 'amazonaws.com')
+    return 'https://sts.{0}.{1}/'.format(region, suffix)
+
+
+class StsClient(object):
+    """Minimal STS client for AssumeRoleWithSAML, which is an unsigned Query API call.
+
+    The responses are returned in the same structure as the boto3 sts client does."""
+
+    def __init__(self, region=None, endpoint_url=None, verify=True, session=None, transport=None):
+        if endpoint_url is None:
+            endpoint_url = regional_endpoint(region)
+        self.endpoint_url = endpoint_url
+        self.transport = transport
+        if session is None:
+            session = transport.session() if transport is not None else requests.Session()
+        self.session = session
+        self.session.verify = verify
+        self.encoded_assertion = (None, None)
+
+    def encode(self, SAMLAssertion):
+        """Function to url encode the assertion, only once for the many roles of a multi-role run."""
+        if self.encoded_assertion[0] is not SAMLAssertion:
+            self.encoded_assertion = (SAMLAssertion, quote_plus(SAMLAssertion))
+        return self.encoded_assertion[1]
+
+    def assume_role_with_saml(self, RoleArn, PrincipalArn, SAMLAssertion, DurationSeconds=3600):
+        body = 'Action=AssumeRoleWithSAML&Version=2011-06-15&RoleArn={0}&PrincipalArn={1}&DurationSeconds={2}' \
+            '&SAMLAssertion={3}'.format(quote_plus(RoleArn), quote_plus(PrincipalArn), int(DurationSeconds),
+                                        self.encode(SAMLAssertion))
+        attempt = 0
+        while True:
+            try:
+                return self.request(body)
+            except StsError as e:
+                attempt += 1
+                if e.code not in RETRY_CODES or self.transport is None or attempt > self.transport.retries:
+                    raise
+                self.transport.sleep(attempt)
+
+    def request(self, body):
+        response = self.session.post(self.endpoint_url, data=body,
+                                     headers={'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8'})
+        try:
+            root = ET.fromstring(response.content)
+        except ET.ParseError:
+            raise StsError('ServiceUnavailable' if response.status_code >= 500 else str(response.status_code),
+                           response.reason, response.status_code)
+        if response.status_code != 200 or root.tag.endswith('ErrorResponse'):
+            code = root.findtext('.//{0}Code'.format(STS_NAMESPACE)) or str(response.status_code)
+            message = root.findtext('.//{0}Message'.format(STS_NAMESPACE)) or response.reason
+            raise StsError(code, message, response.status_code)
+
+        result = root.find('{0}AssumeRoleWithSAMLResult'.format(STS_NAMESPACE))
+        credentials = result.find('{0}Credentials'.format(STS_NAMESPACE))
+        return {
+            'Credentials': {
+                'AccessKeyId': credentials.findtext('{0}AccessKeyId'.format(STS_NAMESPACE)),
+                'SecretAccessKey': credentials.findtext('{0}SecretAccessKey'.format(STS_NAMESPACE)),
+                'SessionToken': credentials.findtext('{0}SessionToken'.format(STS_NAMESPACE)),
+                'Expiration': parse_expiration(credentials.findtext('{0}Expiration'.format(STS_NAMESPACE))),
+            },
+            'AssumedRoleUser': {
+                'AssumedRoleId': result.findtext('{0}AssumedRoleUser/{0}AssumedRoleId'.format(STS_NAMESPACE)),
+                'Arn': result.findtext('{0}AssumedRoleUser/{0}Arn'.format(STS_NAMESPACE)),
+            },
+            'Subject': result.findtext('{0}Subject'.format(STS_NAMESPACE)),
+            'Issuer': result.findtext('{0}Issuer'.format(STS_NAMESPACE)),
+        }
+
+
+def create_client(config, shared_transport=None):
+    """Function to create the sts client selected with [aws] sts_client (boto3 or native), with the
+    timeouts, retries and TLS settings of the (shared) transport."""
+    region = config.get('aws', 'region', fallback=None) or None
+    endpoint_url = config.get('aws', 'sts_endpoint', fallback=None) or None
+    shared_transport = shared_transport or transport.Transport(config)
+    client = config.get('aws', 'sts_client', fallback='boto3')
+    if client == 'native':
+        return StsClient(region=region, endpoint_url=endpoint_url, verify=shared_transport.verify,
+                         transport=shared_transport)
+    elif client == 'boto3':
+        # boto3 takes a while to import, so it is only loaded when the credentials are requested
+        import boto3
+        from botocore.config import Config
+        return boto3.client('sts', region_name=region, endpoint_url=endpoint_url, verify=shared_transport.verify,
+                            config=Config(connect_timeout=shared_transport.connect_timeout,
+                                          read_timeout=shared_transport.read_timeout,
+                                          max_pool_connections=shared_transport.pool_size,
+                                          retries={'max_attempts': shared_transport.retries + 1, 'mode': 'standard'}))
+    raise Exception('unknown sts_client {0}, please use boto3 or native'.format(client))
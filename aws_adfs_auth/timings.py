@@ -0,0 +1,156 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+FORMATS = ('table', 'json', 'openmetrics')
+
+# histogram buckets (seconds) of the OpenMetrics output, so that p50/p99 can be computed over many runs
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# the spans of a long running daemon must not grow without limit
+MAX_SPANS = 10000
+
+
+class Timings(object):
+    """Records the duration of the phases of a run as spans on a monotonic clock.
+
+    Recording is off until enable() is called, spans are then collected from all threads."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.spans = []
+        self.run_id = os.urandom(8).hex()
+        self.origin = clock()
+
+    def enable(self):
+        self.enabled = True
+        self.origin = self.clock()
+
+    def clear(self):
+        with self.lock:
+            del self.spans[:]
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Context manager measuring the enclosed block as phase name."""
+        if not self.enabled:
+            yield
+            return
+        stack = self.local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        start = self.clock()
+        try:
+            yield
+        finally:
+            duration = self.clock() - start
+            stack.pop()
+            with self.lock:
+                if len(self.spans) < MAX_SPANS:
+                    self.spans.append({'name': name, 'parent': parent, 'start': start - self.origin,
+                                       'duration': duration, 'thread': threading.current_thread().name,
+                                       'attributes': attributes})
+
+    def summary(self):
+        """Function to aggregate the spans per phase (in the order the phases started) as
+        name -> {count, total, max}."""
+        phases = {}
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: (span['start'], -span['duration']))
+        for span in spans:
+            phase = phases.setdefault(span['name'], {'count': 0, 'total': 0.0, 'max': 0.0})
+            phase['count'] += 1
+            phase['total'] += span['duration']
+            phase['max'] = max(phase['max'], span['duration'])
+        return phases
+
+    def table(self):
+        phases = self.summary()
+        total = phases['total']['total'] if 'total' in phases else None
+        lines = ['{0:24s} {1:>6s} {2:>11s} {3:>11s} {4:>7s}'.format('phase', 'count', 'total[ms]', 'max[ms]', 'share')]
+        for name, phase in phases.items():
+            share = '{0:6.1f}%'.format(100 * phase['total'] / total) if total else ''
+            lines.append('{0:24s} {1:6d} {2:11.1f} {3:11.1f} {4:>7s}'.format(
+                name, phase['count'], phase['total'] * 1000, phase['max'] * 1000, share))
+        return '\n'.join(lines) + '\n'
+
+    def json_lines(self):
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: (span['start'], -span['duration']))
+        timestamp = time.time()
+        lines = []
+        for span in spans:
+            document = {'run': self.run_id, 'time': timestamp, 'phase': span['name'], 'parent': span['parent'],
+                        'start_ms': round(span['start'] * 1000, 3), 'duration_ms': round(span['duration'] * 1000, 3),
+                        'thread': span['thread']}
+            document.update(span['attributes'])
+            lines.append(json.dumps(document))
+        return ''.join(line + '\n' for line in lines)
+
+    def openmetrics(self):
+        with self.lock:
+            spans = list(self.spans)
+        lines = ['# TYPE aws_adfs_auth_phase_seconds histogram',
+                 '# UNIT aws_adfs_auth_phase_seconds seconds',
+                 '# HELP aws_adfs_auth_phase_seconds Duration of the phases of aws_adfs_auth.']
+        for name in self.summary():
+            durations = [span['duration'] for span in spans if span['name'] == name]
+            for bucket in BUCKETS:
+                lines.append('aws_adfs_auth_phase_seconds_bucket{{phase="{0}",le="{1}"}} {2}'.format(
+                    name, bucket, len([duration for duration in durations if duration <= bucket])))
+            lines.append('aws_adfs_auth_phase_seconds_bucket{{phase="{0}",le="+Inf"}} {1}'.format(name, len(durations)))
+            lines.append('aws_adfs_auth_phase_seconds_count{{phase="{0}"}} {1}'.format(name, len(durations)))
+            lines.append('aws_adfs_auth_phase_seconds_sum{{phase="{0}"}} {1:.6f}'.format(name, sum(durations)))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def render(self, output_format):
+        if output_format == 'json':
+            return self.json_lines()
+        if output_format == 'openmetrics':
+            return self.openmetrics()
+        return self.table()
+
+
+RECORDER = Timings()
+
+
+def span(name, **attributes):
+    """Function to measure a phase with the recorder of the process."""
+    return RECORDER.span(name, **attributes)
+
+
+def report(output_format, filename=None):
+    """Function to write the timings to stderr or to a file. JSON lines and tables are appended (e.g. for log
+    shippers), OpenMetrics replaces the file (e.g. for the textfile collector of the node exporter)."""
+    output = RECORDER.render(output_format)
+    if filename is None:
+        sys.stderr.write(output)
+        return
+    with open(filename, 'w' if output_format == 'openmetrics' else 'a') as timings_file:
+        timings_file.write(output)
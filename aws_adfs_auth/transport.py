@@ -0,0 +1,83 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# responses of the IdP and STS which are worth another try
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class TimeoutSession(requests.Session):
+    """http session applying the default (connect, read) timeout to every request."""
+
+    def __init__(self, timeout):
+        requests.Session.__init__(self)
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return requests.Session.request(self, method, url, **kwargs)
+
+
+class Transport(object):
+    """The http settings and connection pools shared by all IdP and STS traffic of a process.
+
+    Every session gets its own cookies, but all sessions use the same keep-alive connection pools,
+    so that batch and daemon runs do not pay a TCP and TLS handshake per request."""
+
+    def __init__(self, config):
+        self.connect_timeout = config.getfloat('transport', 'connect_timeout', fallback=5.0)
+        self.read_timeout = config.getfloat('transport', 'read_timeout', fallback=30.0)
+        self.retries = config.getint('transport', 'retries', fallback=3)
+        self.backoff_factor = config.getfloat('transport', 'backoff_factor', fallback=0.5)
+        self.max_backoff = config.getfloat('transport', 'max_backoff', fallback=10.0)
+        self.pool_size = config.getint('transport', 'pool_size', fallback=16)
+        # a CA bundle replaces the system certificates, sslverification = False disables the verification
+        self.verify = config.get('transport', 'ca_bundle', fallback=None) or \
+            config.getboolean('aws', 'sslverification', fallback=True)
+        # POST requests are only repeated when the connection could not be established: AssumeRoleWithSAML
+        # has its own retries for throttling (sts.py), retrying it here as well would multiply the attempts
+        self.adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=Retry(
+            total=self.retries, connect=self.retries, read=self.retries, status=self.retries,
+            backoff_factor=self.backoff_factor, status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset(['GET']), raise_on_status=False, respect_retry_after_header=True))
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def session(self):
+        """Function to create an http session (with empty cookies) on the shared connection pools."""
+        session = TimeoutSession(self.timeout)
+        session.verify = self.verify
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        return session
+
+    def backoff(self, attempt):
+        """Function to return the delay before the retry attempt (1, 2, ...), exponential with full jitter."""
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+    def sleep(self, attempt):
+        time.sleep(self.backoff(attempt))
@@ -6,9 +6,7 @@ import aws_adfs_auth
 install_requires = [
     'markdown',
     'requests',
-    'robobrowser',
     'boto3',
-    'lxml',
     'pytest-runner'
 ]
 
@@ -38,7 +36,8 @@ setup(
     tests_require=tests_requires,
     extras_requires={},
     data_files= [("", ["LICENSE"])],
-    entry_points={'console_scripts': ['aws_adfs_auth = aws_adfs_auth.main:main']},
+    entry_points={'console_scripts': ['aws_adfs_auth = aws_adfs_auth.main:main'],
+                  'aws_adfs_auth.providers': ['Microsoft = aws_adfs_auth.ms_adfs:MicrosoftADFS']},
     keywords = "",
     test_suite = 'tests.aws_adfs_auth_test_suite',
     classifiers=[
@@ -1,7 +1,7 @@
 import unittest
-from . import test_configuration
 
 def aws_adfs_auth_test_suite():
+    from . import test_configuration
     loader = unittest.TestLoader()
     suite = loader.loadTestsFromModule(test_configuration)
     return suite
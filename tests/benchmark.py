@@ -0,0 +1,156 @@
+"""Offline benchmark of aws_adfs_auth against the local ADFS and STS stand-ins of mock_adfs.
+
+    python -m tests.benchmark --output results.json
+    python -m tests.benchmark --baseline results.json --tolerance 0.25
+
+Measures the end-to-end latency of a login with the login form and with a reused ADFS session, the
+throughput of --all-roles with large assertions and the peak memory of a login. With --baseline the
+run fails (exit code 1) if a metric is worse than the baseline by more than the tolerance.
+"""
+
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import contextlib
+import json
+import logging
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from tests.mock_adfs import MockADFSServer, MockSTSServer
+
+# the wall-clock budgets of the tests are only checked with AWS_ADFS_AUTH_BENCHMARKS=1, as they flake on busy
+# machines and when test suites run in parallel
+CHECK_BUDGETS = os.environ.get('AWS_ADFS_AUTH_BENCHMARKS', '') not in ('', '0')
+
+# metrics where a higher value is better, all others are better when lower
+HIGHER_IS_BETTER = ('roles_per_s',)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def make_config(home, adfs_url, sts_url):
+    import configparser
+    config = configparser.RawConfigParser()
+    config.read_dict({
+        'provider': {'name': 'Microsoft', 'idpentryurl': adfs_url, 'profile_name': 'saml'},
+        'aws': {'credentials_file': os.path.join(home, '.aws', 'credentials'), 'region': 'eu-west-1',
+                'outputformat': 'json', 'set_environment_variables': 'False', 'sts_client': 'native',
+                'sts_endpoint': sts_url, 'max_workers': '16'},
+        'msadfs': {'username': 'user@example.com'},
+    })
+    return config
+
+
+def login(config, all_roles=False):
+    """Function to run one complete, non-interactive login as the command line would."""
+    from aws_adfs_auth.ms_adfs import MicrosoftADFS
+    options = argparse.Namespace(non_interactive=True, role=None if all_roles else '100000000000:Role0',
+                                 profile=None, all_roles=all_roles, credential_process=False, force=True)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        MicrosoftADFS(logging.getLogger('benchmark'), config, options).authenticate()
+
+
+def measure(function, iterations):
+    durations = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return {'p50_ms': percentile(durations, 0.5) * 1000, 'p95_ms': percentile(durations, 0.95) * 1000}
+
+
+def run(home, iterations=20, role_counts=(50, 200), idp_latency=0.0, sts_latency=0.0):
+    """Function to run all scenarios, returns scenario -> metric -> value."""
+    results = {}
+    cookie_file = os.path.join(home, '.aws', 'adfs_auth_cookies')
+    with MockSTSServer(latency=sts_latency) as sts_server:
+        with MockADFSServer(role_count=4, latency=idp_latency) as adfs_server:
+            config = make_config(home, adfs_server.url, sts_server.url)
+
+            def fresh_login():
+                if os.path.exists(cookie_file):
+                    os.remove(cookie_file)
+                login(config)
+            results['login'] = measure(fresh_login, iterations)
+            results['session_reuse'] = measure(lambda: login(config), iterations)
+
+        for role_count in role_counts:
+            with MockADFSServer(role_count=role_count, latency=idp_latency) as adfs_server:
+                config = make_config(home, adfs_server.url, sts_server.url)
+                result = measure(lambda: login(config, all_roles=True), max(1, iterations // 5))
+                result['roles_per_s'] = role_count / (result['p50_ms'] / 1000)
+                results['all_roles_{0}'.format(role_count)] = result
+
+        with MockADFSServer(role_count=max(role_counts), latency=idp_latency) as adfs_server:
+            config = make_config(home, adfs_server.url, sts_server.url)
+            tracemalloc.start()
+            login(config, all_roles=True)
+            results['memory'] = {'peak_kb': tracemalloc.get_traced_memory()[1] / 1024.0}
+            tracemalloc.stop()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Function to return the metrics which regressed by more than tolerance against the baseline."""
+    regressions = []
+    for scenario, metrics in baseline.items():
+        for metric, expected in metrics.items():
+            actual = results.get(scenario, {}).get(metric)
+            if actual is None:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                regressed = actual < expected * (1 - tolerance)
+            else:
+                regressed = actual > expected * (1 + tolerance)
+            if regressed:
+                regressions.append('{0}.{1}: {2:.1f} (baseline {3:.1f})'.format(scenario, metric, actual, expected))
+    return regressions
+
+
+def print_results(results):
+    for scenario, metrics in results.items():
+        print('{0:20s} {1}'.format(scenario, '  '.join('{0}={1:.1f}'.format(metric, value)
+                                                        for metric, value in sorted(metrics.items()))))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of aws_adfs_auth")
+    parser.add_argument("--iterations", type=int, default=20, help="Logins per latency scenario")
+    parser.add_argument("--roles", type=int, nargs="+", default=[50, 200], help="Role counts of the --all-roles scenarios")
+    parser.add_argument("--idp-latency", type=float, default=0.0, help="Delay of every ADFS response in seconds")
+    parser.add_argument("--sts-latency", type=float, default=0.0, help="Delay of every STS response in seconds")
+    parser.add_argument("--output", metavar="FILE", help="Write the results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="Fail if the results are worse than these results")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression against the baseline")
+    options = parser.parse_args(args)
+
+    # the application keeps its files in ~/.aws, so it runs in a home of its own
+    home = tempfile.mkdtemp(prefix='aws_adfs_auth_benchmark.')
+    os.environ.update(HOME=home, AWS_ADFS_USERNAME='user@example.com', AWS_ADFS_PASSWORD='secret')
+    os.makedirs(os.path.join(home, '.aws'))
+    try:
+        results = run(home, options.iterations, options.roles, options.idp_latency, options.sts_latency)
+    finally:
+        shutil.rmtree(home)
+    print_results(results)
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), options.tolerance)
+        for regression in regressions:
+            print('regression: ' + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""Local stand-ins for an ADFS server and the STS API, used by the tests instead of the real services."""
+
+import base64
+import datetime
+import os
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+import xml.etree.ElementTree as ET
+
+LOGIN_PATH = '/adfs/ls/IdpInitiatedSignOn.aspx'
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html lang="en-US"><head>
+<meta http-equiv="X-UA-Compatible" content="IE=edge"/>
+<meta name="viewport" content="width=device-width, initial-scale=1.0"/>
+<meta http-equiv="content-type" content="text/html;charset=UTF-8"/>
+<title>Sign In</title>
+<link rel="stylesheet" type="text/css" href="/adfs/portal/css/style.css?id=D74D4D6D8A9B4F1E" />
+<script type="text/javascript">
+//<![CDATA[
+function LoginErrors(){{this.userNameFormatError = 'Enter your user ID in the format \u0027domain\\user\u0027 or \u0027user@domain\u0027.'; this.passwordEmpty = 'Enter your password.';}}
+var Login = {{ submitLoginRequest: function () {{ var u = new InputUtil(); if (u.length < 1 && document.forms["loginForm"]) {{ return false; }} document.forms["loginForm"].submit(); return false; }} }};
+//]]>
+</script>
+</head>
+<body dir="ltr" class="body">
+<div id="fullPage">
+<div id="content">{padding}</div>
+<div id="workArea">
+<div id="authArea" class="groupMargin">
+<div id="loginArea">
+<div id="loginMessage" class="groupMargin">Sign in with your organizational account</div>
+<form method="post" id="loginForm" autocomplete="off" novalidate="novalidate" onKeyPress="if (event && event.keyCode == 13) Login.submitLoginRequest();" action="{action}">
+<div id="error" class="fieldMargin error smallText"><span id="errorText" for="">{error}</span></div>
+<div id="formsAuthenticationArea">
+<div id="userNameArea"><label id="userNameInputLabel" for="userNameInput" class="hidden">User Account</label>
+<input id="userNameInput" name="UserName" type="email" value="" tabindex="1" class="text fullWidth" spellcheck="false" placeholder="someone@example.com" autocomplete="off"/></div>
+<div id="passwordArea"><label id="passwordInputLabel" for="passwordInput" class="hidden">Password</label>
+<input id="passwordInput" name="Password" type="password" tabindex="2" class="text fullWidth" placeholder="Password" autocomplete="off"/></div>
+<div id="kmsiArea" style="display:none"><input type="checkbox" name="Kmsi" id="kmsiInput" value="true" tabindex="3" />
+<label for="kmsiInput">Keep me signed in</label></div>
+<div id="submissionArea" class="submitMargin"><span id="submitButton" class="submit" tabindex="4" role="button" onKeyPress="if (event && event.keyCode == 32) Login.submitLoginRequest();" onclick="return Login.submitLoginRequest();">Sign in</span></div>
+</div>
+<input id="optionForms" type="hidden" name="AuthMethod" value="FormsAuthentication"/>
+</form>
+</div>
+</div>
+</div>
+<div id="footerPlaceholder"></div>
+</div>
+</body></html>
+"""
+
+SAML_PAGE = """<!DOCTYPE html>
+<html><head><title>Working...</title></head>
+<body>
+<form method="POST" name="hiddenform" action="https://signin.aws.amazon.com:443/saml">
+<input type="hidden" name="SAMLResponse" value="{assertion}" />
+<noscript><p>Script is disabled. Click Submit to continue.</p><input type="submit" value="Submit" /></noscript>
+</form>
+<div>{padding}</div>
+</body></html>
+"""
+
+ASSERTION = """<samlp:Response xmlns:samlp="urn:oasis:names:tc:SAML:2.0:protocol" ID="_{id}" Version="2.0">
+<Assertion xmlns="urn:oasis:names:tc:SAML:2.0:assertion" ID="_{id}" Version="2.0">
+<Issuer>http://adfs.example.com/adfs/services/trust</Issuer>
+<ds:Signature xmlns:ds="http://www.w3.org/2000/09/xmldsig#"><ds:SignedInfo>
+<ds:CanonicalizationMethod Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#" />
+<ds:SignatureMethod Algorithm="http://www.w3.org/2001/04/xmldsig-more#rsa-sha256" />
+<ds:Reference URI="#_{id}"><ds:Transforms>
+<ds:Transform Algorithm="http://www.w3.org/2000/09/xmldsig#enveloped-signature" />
+<ds:Transform Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#" /></ds:Transforms>
+<ds:DigestMethod Algorithm="http://www.w3.org/2001/04/xmlenc#sha256" />
+<ds:DigestValue>{digest}</ds:DigestValue></ds:Reference></ds:SignedInfo>
+<ds:SignatureValue>{signature}</ds:SignatureValue>
+<KeyInfo xmlns="http://www.w3.org/2000/09/xmldsig#"><ds:X509Data><ds:X509Certificate>{certificate}</ds:X509Certificate></ds:X509Data></KeyInfo>
+</ds:Signature>
+<Subject><NameID>user@example.com</NameID>
+<SubjectConfirmation Method="urn:oasis:names:tc:SAML:2.0:cm:bearer">
+<SubjectConfirmationData NotOnOrAfter="{not_on_or_after}" Recipient="https://signin.aws.amazon.com/saml" />
+</SubjectConfirmation></Subject>
+<Conditions NotBefore="2000-01-01T00:00:00.000Z" NotOnOrAfter="{not_on_or_after}" />
+<AttributeStatement>
+<Attribute Name="https://aws.amazon.com/SAML/Attributes/RoleSessionName"><AttributeValue>user@example.com</AttributeValue></Attribute>
+<Attribute Name="https://aws.amazon.com/SAML/Attributes/Role">{roles}</Attribute>
+<Attribute Name="https://aws.amazon.com/SAML/Attributes/SessionDuration"><AttributeValue>{session_duration}</AttributeValue></Attribute>
+</AttributeStatement>
+</Assertion>
+</samlp:Response>"""
+
+
+def role_arns(count):
+    """Function to build count role,principal pairs spread over several accounts."""
+    roles = []
+    for i in range(count):
+        account = '{0:012d}'.format(100000000000 + i // 4)
+        roles.append('arn:aws:iam::{0}:role/Role{1}'.format(account, i % 4) +
+                     ',arn:aws:iam::{0}:saml-provider/ADFS'.format(account))
+    return roles
+
+
+def random_base64(size):
+    return base64.b64encode(os.urandom(size)).decode('ascii')
+
+
+def make_assertion(roles, not_on_or_after='2100-01-01T00:00:00.000Z', session_duration=3600):
+    """Function to build a base64 encoded SAML response carrying the given roles.
+
+    The signature has the size of a real RSA 2048 signature, but is random and not verifiable."""
+    values = ''.join('<AttributeValue>{0}</AttributeValue>'.format(role) for role in roles)
+    xml = ASSERTION.format(id=uuid.uuid4().hex, roles=values, not_on_or_after=not_on_or_after,
+                           session_duration=session_duration, digest=random_base64(32), signature=random_base64(256),
+                           certificate=random_base64(720))
+    return base64.b64encode(xml.encode('utf-8')).decode('ascii')
+
+
+class MockADFSServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, role_count=3, padding=0, username='user@example.com', password='secret', latency=0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), MockADFSHandler)
+        self.roles = role_arns(role_count)
+        self.latency = latency
+        self.padding = '<p>' + 'x' * 80 + '</p>\n'
+        self.padding = self.padding * padding
+        self.username = username
+        self.password = password
+        self.sessions = set()
+        self.requests = []
+        self.connections = 0
+        # the requests being answered, and the most at a time
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}{1}?loginToRp=urn:amazon:webservices'.format(self.server_address[1], LOGIN_PATH)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class MockADFSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def session(self):
+        for cookie in self.headers.get_all('Cookie') or []:
+            for part in cookie.split(';'):
+                name, _, value = part.strip().partition('=')
+                if name == 'MSISAuth' and value in self.server.sessions:
+                    return value
+        return None
+
+    def send_page(self, page, cookie=None):
+        body = page.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if cookie is not None:
+            self.send_header('Set-Cookie', 'MSISAuth={0}; path=/adfs; HttpOnly'.format(cookie))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def saml_page(self):
+        return SAML_PAGE.format(assertion=make_assertion(self.server.roles), padding=self.server.padding)
+
+    def login_page(self, error=''):
+        return LOGIN_PAGE.format(action=self.path.replace('&', '&amp;'), padding=self.server.padding, error=error)
+
+    def begin(self, method):
+        self.server.requests.append((method, self.path))
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        if self.server.latency:
+            threading.Event().wait(self.server.latency)
+
+    def end(self):
+        with self.server.lock:
+            self.server.in_flight -= 1
+
+    def do_GET(self):
+        self.begin('GET')
+        try:
+            self.get()
+        finally:
+            self.end()
+
+    def do_POST(self):
+        self.begin('POST')
+        try:
+            self.post()
+        finally:
+            self.end()
+
+    def get(self):
+        if self.session() is not None:
+            self.send_page(self.saml_page())
+        else:
+            self.send_page(self.login_page())
+
+    def post(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if (form.get('UserName') == [self.server.username] and form.get('Password') == [self.server.password]
+                and form.get('AuthMethod') == ['FormsAuthentication']):
+            session = uuid.uuid4().hex
+            self.server.sessions.add(session)
+            self.send_page(self.saml_page(), cookie=session)
+        else:
+            self.send_page(self.login_page('Incorrect user ID or password. Type the correct user ID and password, '
+                                           'and try again.'))
+
+
+STS_RESPONSE = """<AssumeRoleWithSAMLResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+  <AssumeRoleWithSAMLResult>
+    <Audience>https://signin.aws.amazon.com/saml</Audience>
+    <AssumedRoleUser>
+      <AssumedRoleId>AROA{key}:user@example.com</AssumedRoleId>
+      <Arn>{assumed_role_arn}</Arn>
+    </AssumedRoleUser>
+    <Credentials>
+      <AccessKeyId>ASIA{key}</AccessKeyId>
+      <SecretAccessKey>{secret}</SecretAccessKey>
+      <SessionToken>{token}</SessionToken>
+      <Expiration>{expiration}</Expiration>
+    </Credentials>
+    <Issuer>http://adfs.example.com/adfs/services/trust</Issuer>
+    <NameQualifier>qualifier</NameQualifier>
+    <PackedPolicySize>6</PackedPolicySize>
+    <Subject>user@example.com</Subject>
+    <SubjectType>transient</SubjectType>
+  </AssumeRoleWithSAMLResult>
+  <ResponseMetadata>
+    <RequestId>{request_id}</RequestId>
+  </ResponseMetadata>
+</AssumeRoleWithSAMLResponse>
+"""
+
+STS_ERROR = """<ErrorResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+  <Error>
+    <Type>Sender</Type>
+    <Code>{code}</Code>
+    <Message>{message}</Message>
+  </Error>
+  <RequestId>{request_id}</RequestId>
+</ErrorResponse>
+"""
+
+IAM_ALIASES_RESPONSE = """<ListAccountAliasesResponse xmlns="https://iam.amazonaws.com/doc/2010-05-08/">
+  <ListAccountAliasesResult>
+    <IsTruncated>false</IsTruncated>
+    <AccountAliases>{aliases}</AccountAliases>
+  </ListAccountAliasesResult>
+  <ResponseMetadata>
+    <RequestId>{request_id}</RequestId>
+  </ResponseMetadata>
+</ListAccountAliasesResponse>
+"""
+
+SAML_NAMESPACE = '{urn:oasis:names:tc:SAML:2.0:assertion}'
+
+
+class MockSTSServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), MockSTSHandler)
+        self.latency = latency
+        self.requests = []
+        # assertion -> roles, so that a large assertion is only parsed once by the stand-in
+        self.assertions = {}
+        # errors to return before answering the next requests, e.g. ['Throttling']
+        self.failures = []
+        # the longest DurationSeconds accepted, as the MaxSessionDuration of the roles
+        self.max_session_duration = 43200
+        self.connections = 0
+        self.thread = None
+        # IAM ListAccountAliases answers with the alias (account id -> alias) of the account the access key was issued for
+        self.account_aliases = {}
+        self.access_keys = {}
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}/'.format(self.server_address[1])
+
+    start = MockADFSServer.start
+    stop = MockADFSServer.stop
+    __enter__ = MockADFSServer.__enter__
+    __exit__ = MockADFSServer.__exit__
+
+
+class MockSTSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    setup = MockADFSHandler.setup
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_xml(self, status, body):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def error(self, code, message):
+        self.send_xml(400 if code != 'AccessDenied' else 403,
+                      STS_ERROR.format(code=code, message=message, request_id=uuid.uuid4()))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = dict((key, values[0]) for key, values in parse_qs(self.rfile.read(length).decode('utf-8')).items())
+        self.server.requests.append(form)
+        if self.server.latency:
+            threading.Event().wait(self.server.latency)
+        if self.server.failures:
+            code = self.server.failures.pop(0)
+            if isinstance(code, int):
+                return self.send_xml(code, 'Service Unavailable')
+            return self.error(code, 'Rate exceeded')
+        if form.get('Action') == 'ListAccountAliases':
+            return self.list_account_aliases()
+        if form.get('Action') != 'AssumeRoleWithSAML':
+            return self.error('InvalidAction', 'Could not find operation {0}'.format(form.get('Action')))
+        roles = self.server.assertions.get(form.get('SAMLAssertion'))
+        if roles is None:
+            try:
+                root = ET.fromstring(base64.b64decode(form['SAMLAssertion']))
+            except Exception:
+                return self.error('InvalidIdentityToken', 'Invalid SAML assertion')
+            roles = set(value.text for value in root.iter(SAML_NAMESPACE + 'AttributeValue'))
+            self.server.assertions[form['SAMLAssertion']] = roles
+        if '{0},{1}'.format(form.get('RoleArn'), form.get('PrincipalArn')) not in roles:
+            return self.error('AccessDenied', 'Not authorized to perform sts:AssumeRoleWithSAML')
+        duration = int(form.get('DurationSeconds', 3600))
+        if duration > self.server.max_session_duration:
+            return self.error('ValidationError', 'The requested DurationSeconds exceeds the MaxSessionDuration set '
+                                                 'for this role.')
+        expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=duration)
+        key = uuid.uuid4().hex[:16].upper()
+        account, role = form['RoleArn'].split(':')[4], form['RoleArn'].split('/')[-1]
+        self.server.access_keys['ASIA' + key] = account
+        self.send_xml(200, STS_RESPONSE.format(
+            key=key, secret=uuid.uuid4().hex, token=uuid.uuid4().hex * 4,
+            expiration=expiration.strftime('%Y-%m-%dT%H:%M:%SZ'), request_id=uuid.uuid4(),
+            assumed_role_arn='arn:aws:sts::{0}:assumed-role/{1}/user@example.com'.format(account, role)))
+
+    def list_account_aliases(self):
+        # Authorization: AWS4-HMAC-SHA256 Credential=<access key>/<date>/..., the signature is not checked
+        key = self.headers.get('Authorization', '').partition('Credential=')[2].split('/')[0]
+        account = self.server.access_keys.get(key)
+        if account is None:
+            return self.error('InvalidClientTokenId', 'The security token included in the request is invalid')
+        alias = self.server.account_aliases.get(account)
+        self.send_xml(200, IAM_ALIASES_RESPONSE.format(aliases='<member>{0}</member>'.format(alias) if alias else '',
+                                                       request_id=uuid.uuid4()))
@@ -0,0 +1,93 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import configparser
+import logging
+import threading
+import argparse
+import pytest
+from aws_adfs_auth.abstract_adfs import AbstractADFS, AssumeRoleError
+from aws_adfs_auth.cache import CredentialCache
+from aws_adfs_auth.saml import Role
+
+ROLES = ['arn:aws:iam::111111111111:role/Admin,arn:aws:iam::111111111111:saml-provider/ADFS',
+         'arn:aws:iam::111111111111:role/ReadOnly,arn:aws:iam::111111111111:saml-provider/ADFS',
+         'arn:aws:iam::222222222222:role/Admin,arn:aws:iam::222222222222:saml-provider/ADFS']
+
+
+def make_adfs(tmpdir, role_patterns=None):
+    config = configparser.RawConfigParser()
+    config.add_section('aws')
+    config.set('aws', 'credentials_file', os.path.join(str(tmpdir), 'credentials'))
+    config.set('aws', 'region', 'eu-west-1')
+    config.set('aws', 'outputformat', 'json')
+    if role_patterns:
+        config.set('aws', 'role_patterns', role_patterns)
+    config.add_section('aws_accounts')
+    config.set('aws_accounts', '111111111111', 'Production')
+    adfs = AbstractADFS(logging.getLogger('test'), config, argparse.Namespace(all_roles=True))
+    adfs.cache = CredentialCache(logging.getLogger('test'), os.path.join(str(tmpdir), 'cache.json'))
+    adfs.sts_client = object()
+    threads = set()
+
+    def assume_role(role_arn, principal_arn, assertion):
+        threads.add(threading.current_thread().name)
+        return {'Credentials': {'AccessKeyId': 'AKID' + role_arn.split(':')[4],
+                                'SecretAccessKey': 'secret',
+                                'SessionToken': 'token',
+                                'Expiration': '2030-01-01T00:00:00Z'}}
+    adfs.assume_role = assume_role
+    return adfs, threads
+
+
+def roles(adfs):
+    return [Role.from_attribute(role, adfs.aws_accounts) for role in ROLES]
+
+
+def test_all_roles(tmpdir):
+    print("running all roles test")
+    adfs, threads = make_adfs(tmpdir)
+    adfs.handle_all_roles(roles(adfs), 'assertion')
+    credentials = configparser.RawConfigParser()
+    credentials.read(os.path.join(str(tmpdir), 'credentials'))
+    assert sorted(credentials.sections()) == ['222222222222-Admin', 'Production-Admin', 'Production-ReadOnly']
+    assert credentials.get('222222222222-Admin', 'aws_access_key_id') == 'AKID222222222222'
+    assert all(name.startswith('ThreadPoolExecutor') for name in threads)
+    assert adfs.cache.get('Production-Admin')['RoleArn'] == 'arn:aws:iam::111111111111:role/Admin'
+    assert adfs.cache.is_batch_valid(300)
+
+
+def test_role_patterns(tmpdir):
+    print("running role patterns test")
+    adfs, threads = make_adfs(tmpdir, role_patterns='Production:*, *:ReadOnly')
+    assert adfs.filter_roles(roles(adfs)) == roles(adfs)[0:2]
+    adfs, threads = make_adfs(tmpdir, role_patterns='arn:aws:iam::222222222222:*')
+    assert adfs.filter_roles(roles(adfs)) == roles(adfs)[2:]
+
+
+def test_profile_name_collisions(tmpdir):
+    print("running all roles profile name collision test")
+    adfs, threads = make_adfs(tmpdir)
+    adfs.aws_accounts['333333333333'] = 'Production'
+    awsroles = roles(adfs) + [
+        Role.from_attribute('arn:aws:iam::333333333333:role/Admin,arn:aws:iam::333333333333:saml-provider/ADFS',
+                            adfs.aws_accounts),
+        Role.from_attribute('arn:aws:iam::333333333333:role/team/Admin,arn:aws:iam::333333333333:saml-provider/ADFS',
+                            adfs.aws_accounts)]
+    assert list(adfs.role_profiles(awsroles)) == [
+        'Production-Admin-111111111111', 'Production-ReadOnly', '222222222222-Admin',
+        'Production-Admin-333333333333', 'Production-Admin-333333333333-team']
+    adfs.handle_all_roles(awsroles, 'assertion')
+    assert len(adfs.cache.profiles()) == 5
+
+
+def test_all_roles_failed(tmpdir):
+    print("running all roles failure test")
+    adfs, threads = make_adfs(tmpdir)
+
+    def assume_role(role_arn, principal_arn, assertion):
+        raise Exception('AccessDenied')
+    adfs.assume_role = assume_role
+    with pytest.raises(AssumeRoleError):
+        adfs.handle_all_roles(roles(adfs), 'assertion')
+    assert not os.path.exists(os.path.join(str(tmpdir), 'credentials'))
@@ -0,0 +1,50 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import configparser
+import logging
+from aws_adfs_auth import account_aliases
+from aws_adfs_auth.ms_adfs import MicrosoftADFS
+from tests.mock_adfs import MockADFSServer, MockSTSServer
+from tests.test_ms_adfs import make_config, patch_adfs
+
+
+def test_alias_cache():
+    print("running account alias cache test")
+    config = configparser.RawConfigParser()
+    config.read_dict({'aws': {'alias_ttl': '3600'}, 'aws_accounts': {'111111111111': 'manual'}})
+    account_aliases.store(config, {'111111111111': 'looked-up', '222222222222': 'staging', '333333333333': ''}, now=1000)
+    assert account_aliases.cached(config, now=2000) == {'111111111111': 'looked-up', '222222222222': 'staging',
+                                                        '333333333333': ''}
+    # [aws_accounts] wins, accounts without alias are left out
+    assert account_aliases.known(config, now=2000) == {'111111111111': 'manual', '222222222222': 'staging'}
+    assert account_aliases.cached(config, now=5000) == {}
+
+
+def test_resolve_aliases(tmpdir, monkeypatch):
+    print("running account alias resolution test")
+    patch_adfs(monkeypatch, tmpdir, [], stub_sts=False)
+    with MockADFSServer(role_count=12) as adfs, MockSTSServer() as sts:
+        sts.account_aliases.update({'100000000000': 'production', '100000000001': 'staging'})
+        config = make_config(tmpdir, adfs.url)
+        config.set('aws', 'sts_client', 'native')
+        config.set('aws', 'sts_endpoint', sts.url)
+        config.set('aws', 'iam_endpoint', sts.url)
+        config.set('aws', 'resolve_aliases', 'True')
+        options = argparse.Namespace(role='100000000000:Role0', non_interactive=True)
+        MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+
+        actions = [request['Action'] for request in sts.requests]
+        # one role of each of the other two accounts is assumed to look up their aliases
+        assert actions.count('AssumeRoleWithSAML') == 3
+        assert actions.count('ListAccountAliases') == 3
+        assert account_aliases.cached(config) == {'100000000000': 'production', '100000000001': 'staging',
+                                                  '100000000002': ''}
+
+        # the next run knows the aliases without any lookup
+        del sts.requests[:]
+        options = argparse.Namespace(role='staging:Role1', non_interactive=True, profile='staging')
+        provider = MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+        assert [request['Action'] for request in sts.requests] == ['AssumeRoleWithSAML']
+        assert provider.adfs.cache.get('staging')['RoleArn'] == 'arn:aws:iam::100000000001:role/Role1'
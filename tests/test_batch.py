@@ -0,0 +1,86 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import configparser
+import logging
+from aws_adfs_auth import batch, cache, events
+from tests.mock_adfs import MockADFSServer, MockSTSServer
+
+TARGETS = """
+[target:eu-deploy]
+idpentryurl = {eu}
+username = user@example.com
+role = 100000000000:Role1
+
+[target:eu-all]
+idpentryurl = {eu}
+username = user@example.com
+role_patterns = 100000000001:*
+
+[target:us-deploy]
+idpentryurl = {us}
+username = user@example.com
+role = Staging:Role3
+profile = us
+
+[target:us-wrong-password]
+idpentryurl = {us}
+username = user@example.com
+password_env = WRONG_PASSWORD
+role = Staging:Role3
+
+[target:us-no-username]
+idpentryurl = {us}
+role = Staging:Role3
+"""
+
+
+def test_batch(tmpdir, monkeypatch):
+    print("running batch refresh test")
+    monkeypatch.setattr(cache.CredentialCache, 'cache_file', os.path.join(str(tmpdir), 'cache.json'))
+    monkeypatch.setenv('AWS_ADFS_PASSWORD', 'secret')
+    monkeypatch.setenv('WRONG_PASSWORD', 'wrong')
+    events_file = os.path.join(str(tmpdir), 'events.jsonl')
+    monkeypatch.setattr(events.LOG, 'filename', events_file)
+    with MockADFSServer(role_count=8, latency=0.05) as eu, MockADFSServer(role_count=8, latency=0.05) as us, \
+            MockSTSServer() as sts_server:
+        config = configparser.RawConfigParser()
+        config.read_dict({
+            'aws': {'credentials_file': os.path.join(str(tmpdir), 'credentials'), 'region': 'eu-west-1',
+                    'outputformat': 'json', 'sts_client': 'native', 'sts_endpoint': sts_server.url},
+            'aws_accounts': {'100000000000': 'Production', '100000000001': 'Staging'},
+            'batch': {'per_host_limit': '1'},
+        })
+        targets_file = os.path.join(str(tmpdir), 'targets.ini')
+        with open(targets_file, 'w') as targets:
+            targets.write(TARGETS.format(eu=eu.url, us=us.url))
+
+        targets = batch.read_targets(config, targets_file)
+        assert sorted(target.name for target in targets) == ['eu-all', 'eu-deploy', 'us-deploy', 'us-no-username',
+                                                             'us-wrong-password']
+        results = batch.BatchRefresher(logging.getLogger('test'), config, targets).run()
+        batch.print_report(results)
+        # per_host_limit = 1 serializes the logins of each IdP
+        assert eu.max_in_flight == 1 and us.max_in_flight == 1
+
+    results = dict((result.target.name, result) for result in results)
+    assert sorted(results['eu-all'].profiles) == ['Staging-Role0', 'Staging-Role1', 'Staging-Role2', 'Staging-Role3']
+    assert list(results['us-deploy'].profiles) == ['us']
+    assert isinstance(results['us-wrong-password'].error, batch.AuthenticationError)
+    assert 'no username' in str(results['us-no-username'].error)
+    assert results['eu-deploy'].error is None
+    assert results['eu-deploy'].login_time > 0 and results['eu-deploy'].sts_time > 0
+
+    credentials = configparser.RawConfigParser()
+    credentials.read(os.path.join(str(tmpdir), 'credentials'))
+    assert sorted(credentials.sections()) == ['Staging-Role0', 'Staging-Role1', 'Staging-Role2', 'Staging-Role3',
+                                              'eu-deploy', 'us']
+    assert cache.CredentialCache(logging.getLogger('test')).is_valid('us', 300)
+
+    # the logins of --batch are in the event log as well
+    records = list(events.read([events_file]))
+    assert len([record for record in records if record['event'] == 'login_start']) == 5
+    logins = [record for record in records if record['event'] == 'login']
+    assert sorted((login['error'] or 'ok') for login in logins) == ['AuthenticationError', 'AuthenticationError',
+                                                                   'ok', 'ok', 'ok']
+    assert set(login['source'] for login in logins if not login['error']) == {'login'}
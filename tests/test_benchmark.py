@@ -0,0 +1,41 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import subprocess
+from tests import benchmark
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def test_compare():
+    print("running benchmark comparison test")
+    baseline = {'login': {'p50_ms': 100.0}, 'all_roles_50': {'roles_per_s': 500.0}, 'memory': {'peak_kb': 1000.0}}
+    assert benchmark.compare({'login': {'p50_ms': 120.0}, 'all_roles_50': {'roles_per_s': 400.0},
+                              'memory': {'peak_kb': 1000.0}}, baseline, 0.25) == []
+    assert benchmark.compare({'login': {'p50_ms': 130.0}, 'all_roles_50': {'roles_per_s': 300.0}}, baseline, 0.25) == \
+        ['login.p50_ms: 130.0 (baseline 100.0)', 'all_roles_50.roles_per_s: 300.0 (baseline 500.0)']
+
+
+def test_benchmark_run(tmpdir):
+    print("running offline benchmark")
+    results_file = os.path.join(str(tmpdir), 'results.json')
+    command = [sys.executable, '-m', 'tests.benchmark', '--iterations', '5', '--roles', '20']
+    output = subprocess.check_output(command + ['--output', results_file], cwd=ROOT, stdin=subprocess.DEVNULL,
+                                     universal_newlines=True, timeout=300)
+    print(output)
+    with open(results_file) as results:
+        results = json.load(results)
+    assert set(results) == {'login', 'session_reuse', 'all_roles_20', 'memory'}
+    # everything is local, so even slow CI machines stay far below these budgets
+    assert results['login']['p50_ms'] < 1000
+    assert results['session_reuse']['p50_ms'] < results['login']['p50_ms'] * 2
+    assert results['all_roles_20']['roles_per_s'] > 10
+
+    # a run is never worse than itself with a generous tolerance, but always worse than an impossible baseline
+    assert subprocess.call(command + ['--baseline', results_file, '--tolerance', '10'], cwd=ROOT,
+                           stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, timeout=300) == 0
+    with open(results_file, 'w') as baseline:
+        json.dump({'login': {'p50_ms': 0.001}}, baseline)
+    assert subprocess.call(command + ['--baseline', results_file], cwd=ROOT, stdin=subprocess.DEVNULL,
+                           stdout=subprocess.DEVNULL, timeout=300) == 1
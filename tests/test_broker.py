@@ -0,0 +1,51 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import logging
+import pytest
+import requests
+from aws_adfs_auth.broker import CredentialBroker
+from tests.test_cache import credentials
+from aws_adfs_auth.cache import CredentialCache
+
+
+def make_broker(tmpdir):
+    cache = CredentialCache(logging.getLogger('test'), os.path.join(str(tmpdir), 'cache.json'))
+    cache.store('saml', 'arn:aws:iam::111111111111:role/Admin', credentials(55))
+    return CredentialBroker(logging.getLogger('test'), cache, port=0).start()
+
+
+def test_broker(tmpdir):
+    print("running credential broker test")
+    broker = make_broker(tmpdir)
+    try:
+        session = requests.Session()
+        assert session.get(broker.url('saml')).status_code == 403
+        assert session.get(broker.url('saml'), headers={'Authorization': 'wrong'}).status_code == 403
+        assert session.get(broker.url('other'), headers={'Authorization': broker.token}).status_code == 404
+        document = session.get(broker.url('saml'), headers={'Authorization': broker.token}).json()
+        assert document['AccessKeyId'] == 'AKID'
+        assert document['Token'] == 'token'
+
+        # the broker serves the cache object in memory, refreshed credentials are visible immediately
+        broker.cache.get('saml')['AccessKeyId'] = 'AKID2'
+        assert session.get(broker.url('saml'), headers={'Authorization': broker.token}).json()['AccessKeyId'] == 'AKID2'
+    finally:
+        broker.stop()
+
+
+def test_broker_with_botocore(tmpdir):
+    botocore_credentials = pytest.importorskip('botocore.credentials')
+    print("running credential broker test with the botocore container provider")
+    broker = make_broker(tmpdir)
+    token_file = os.path.join(str(tmpdir), 'token')
+    broker.write_token(token_file)
+    try:
+        provider = botocore_credentials.ContainerProvider(environ={
+            'AWS_CONTAINER_CREDENTIALS_FULL_URI': broker.url('saml'),
+            'AWS_CONTAINER_AUTHORIZATION_TOKEN_FILE': token_file})
+        loaded = provider.load().get_frozen_credentials()
+        assert loaded.access_key == 'AKID'
+        assert loaded.token == 'token'
+    finally:
+        broker.stop()
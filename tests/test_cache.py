@@ -0,0 +1,125 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datetime
+import logging
+import stat
+import threading
+import pytest
+from aws_adfs_auth.cache import AssertionCache, CredentialCache, SqliteCredentialCache
+
+
+def credentials(minutes):
+    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=minutes)
+    return {'AccessKeyId': 'AKID', 'SecretAccessKey': 'secret', 'SessionToken': 'token', 'Expiration': expiration}
+
+
+@pytest.mark.parametrize('store', [CredentialCache, SqliteCredentialCache])
+def test_cache(tmpdir, store):
+    print("running credential cache test")
+    cache_file = os.path.join(str(tmpdir), 'cache')
+    cache = store(logging.getLogger('test'), cache_file)
+    assert not cache.is_valid('saml')
+    cache.store('saml', 'arn:aws:iam::111111111111:role/Admin', credentials(55))
+    cache.store('expiring', 'arn:aws:iam::111111111111:role/Admin', credentials(2))
+    cache.save()
+    assert stat.S_IMODE(os.stat(cache_file).st_mode) == 0o600
+
+    cache = store(logging.getLogger('test'), cache_file)
+    assert cache.profiles() == ['expiring', 'saml']
+    assert cache.get('saml')['RoleArn'] == 'arn:aws:iam::111111111111:role/Admin'
+    assert cache.is_valid('saml', 300)
+    assert cache.is_valid('expiring', 0)
+    assert not cache.is_valid('expiring', 300)
+    assert not cache.is_batch_valid(300)
+    cache.set_batch(['saml'])
+    assert cache.is_batch_valid(300)
+    cache.save()
+    assert store(logging.getLogger('test'), cache_file).is_batch_valid(300)
+
+
+def test_concurrent_saves(tmpdir):
+    print("running concurrent credential cache writers test")
+    cache_file = os.path.join(str(tmpdir), 'cache.json')
+    errors = []
+
+    def writer(number):
+        try:
+            for i in range(20):
+                cache = CredentialCache(logging.getLogger('test'), cache_file)
+                cache.load()
+                cache.store('profile{0}-{1}'.format(number, i), 'arn:aws:iam::111111111111:role/Admin', credentials(55))
+                cache.save()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=writer, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    # no profile stored by another writer is lost and no temporary file is left behind
+    assert len(CredentialCache(logging.getLogger('test'), cache_file).profiles()) == 160
+    assert sorted(os.listdir(str(tmpdir))) == ['cache.json', 'cache.json.lock']
+
+
+def test_sqlite_cache_size(tmpdir):
+    print("running sqlite credential cache test with many profiles")
+    cache = SqliteCredentialCache(logging.getLogger('test'), os.path.join(str(tmpdir), 'cache.db'))
+    for i in range(2000):
+        cache.store('profile{0}'.format(i), 'arn:aws:iam::111111111111:role/Role{0}'.format(i), credentials(55))
+    cache.save()
+    cache = SqliteCredentialCache(logging.getLogger('test'), os.path.join(str(tmpdir), 'cache.db'))
+    assert cache.is_valid('profile1999', 300)
+    assert cache.get('profile42')['RoleArn'].endswith('Role42')
+    assert cache.get('missing') is None
+
+
+def test_sqlite_concurrent_writers(tmpdir):
+    print("running sqlite credential cache writers test")
+    cache_file = os.path.join(str(tmpdir), 'cache.db')
+    first = SqliteCredentialCache(logging.getLogger('test'), cache_file)
+    first.store('first', 'arn:aws:iam::111111111111:role/Admin', credentials(55))
+    first.set_batch(['first'])
+    assert first.get('first')['RoleArn'] == 'arn:aws:iam::111111111111:role/Admin'
+    assert first.is_batch_valid(300)
+
+    # the stored but not yet saved profile of the first writer does not lock the database
+    second = SqliteCredentialCache(logging.getLogger('test'), cache_file)
+    second.store('second', 'arn:aws:iam::111111111111:role/Admin', credentials(55))
+    second.save()
+    assert second.get('first') is None
+    assert first.profiles() == ['first', 'second']
+
+    first.save()
+    cache = SqliteCredentialCache(logging.getLogger('test'), cache_file)
+    assert cache.profiles() == ['first', 'second']
+    assert cache.is_batch_valid(300)
+
+
+def test_cache_string_expiration(tmpdir):
+    print("running credential cache expiration format test")
+    cache = CredentialCache(logging.getLogger('test'), os.path.join(str(tmpdir), 'cache.json'))
+    entry = credentials(55)
+    entry['Expiration'] = '2000-01-01T00:00:00Z'
+    cache.store('saml', 'arn:aws:iam::111111111111:role/Admin', entry)
+    assert not cache.is_valid('saml')
+
+
+def test_assertion_cache(tmpdir):
+    print("running assertion cache test")
+    cache_file = os.path.join(str(tmpdir), 'assertion.json')
+    cache = AssertionCache(logging.getLogger('test'), cache_file)
+    assert cache.get('https://adfs') is None
+    not_on_or_after = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=5)
+    cache.store('https://adfs', 'assertion', not_on_or_after)
+    assert stat.S_IMODE(os.stat(cache_file).st_mode) == 0o600
+    assert cache.get('https://adfs') == 'assertion'
+    assert cache.get('https://other') is None
+    assert cache.get('https://adfs', margin=600) is None
+    cache.store('https://adfs', 'assertion', not_on_or_after, username='user@example.com')
+    assert cache.get('https://adfs', username='user@example.com') == 'assertion'
+    assert cache.get('https://adfs', username='admin@example.com') is None
+    assert cache.get('https://adfs') is None
+    cache.clear()
+    assert cache.get('https://adfs') is None
@@ -0,0 +1,103 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import configparser
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from aws_adfs_auth.credentials_file import CredentialsFile
+from tests.benchmark import CHECK_BUDGETS
+
+EXISTING = """# managed by hand, keep this comment
+[default]
+aws_access_key_id = AKIDDEFAULT
+aws_secret_access_key = default-secret
+; inline section comment
+region = eu-central-1
+
+[saml]
+aws_access_key_id = OLD
+aws_secret_access_key = old-secret
+"""
+
+
+def values(key):
+    return OrderedDict([('aws_access_key_id', key), ('aws_secret_access_key', key.lower()), ('aws_session_token', 'token')])
+
+
+def test_incremental_update(tmpdir):
+    print("running credentials file update test")
+    filename = os.path.join(str(tmpdir), 'credentials')
+    with open(filename, 'w') as credentials_file:
+        credentials_file.write(EXISTING)
+    os.chmod(filename, 0o600)
+    CredentialsFile(logging.getLogger('test'), filename).update({'saml': values('NEW'), 'other': values('OTHER')})
+
+    with open(filename) as credentials_file:
+        content = credentials_file.read()
+    assert content.startswith(EXISTING.split('[saml]')[0])
+    assert '; inline section comment' in content
+    assert oct(os.stat(filename).st_mode & 0o777) == oct(0o600)
+
+    credentials = configparser.RawConfigParser()
+    credentials.read(filename)
+    assert credentials.sections() == ['default', 'saml', 'saml.backup', 'other']
+    assert credentials.get('saml', 'aws_access_key_id') == 'NEW'
+    assert credentials.get('saml', 'aws_session_token') == 'token'
+    assert credentials.get('saml.backup', 'aws_access_key_id') == 'OLD'
+    assert credentials.get('other', 'aws_secret_access_key') == 'other'
+
+    # the backup is only taken once
+    CredentialsFile(logging.getLogger('test'), filename).update({'saml': values('NEWER')})
+    credentials = configparser.RawConfigParser()
+    credentials.read(filename)
+    assert credentials.get('saml', 'aws_access_key_id') == 'NEWER'
+    assert credentials.get('saml.backup', 'aws_access_key_id') == 'OLD'
+    assert not [name for name in os.listdir(str(tmpdir)) if name.startswith('.credentials.')]
+
+
+def writer(filename, worker, rounds):
+    credentials_file = CredentialsFile(logging.getLogger('test'), filename)
+    for i in range(rounds):
+        credentials_file.update({'worker{0}'.format(worker): values('KEY{0}x{1}'.format(worker, i)),
+                                 'shared': values('SHARED{0}x{1}'.format(worker, i))})
+
+
+def test_concurrent_updates(tmpdir):
+    print("running credentials file concurrency stress test")
+    filename = os.path.join(str(tmpdir), 'credentials')
+    with open(filename, 'w') as credentials_file:
+        credentials_file.write(EXISTING)
+    workers, rounds = 8, 25
+    processes = [multiprocessing.Process(target=writer, args=(filename, worker, rounds)) for worker in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    credentials = configparser.RawConfigParser()
+    credentials.read(filename)
+    for worker in range(workers):
+        assert credentials.get('worker{0}'.format(worker), 'aws_access_key_id') == 'KEY{0}x{1}'.format(worker, rounds - 1)
+    assert credentials.get('shared', 'aws_access_key_id').endswith('x{0}'.format(rounds - 1))
+    assert credentials.get('default', 'aws_access_key_id') == 'AKIDDEFAULT'
+    # every profile and its backup exactly once, nothing lost or duplicated
+    assert len(credentials.sections()) == 4 + 2 * workers
+
+
+def test_many_profiles(tmpdir):
+    print("running credentials file test with many profiles")
+    filename = os.path.join(str(tmpdir), 'credentials')
+    profiles = OrderedDict(('profile{0}'.format(i), values('KEY{0}'.format(i))) for i in range(1000))
+    CredentialsFile(logging.getLogger('test'), filename).update(profiles)
+    start = time.monotonic()
+    CredentialsFile(logging.getLogger('test'), filename).update(profiles)
+    # a single pass over the file, not one per profile
+    if CHECK_BUDGETS:
+        assert time.monotonic() - start < 1.0
+    credentials = configparser.RawConfigParser()
+    credentials.read(filename)
+    assert len(credentials.sections()) == 2000
+    assert credentials.get('profile999.backup', 'aws_access_key_id') == 'KEY999'
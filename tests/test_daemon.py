@@ -0,0 +1,78 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import logging
+import threading
+from aws_adfs_auth.daemon import RefreshDaemon
+from aws_adfs_auth.ms_adfs import MicrosoftADFS
+from tests.mock_adfs import MockADFSServer, MockSTSServer
+from tests.test_ms_adfs import make_config, patch_adfs
+
+
+def test_daemon_refresh(tmpdir, monkeypatch):
+    print("running daemon refresh test")
+    logins = []
+    patch_adfs(monkeypatch, tmpdir, logins, stub_sts=False)
+    monkeypatch.setattr('builtins.input', lambda prompt='': '0')
+    with MockADFSServer(role_count=1) as adfs_server, MockSTSServer() as sts_server:
+        config = make_config(tmpdir, adfs_server.url)
+        config.set('aws', 'sts_client', 'native')
+        config.set('aws', 'sts_endpoint', sts_server.url)
+        config.set('aws', 'duration_seconds', '900')
+        provider = MicrosoftADFS(logging.getLogger('test'), config).authenticate()
+        assert sts_server.requests[0]['DurationSeconds'] == '900'
+
+        daemon = RefreshDaemon(logging.getLogger('test'), config, provider.adfs)
+        assert list(daemon.profiles) == ['saml']
+        first_key = provider.adfs.cache.get('saml')['AccessKeyId']
+        assert daemon.schedule['saml'] < daemon.clock() + 900 - 300
+        assert daemon.due_profiles() == {}
+
+        # pretend the refresh is due, the ADFS session cookie is used without a new login
+        daemon.schedule['saml'] = daemon.clock() - 1
+        del adfs_server.requests[:]
+        daemon.refresh()
+        assert [method for method, path in adfs_server.requests] == ['GET']
+        assert provider.adfs.cache.get('saml')['AccessKeyId'] != first_key
+        assert daemon.schedule['saml'] > daemon.clock() + 500
+
+        # an expired ADFS session is retried with backoff, never with a prompt
+        adfs_server.sessions.clear()
+        daemon.schedule['saml'] = daemon.clock() - 1
+        daemon.refresh()
+        first_retry = daemon.schedule['saml'] - daemon.clock()
+        daemon.schedule['saml'] = daemon.clock() - 1
+        daemon.refresh()
+        assert daemon.failures['saml'] == 2
+        assert daemon.schedule['saml'] - daemon.clock() > first_retry
+        assert len(logins) == 1
+
+        # run() returns when the daemon is stopped
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        daemon.stop()
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+def test_daemon_reused_assertion(tmpdir, monkeypatch):
+    print("running daemon refresh test after a login with a reused assertion")
+    patch_adfs(monkeypatch, tmpdir, [], stub_sts=False)
+    monkeypatch.setattr('builtins.input', lambda prompt='': '0')
+    with MockADFSServer(role_count=1) as adfs_server, MockSTSServer() as sts_server:
+        config = make_config(tmpdir, adfs_server.url)
+        config.set('aws', 'sts_client', 'native')
+        config.set('aws', 'sts_endpoint', sts_server.url)
+        config.set('provider', 'reuse_assertion', 'True')
+        config.set('provider', 'assertion_file', os.path.join(str(tmpdir), 'assertion.json'))
+        MicrosoftADFS(logging.getLogger('test'), config).authenticate()
+        provider = MicrosoftADFS(logging.getLogger('test'), config).authenticate()
+        assert provider.source == 'assertion'
+
+        # the refresh opens a session with the stored cookies
+        daemon = RefreshDaemon(logging.getLogger('test'), config, provider.adfs)
+        first_key = provider.adfs.cache.get('saml')['AccessKeyId']
+        daemon.schedule['saml'] = daemon.clock() - 1
+        daemon.refresh()
+        assert daemon.failures.get('saml', 0) == 0
+        assert provider.adfs.cache.get('saml')['AccessKeyId'] != first_key
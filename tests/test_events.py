@@ -0,0 +1,78 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import logging
+from aws_adfs_auth import events
+from aws_adfs_auth.ms_adfs import MicrosoftADFS
+from tests.mock_adfs import MockADFSServer, MockSTSServer
+from tests.test_ms_adfs import make_config, patch_adfs
+
+
+def test_rotation(tmpdir):
+    print("running event log rotation test")
+    filename = os.path.join(str(tmpdir), 'events.jsonl')
+    log = events.EventLog(filename, max_bytes=1000, backups=2)
+    for i in range(100):
+        log.emit('cache', mode='login', hit=True, sequence=i)
+    assert log.files() == [filename + '.2', filename + '.1', filename]
+    assert not os.path.exists(filename + '.3')
+    assert all(os.path.getsize(name) <= 1000 for name in log.files())
+    sequences = [record['sequence'] for record in events.read(log.files())]
+    # the newest events are kept in order, the oldest ones were rotated away
+    assert sequences == list(range(100 - len(sequences), 100))
+    assert oct(os.stat(filename).st_mode & 0o777) == oct(0o600)
+
+
+def test_aggregate():
+    print("running event aggregation test")
+    records = [{'event': 'cache', 'host': 'a', 'mode': 'login', 'hit': True},
+               {'event': 'cache', 'host': 'b', 'mode': 'login', 'hit': False, 'remaining': 120},
+               {'event': 'cache', 'host': 'b', 'mode': 'credential_process', 'hit': True},
+               {'event': 'sts', 'host': 'b', 'duration': 0.2, 'error': 'Throttling'}]
+    records += [{'event': 'idp', 'host': 'b', 'idp': 'adfs.example.com', 'duration': i / 100.0} for i in range(1, 101)]
+    records += [{'event': 'login', 'host': 'b', 'source': 'session', 'duration': 1.5, 'roles': 3, 'error': None}]
+    stats = events.aggregate(records)
+    assert stats['hosts'] == 2
+    assert stats['cache']['login']['hit_ratio'] == 0.5
+    assert stats['cache']['credential_process']['hits'] == 1
+    assert stats['remaining_at_miss']['p50'] == 120
+    assert stats['idp']['adfs.example.com']['p50'] == 0.5
+    assert stats['idp']['adfs.example.com']['p99'] == 0.99
+    assert stats['sts']['count'] == 0
+    assert stats['errors'] == {'Throttling': 1}
+    assert stats['login']['sources'] == {'session': 1}
+    assert 'adfs.example.com' in events.table(stats)
+
+
+def test_login_events(tmpdir, monkeypatch):
+    print("running login event test")
+    patch_adfs(monkeypatch, tmpdir, [], stub_sts=False)
+    filename = os.path.join(str(tmpdir), 'events.jsonl')
+    monkeypatch.setattr(events.LOG, 'filename', filename)
+    with MockADFSServer() as adfs, MockSTSServer() as sts:
+        config = make_config(tmpdir, adfs.url)
+        config.set('aws', 'sts_client', 'native')
+        config.set('aws', 'sts_endpoint', sts.url)
+        options = argparse.Namespace(role='100000000000:Role1', non_interactive=True)
+        MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+        MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+
+        sts.failures.append('AccessDenied')
+        try:
+            MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+        except Exception:
+            pass
+
+    records = list(events.read([filename]))
+    assert [(record['event'], record.get('method')) for record in records[:5]] == \
+        [('login_start', None), ('idp', 'GET'), ('idp', 'POST'), ('sts', None), ('login', None)]
+    assert len([record for record in records if record['event'] == 'login_start']) == 3
+    logins = [record for record in records if record['event'] == 'login']
+    assert [login['source'] for login in logins] == ['login', 'session', 'session']
+    assert logins[0]['roles'] == 3
+    assert logins[0]['idp'] == adfs.url.split('/')[2]
+    assert logins[2]['error'] == 'StsRequestError'
+    assert [record['error'] for record in records if record['event'] == 'sts'] == [None, None, 'AccessDenied']
+    assert json.dumps(events.aggregate(records))
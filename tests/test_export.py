@@ -0,0 +1,28 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+from aws_adfs_auth import export
+
+ENTRY = {'RoleArn': 'arn:aws:iam::111111111111:role/Admin', 'AccessKeyId': 'AKID', 'SecretAccessKey': 'se"cr$et',
+         'SessionToken': 'token', 'Expiration': '2030-01-01T00:00:00Z'}
+
+
+def test_render():
+    print("running export render test")
+    lines = export.render({'saml': ENTRY}, 'env', 'eu-west-1').splitlines()
+    assert "export AWS_SECRET_ACCESS_KEY='se\"cr$et'" in lines
+    assert 'export AWS_DEFAULT_REGION=eu-west-1' in lines
+    lines = export.render({'saml': ENTRY, 'prod-admin': ENTRY}, 'dotenv').splitlines()
+    assert 'AWS_SECRET_ACCESS_KEY_PROD_ADMIN="se\\"cr$et"' in lines
+    assert not any(line.startswith('AWS_REGION') for line in lines)
+    assert json.loads(export.render({'saml': ENTRY}, 'json'))['saml']['RoleArn'] == ENTRY['RoleArn']
+
+
+def test_environment():
+    print("running exec environment test")
+    env = export.environment(ENTRY, 'eu-west-1', base={'AWS_PROFILE': 'saml', 'PATH': '/bin'})
+    assert 'AWS_PROFILE' not in env
+    assert env['PATH'] == '/bin'
+    assert env['AWS_SESSION_TOKEN'] == 'token'
+    assert export.profile_for_role('Production:Admin') == 'Production-Admin'
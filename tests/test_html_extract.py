@@ -0,0 +1,75 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import pytest
+from aws_adfs_auth import html_extract
+from tests.mock_adfs import LOGIN_PAGE, SAML_PAGE, make_assertion, role_arns
+
+PADDING = ('<p>' + 'x' * 80 + '</p>\n') * 5000
+
+
+def chunks(page, size=16384):
+    data = page.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_login_form():
+    print("running login form extraction test")
+    page = html_extract.extract(chunks(LOGIN_PAGE.format(action='/adfs/ls/?a=1&amp;b=2', padding='', error='')),
+                                stop_after_form='loginForm')
+    form = page.get_form('loginForm')
+    assert form.action == '/adfs/ls/?a=1&b=2'
+    assert form.method == 'POST'
+    assert list(form.fields.items()) == [('UserName', ''), ('Password', ''), ('AuthMethod', 'FormsAuthentication')]
+    assert page.saml_response is None
+
+
+def test_saml_response_stops_early():
+    print("running SAMLResponse extraction test")
+    assertion = make_assertion(role_arns(3))
+    page_chunks = chunks(SAML_PAGE.format(assertion=assertion, padding=PADDING))
+    consumed = []
+
+    def stream():
+        for chunk in page_chunks:
+            consumed.append(chunk)
+            yield chunk
+    page = html_extract.extract(stream())
+    assert page.saml_response == assertion
+    assert len(consumed) < len(page_chunks)
+
+
+def test_benchmark_against_robobrowser():
+    robobrowser = pytest.importorskip('robobrowser')
+    import requests
+    print("running extraction benchmark against RoboBrowser")
+    assertion = make_assertion(role_arns(200))
+    pages = {'login': LOGIN_PAGE.format(action='/adfs/ls/', padding=PADDING, error=''),
+             'saml': SAML_PAGE.format(assertion=assertion, padding=PADDING)}
+    for name, page in pages.items():
+        response = requests.Response()
+        response._content = page.encode('utf-8')
+        response.encoding = 'utf-8'
+        response.status_code = 200
+
+        start = time.perf_counter()
+        for i in range(5):
+            browser = robobrowser.RoboBrowser(parser='lxml')
+            browser._update_state(response)
+            form = browser.get_form(id='loginForm')
+            saml = [tag.get('value') for tag in browser.find_all('input') if tag.get('name') == 'SAMLResponse']
+        robobrowser_time = (time.perf_counter() - start) / 5
+
+        start = time.perf_counter()
+        for i in range(5):
+            extracted = html_extract.extract(chunks(page), stop_after_form='loginForm')
+        extract_time = (time.perf_counter() - start) / 5
+
+        print('{0:6s} page ({1} kB): RoboBrowser {2:8.2f} ms, html_extract {3:8.2f} ms'.format(
+            name, len(page) // 1024, robobrowser_time * 1000, extract_time * 1000))
+        if form is None:
+            assert extracted.get_form('loginForm') is None
+        else:
+            assert extracted.get_form('loginForm').action == form.action
+        assert extracted.saml_response == (saml[0] if saml else None)
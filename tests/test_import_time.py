@@ -0,0 +1,67 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import subprocess
+from tests.benchmark import CHECK_BUDGETS
+from tests.test_main import ROOT, setup_home, store_credentials
+
+# generous budget for the cumulative import time of aws_adfs_auth.main, it is ~30ms on a laptop
+IMPORT_BUDGET_US = 250000
+
+HEAVY_MODULES = ['boto3', 'botocore', 'requests', 'urllib3', 'xml.etree.ElementTree', 'aws_adfs_auth.ms_adfs']
+
+SCRIPT = """
+import builtins, json, sys
+def no_input(prompt=''):
+    raise SystemExit(0)
+builtins.input = no_input
+sys.argv = ['aws_adfs_auth'] + sys.argv[1:]
+from aws_adfs_auth.main import main
+try:
+    main()
+except SystemExit:
+    pass
+sys.stderr.write('HEAVY=' + json.dumps([m for m in %r if m in sys.modules]) + '\\n')
+""" % HEAVY_MODULES
+
+
+def run_importtime(home, *args):
+    env = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', SCRIPT] + list(args), env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                            universal_newlines=True, timeout=60)
+    cumulative = 0
+    heavy = None
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and line.split('|')[2].strip() == 'aws_adfs_auth.main':
+            cumulative = int(line.split('|')[1])
+        if line.startswith('HEAVY='):
+            heavy = json.loads(line[len('HEAVY='):])
+    return cumulative, heavy
+
+
+def check(home, *args):
+    cumulative, heavy = run_importtime(home, *args)
+    print('{0:20s}: aws_adfs_auth.main imported in {1:6.1f} ms'.format(' '.join(args) or '(cache hit)', cumulative / 1000.0))
+    assert heavy == []
+    assert cumulative > 0
+    if CHECK_BUDGETS:
+        assert cumulative < IMPORT_BUDGET_US
+
+
+def test_import_time_version(tmpdir):
+    print("running import time test for --version")
+    check(setup_home(tmpdir), '--version')
+
+
+def test_import_time_configure(tmpdir):
+    print("running import time test for --configure")
+    check(setup_home(tmpdir), '--configure')
+
+
+def test_import_time_cache_hit(tmpdir):
+    print("running import time test for a cache hit")
+    home = setup_home(tmpdir)
+    store_credentials(home, 'saml')
+    check(home)
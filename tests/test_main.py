@@ -0,0 +1,211 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import configparser
+import datetime
+import json
+import logging
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CONFIG = """[provider]
+name = Microsoft
+idpentryurl = https://adfs.example.com/adfs/ls/IdpInitiatedSignOn.aspx
+profile_name = saml
+
+[aws]
+credentials_file = {home}/.aws/credentials
+sslverification = True
+region = eu-west-1
+outputformat = json
+set_environment_variables = False
+environment_file = {home}/.aws/environment.sh
+
+[info]
+version = 0.4.0
+"""
+
+
+def setup_home(tmpdir):
+    home = str(tmpdir)
+    os.makedirs(os.path.join(home, '.aws'))
+    with open(os.path.join(home, '.aws', 'adfs_auth.ini'), 'w') as config_file:
+        config_file.write(CONFIG.format(home=home))
+    return home
+
+
+def store_credentials(home, profile, minutes=55):
+    from aws_adfs_auth.cache import CredentialCache
+    cache = CredentialCache(logging.getLogger('test'), os.path.join(home, '.aws', 'adfs_auth_cache.json'))
+    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=minutes)
+    cache.store(profile, 'arn:aws:iam::111111111111:role/Admin',
+                {'AccessKeyId': 'AKID', 'SecretAccessKey': 'secret', 'SessionToken': 'token', 'Expiration': expiration})
+    cache.save()
+
+
+def run(home, *args):
+    env = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, '-c', 'from aws_adfs_auth.main import main; main()'] + list(args),
+                          env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                          universal_newlines=True, timeout=60)
+
+
+def test_cached_run(tmpdir):
+    print("running cached run test")
+    home = setup_home(tmpdir)
+    store_credentials(home, 'saml')
+    result = run(home)
+    assert result.returncode == 0
+    assert 'cached credentials are still valid' in result.stdout
+
+
+def test_credential_process(tmpdir):
+    print("running credential_process test")
+    home = setup_home(tmpdir)
+    store_credentials(home, 'other')
+    result = run(home, '--credential-process', '--profile', 'other')
+    assert result.returncode == 0
+    document = json.loads(result.stdout)
+    assert document['Version'] == 1
+    assert document['AccessKeyId'] == 'AKID'
+    assert document['SessionToken'] == 'token'
+    assert not os.path.exists(os.path.join(home, '.aws', 'credentials'))
+
+
+def test_timings(tmpdir):
+    print("running timings report test")
+    home = setup_home(tmpdir)
+    store_credentials(home, 'saml')
+    result = run(home, '--timings')
+    assert result.returncode == 0
+    assert result.stderr.splitlines()[0].split() == ['phase', 'count', 'total[ms]', 'max[ms]', 'share']
+    assert [line.split()[0] for line in result.stderr.splitlines()[1:]] == ['total', 'config']
+
+    timings_file = os.path.join(home, 'timings.jsonl')
+    run(home, '--timings', 'json', '--timings-file', timings_file)
+    run(home, '--timings', 'json', '--timings-file', timings_file)
+    with open(timings_file) as spans:
+        spans = [json.loads(line) for line in spans]
+    assert len(set(span['run'] for span in spans)) == 2
+    assert [span['phase'] for span in spans if span['parent'] is None] == ['total', 'total']
+
+
+def test_export(tmpdir):
+    print("running export test")
+    home = setup_home(tmpdir)
+    store_credentials(home, 'saml')
+    result = run(home, 'export')
+    assert result.returncode == 0
+    assert result.stdout.splitlines()[:3] == ['export AWS_ACCESS_KEY_ID=AKID', 'export AWS_SECRET_ACCESS_KEY=secret',
+                                              'export AWS_SESSION_TOKEN=token']
+    assert 'export AWS_REGION=eu-west-1' in result.stdout.splitlines()
+
+    store_credentials(home, 'Production-Admin')
+    store_credentials(home, 'expired', minutes=-5)
+    result = run(home, 'export', '--format', 'dotenv')
+    assert 'AWS_ACCESS_KEY_ID_PRODUCTION_ADMIN="AKID"' in result.stdout.splitlines()
+    assert 'AWS_SESSION_TOKEN_SAML="token"' in result.stdout.splitlines()
+    assert 'EXPIRED' not in result.stdout
+
+    export_file = os.path.join(home, 'credentials.json')
+    assert run(home, 'export', '--format', 'json', '--output', export_file, 'saml').returncode == 0
+    with open(export_file) as exported:
+        assert json.load(exported)['saml']['SessionToken'] == 'token'
+
+    result = run(home, 'export', 'saml', 'expired')
+    assert result.returncode == 1
+    assert 'No valid credentials for expired' in result.stdout
+
+
+def test_exec(tmpdir):
+    print("running exec test")
+    home = setup_home(tmpdir)
+    store_credentials(home, 'other')
+    script = 'import os; print(os.environ["AWS_ACCESS_KEY_ID"], os.environ["AWS_REGION"], "AWS_PROFILE" in os.environ)'
+    result = run(home, 'exec', '--role', '111111111111:Admin', '--', sys.executable, '-c', script)
+    assert result.returncode == 0
+    assert result.stdout == 'AKID eu-west-1 False\n'
+    result = run(home, 'exec', '--profile', 'other', '--', sys.executable, '-c', 'import sys; sys.exit(3)')
+    assert result.returncode == 3
+    assert not os.path.exists(os.path.join(home, '.aws', 'credentials'))
+
+
+def test_export_ini(tmpdir):
+    print("running ini export test")
+    home = setup_home(tmpdir)
+    store_credentials(home, 'saml')
+    result = run(home, 'export', '--format', 'ini')
+    assert result.stdout.splitlines()[:3] == ['[saml]', 'output = json', 'region = eu-west-1']
+
+    credentials_file = os.path.join(home, '.aws', 'credentials')
+    with open(credentials_file, 'w') as credentials:
+        credentials.write('[default]\naws_access_key_id = AKIDDEFAULT\n')
+    assert run(home, 'export', '--format', 'ini', '--output', credentials_file).returncode == 0
+    with open(credentials_file) as credentials:
+        content = credentials.read()
+    assert content.startswith('[default]\naws_access_key_id = AKIDDEFAULT\n')
+    assert 'aws_session_token = token' in content
+
+
+def test_stats(tmpdir):
+    print("running event log stats test")
+    home = setup_home(tmpdir)
+    with open(os.path.join(home, '.aws', 'adfs_auth.ini'), 'a') as config_file:
+        config_file.write('\n[events]\nenabled = True\n')
+    store_credentials(home, 'saml')
+    result = run(home, 'stats')
+    assert result.returncode == 1
+    assert 'No event log found' in result.stdout
+
+    assert run(home).returncode == 0
+    assert run(home, '--credential-process').returncode == 0
+    result = run(home, 'stats')
+    assert result.returncode == 0
+    assert 'login' in result.stdout and 'credential_process' in result.stdout
+
+    stats = json.loads(run(home, 'stats', '--json').stdout)
+    assert stats['hosts'] == 1
+    assert stats['cache']['login'] == {'hits': 1, 'misses': 0, 'hit_ratio': 1.0}
+    assert stats['cache']['credential_process']['hit_ratio'] == 1.0
+
+
+def test_cached_role(tmpdir):
+    print("running cached role test")
+    from aws_adfs_auth import main
+    from aws_adfs_auth.cache import CredentialCache
+    config = configparser.RawConfigParser()
+    config.read_dict({'provider': {'profile_name': 'saml'},
+                      'aws': {'credential_cache_file': os.path.join(str(tmpdir), 'cache.json')}})
+    cache = CredentialCache(logging.getLogger('test'), config.get('aws', 'credential_cache_file'))
+    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=55)
+    cache.store('saml', 'arn:aws:iam::111111111111:role/Admin',
+                {'AccessKeyId': 'AKID', 'SecretAccessKey': 'secret', 'SessionToken': 'token', 'Expiration': expiration})
+    cache.save()
+
+    def cached(role):
+        options = argparse.Namespace(force=False, all_roles=False, credential_process=False, command=None,
+                                     profile=None, role=role)
+        return main.credentials_cached(logging.getLogger('test'), config, options)
+    assert cached(None)
+    assert cached('111111111111:Admin')
+    assert cached('arn:aws:iam::111111111111:role/Admin')
+    # the cached credentials of another role must not be taken for the requested one
+    assert not cached('arn:aws:iam::222222222222:role/Other')
+    assert not cached('111111111111:ReadOnly')
+
+
+def test_credential_process_error(tmpdir):
+    print("running credential_process error test")
+    home = setup_home(tmpdir)
+    config_file = os.path.join(home, '.aws', 'adfs_auth.ini')
+    with open(config_file) as config:
+        content = config.read().replace('https://adfs.example.com/adfs/ls/IdpInitiatedSignOn.aspx', 'http://127.0.0.1:1/')
+    with open(config_file, 'w') as config:
+        config.write(content + '\n[transport]\nretries = 0\n')
+    # the SDKs only show stderr, stdout must stay empty
+    result = run(home, '--credential-process', '--profile', 'missing')
+    assert result.returncode == 1
+    assert result.stdout == ''
+    assert 'could not reach the IdP' in result.stderr
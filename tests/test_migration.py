@@ -0,0 +1,72 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import configparser
+import logging
+from aws_adfs_auth import configuration
+from aws_adfs_auth.configuration import Configure
+from aws_adfs_auth.ms_adfs import MicrosoftADFS
+from tests.mock_adfs import MockADFSServer
+from tests.test_ms_adfs import make_config, patch_adfs
+
+CONFIG_020 = """[provider]
+name = Microsoft
+idpentryurl = https://adfs.example.com/adfs/ls/IdpInitiatedSignOn.aspx
+
+[aws]
+region = eu-west-1
+"""
+
+
+def make_configure(tmpdir, monkeypatch, content):
+    config_file = os.path.join(str(tmpdir), 'adfs_auth.ini')
+    with open(config_file, 'w') as adfs_auth_config_file:
+        adfs_auth_config_file.write(content)
+    monkeypatch.setattr(Configure, 'aws_folder', str(tmpdir))
+    monkeypatch.setattr(Configure, 'aws_adfs_auth_config_file', config_file)
+    return Configure(logging.getLogger('test'))
+
+
+def test_migrate_all_versions(tmpdir, monkeypatch):
+    print("running configuration migration test")
+    reads = []
+    read = configparser.RawConfigParser.read
+    monkeypatch.setattr(configuration.configparser.RawConfigParser, 'read',
+                        lambda self, filenames, encoding=None: reads.append(filenames) or read(self, filenames, encoding))
+    configure = make_configure(tmpdir, monkeypatch, CONFIG_020)
+    assert configure.check_config()
+    config = configure.open_config()
+    # all pending migrations are applied in one run with a single write
+    assert configure.migrate(config) is True
+    assert len(reads) == 1
+
+    migrated = configparser.RawConfigParser()
+    migrated.read(configure.aws_adfs_auth_config_file)
+    assert migrated.get('info', 'version') == '0.4.0'
+    assert migrated.get('provider', 'profile_name') == 'saml'
+    assert migrated.get('aws', 'set_environment_variables') == 'False'
+    assert migrated.get('aws', 'region') == 'eu-west-1'
+
+    # the latest version is not written again
+    before = os.stat(configure.aws_adfs_auth_config_file)
+    configure = Configure(logging.getLogger('test'))
+    assert configure.migrate(configure.open_config()) is False
+    assert configure.store_config(configure.open_config()) is False
+    after = os.stat(configure.aws_adfs_auth_config_file)
+    assert (before.st_ino, before.st_mtime_ns) == (after.st_ino, after.st_mtime_ns)
+
+
+def test_login_keeps_config(tmpdir, monkeypatch):
+    print("running config rewrite on login test")
+    store_config = Configure.store_config
+    patch_adfs(monkeypatch, tmpdir, [])
+    monkeypatch.setattr(Configure, 'store_config', store_config)
+    monkeypatch.setattr('builtins.input', lambda prompt='': '0')
+    with MockADFSServer() as server:
+        config = make_config(tmpdir, server.url)
+        configure = make_configure(tmpdir, monkeypatch, '')
+        configure.store_config(config)
+        before = os.stat(configure.aws_adfs_auth_config_file)
+        MicrosoftADFS(logging.getLogger('test'), config).authenticate()
+        after = os.stat(configure.aws_adfs_auth_config_file)
+        assert (before.st_ino, before.st_mtime_ns) == (after.st_ino, after.st_mtime_ns)
@@ -0,0 +1,156 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import configparser
+import logging
+import stat
+import pytest
+from aws_adfs_auth import abstract_adfs, cache, role_selection
+from aws_adfs_auth.ms_adfs import MicrosoftADFS
+from tests.mock_adfs import MockADFSServer
+
+
+def make_config(tmpdir, url):
+    config = configparser.RawConfigParser()
+    config.read_dict({
+        'provider': {'name': 'Microsoft', 'idpentryurl': url, 'profile_name': 'saml',
+                     'cookie_file': os.path.join(str(tmpdir), 'cookies')},
+        'aws': {'credentials_file': os.path.join(str(tmpdir), 'credentials'), 'region': 'eu-west-1',
+                'outputformat': 'json', 'set_environment_variables': 'False'},
+        'msadfs': {'username': 'user@example.com'},
+    })
+    return config
+
+
+def patch_adfs(monkeypatch, tmpdir, logins, stub_sts=True):
+    def get_username_password(self):
+        logins.append(1)
+        self.username, self.password = 'user@example.com', 'secret'
+        return self.username, self.password
+
+    def assume_role(self, role_arn, principal_arn, assertion):
+        return {'Credentials': {'AccessKeyId': 'AKID', 'SecretAccessKey': 'secret', 'SessionToken': 'token',
+                                'Expiration': '2100-01-01T00:00:00Z'}}
+    monkeypatch.setattr(abstract_adfs.AbstractADFS, 'get_username_password', get_username_password)
+    if stub_sts:
+        monkeypatch.setattr(abstract_adfs.AbstractADFS, 'assume_role', assume_role)
+    monkeypatch.setattr(abstract_adfs.configuration.Configure, 'store_config', lambda self, config: None)
+    monkeypatch.setattr(cache.CredentialCache, 'cache_file', os.path.join(str(tmpdir), 'cache.json'))
+    monkeypatch.setattr(role_selection.RoleHistory, 'history_file', os.path.join(str(tmpdir), 'roles.json'))
+
+
+def test_session_reuse(tmpdir, monkeypatch):
+    print("running ADFS session reuse test")
+    logins = []
+    patch_adfs(monkeypatch, tmpdir, logins)
+    monkeypatch.setattr('builtins.input', lambda prompt='': '0')
+    with MockADFSServer() as server:
+        config = make_config(tmpdir, server.url)
+        MicrosoftADFS(logging.getLogger('test'), config).authenticate()
+        assert [method for method, path in server.requests] == ['GET', 'POST']
+        assert stat.S_IMODE(os.stat(config.get('provider', 'cookie_file')).st_mode) == 0o600
+
+        # the second run goes straight to the SAMLResponse with the stored cookie
+        del server.requests[:]
+        MicrosoftADFS(logging.getLogger('test'), config).authenticate()
+        assert [method for method, path in server.requests] == ['GET']
+        assert len(logins) == 1
+
+        # a rejected cookie falls back to the login form
+        server.sessions.clear()
+        del server.requests[:]
+        MicrosoftADFS(logging.getLogger('test'), config).authenticate()
+        assert [method for method, path in server.requests] == ['GET', 'POST']
+        assert len(logins) == 2
+
+    credentials = configparser.RawConfigParser()
+    credentials.read(config.get('aws', 'credentials_file'))
+    assert credentials.get('saml', 'aws_access_key_id') == 'AKID'
+
+
+def no_prompt(prompt=''):
+    raise AssertionError('prompted in non-interactive mode: ' + prompt)
+
+
+def test_non_interactive(tmpdir, monkeypatch):
+    print("running non-interactive login test")
+    monkeypatch.setattr(abstract_adfs.AbstractADFS, 'assume_role', lambda self, role_arn, principal_arn, assertion: {
+        'Credentials': {'AccessKeyId': role_arn.split(':')[4], 'SecretAccessKey': 'secret', 'SessionToken': 'token',
+                        'Expiration': '2100-01-01T00:00:00Z'}})
+    monkeypatch.setattr(abstract_adfs.configuration.Configure, 'store_config', lambda self, config: None)
+    monkeypatch.setattr(cache.CredentialCache, 'cache_file', os.path.join(str(tmpdir), 'cache.json'))
+    monkeypatch.setattr(role_selection.RoleHistory, 'history_file', os.path.join(str(tmpdir), 'roles.json'))
+    monkeypatch.setattr('builtins.input', no_prompt)
+    monkeypatch.setattr(abstract_adfs.getpass, 'getpass', no_prompt)
+    monkeypatch.setenv('AWS_ADFS_USERNAME', 'user@example.com')
+    monkeypatch.setenv('AWS_ADFS_PASSWORD', 'secret')
+    with MockADFSServer(role_count=8) as server:
+        config = make_config(tmpdir, server.url)
+        config.set('provider', 'persist_session', 'False')
+        config.add_section('aws_accounts')
+        config.set('aws_accounts', '100000000001', 'Staging')
+        options = argparse.Namespace(non_interactive=True, role='Staging:Role2', profile=None)
+        MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+        assert cache.CredentialCache(logging.getLogger('test')).get('saml')['RoleArn'] == \
+            'arn:aws:iam::100000000001:role/Role2'
+
+        options = argparse.Namespace(non_interactive=True, role='*:Role2', profile=None)
+        with pytest.raises(abstract_adfs.AuthenticationError):
+            MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+
+        # without --role the role of the profile's last run is used
+        options = argparse.Namespace(non_interactive=True, role=None, profile=None)
+        MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+
+        options = argparse.Namespace(non_interactive=True, role=None, profile='new')
+        with pytest.raises(abstract_adfs.AuthenticationError):
+            MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+
+        # a rejected login and a role_patterns setting without matches fail instead of exiting quietly
+        config.set('aws', 'role_patterns', 'Missing:*')
+        options = argparse.Namespace(non_interactive=True, role=None, profile=None, all_roles=True)
+        with pytest.raises(abstract_adfs.AuthenticationError):
+            MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+
+        monkeypatch.setenv('AWS_ADFS_PASSWORD', 'wrong')
+        options = argparse.Namespace(non_interactive=True, role='Staging:Role2', profile=None)
+        with pytest.raises(abstract_adfs.AuthenticationError):
+            MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+
+        monkeypatch.delenv('AWS_ADFS_PASSWORD')
+        with pytest.raises(abstract_adfs.AuthenticationError):
+            MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+
+
+def test_sqlite_store(tmpdir, monkeypatch):
+    print("running sqlite credential store test")
+    patch_adfs(monkeypatch, tmpdir, [])
+    monkeypatch.setattr('builtins.input', lambda prompt='': '0')
+    with MockADFSServer() as server:
+        config = make_config(tmpdir, server.url)
+        config.set('aws', 'credential_store', 'sqlite')
+        config.set('aws', 'credential_cache_file', os.path.join(str(tmpdir), 'cache.db'))
+        config.set('aws', 'write_credentials_file', 'False')
+        provider = MicrosoftADFS(logging.getLogger('test'), config).authenticate()
+    assert provider.adfs.cache.is_valid('saml', 300)
+    assert cache.create(logging.getLogger('test'), config).get('saml')['AccessKeyId'] == 'AKID'
+    assert not os.path.exists(config.get('aws', 'credentials_file'))
+
+
+def test_credential_process_prompts(tmpdir, monkeypatch):
+    print("running credential_process prompt test")
+    # the SDKs pipe stdin and stdout, neither the username nor the role can be asked for
+    monkeypatch.setattr('builtins.input', no_prompt)
+    monkeypatch.delenv('AWS_ADFS_USERNAME', raising=False)
+    config = make_config(tmpdir, 'http://127.0.0.1:1/')
+    config.remove_option('msadfs', 'username')
+    options = argparse.Namespace(credential_process=True, role=None, profile='other')
+    with pytest.raises(abstract_adfs.AuthenticationError):
+        abstract_adfs.AbstractADFS(logging.getLogger('test'), config, options).get_username_password()
+
+    patch_adfs(monkeypatch, tmpdir, [])
+    with MockADFSServer(role_count=8) as server:
+        with pytest.raises(abstract_adfs.AuthenticationError) as error:
+            MicrosoftADFS(logging.getLogger('test'), make_config(tmpdir, server.url), options).authenticate()
+        assert '--role' in str(error.value)
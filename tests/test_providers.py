@@ -0,0 +1,130 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import logging
+from importlib import metadata
+import pytest
+from aws_adfs_auth import abstract_adfs, providers
+from aws_adfs_auth.ms_adfs import MicrosoftADFS
+from tests.mock_adfs import make_assertion, role_arns
+from tests.test_main import setup_home, run
+from tests.test_ms_adfs import make_config, patch_adfs
+
+
+class StaticProvider(providers.Provider):
+    """Provider returning a fixed assertion, as a plugin would register it."""
+    name = 'Static'
+
+    logins = []
+
+    def login(self):
+        self.logins.append(1)
+        return make_assertion(role_arns(1))
+
+
+def fake_entry_points():
+    return [metadata.EntryPoint('Static', 'tests.test_providers:StaticProvider', providers.ENTRY_POINT_GROUP),
+            metadata.EntryPoint('Microsoft', 'aws_adfs_auth.ms_adfs:MicrosoftADFS', providers.ENTRY_POINT_GROUP)]
+
+
+def test_registry(monkeypatch):
+    print("running provider registry test")
+    monkeypatch.setattr(providers, 'entry_points', fake_entry_points)
+    assert providers.names() == ['Microsoft', 'Static']
+    assert providers.load('Microsoft') is MicrosoftADFS
+    assert providers.load('Static') is StaticProvider
+    with pytest.raises(providers.UnknownProviderError):
+        providers.load('Okta')
+
+
+def test_plugin_provider(tmpdir, monkeypatch):
+    print("running plugin provider test")
+    monkeypatch.setattr(providers, 'entry_points', fake_entry_points)
+    patch_adfs(monkeypatch, tmpdir, [])
+    config = make_config(tmpdir, 'http://127.0.0.1:1/')
+    config.set('provider', 'name', 'Static')
+    provider = providers.create('Static', logging.getLogger('test'), config).authenticate()
+    assert provider.adfs.cache.get('saml')['RoleArn'] == 'arn:aws:iam::100000000000:role/Role0'
+
+
+def test_unknown_provider(tmpdir):
+    print("running unknown provider test")
+    home = setup_home(tmpdir)
+    config_file = os.path.join(home, '.aws', 'adfs_auth.ini')
+    with open(config_file) as config:
+        content = config.read().replace('name = Microsoft', 'name = Okta')
+    with open(config_file, 'w') as config:
+        config.write(content)
+    result = run(home)
+    assert result.returncode == 1
+    assert 'unknown provider Okta' in result.stdout
+
+
+def test_assertion_reuse(tmpdir, monkeypatch):
+    print("running assertion reuse test")
+    patch_adfs(monkeypatch, tmpdir, [])
+    monkeypatch.setattr(StaticProvider, 'logins', [])
+    config = make_config(tmpdir, 'http://127.0.0.1:1/')
+    config.set('provider', 'reuse_assertion', 'True')
+    config.set('provider', 'assertion_file', os.path.join(str(tmpdir), 'assertion.json'))
+    roles = role_arns(2)
+    monkeypatch.setattr(StaticProvider, 'login', lambda self: self.logins.append(1) or make_assertion(roles))
+
+    StaticProvider(logging.getLogger('test'), config, argparse.Namespace(role='100000000000:Role0')).authenticate()
+    provider = StaticProvider(logging.getLogger('test'), config,
+                              argparse.Namespace(role='100000000000:Role1', profile='other')).authenticate()
+    assert len(StaticProvider.logins) == 1
+    assert provider.adfs.cache.get('other')['RoleArn'] == 'arn:aws:iam::100000000000:role/Role1'
+
+    # a role granted after the assertion was issued needs a new one, as does --force
+    roles = role_arns(3)
+    provider = StaticProvider(logging.getLogger('test'), config,
+                              argparse.Namespace(role='100000000000:Role2', profile='new')).authenticate()
+    assert len(StaticProvider.logins) == 2
+    assert provider.source == 'login'
+    StaticProvider(logging.getLogger('test'), config,
+                   argparse.Namespace(role='100000000000:Role2', profile='new', force=True)).authenticate()
+    assert len(StaticProvider.logins) == 3
+
+    # the assertion of another user of the same IdP is not reused
+    monkeypatch.setenv('AWS_ADFS_USERNAME', 'admin@example.com')
+    StaticProvider(logging.getLogger('test'), config, argparse.Namespace(role='100000000000:Role0')).authenticate()
+    assert len(StaticProvider.logins) == 4
+    monkeypatch.delenv('AWS_ADFS_USERNAME')
+
+    # an assertion which expires within the margin is not reused
+    roles = role_arns(1)
+    monkeypatch.setattr(StaticProvider, 'login', lambda self: self.logins.append(1) or make_assertion(
+        roles, not_on_or_after='2000-01-01T00:00:00.000Z'))
+    provider.assertions.clear()
+    StaticProvider(logging.getLogger('test'), config, argparse.Namespace(role='100000000000:Role0')).authenticate()
+    StaticProvider(logging.getLogger('test'), config, argparse.Namespace(role='100000000000:Role0')).authenticate()
+    assert len(StaticProvider.logins) == 6
+
+
+def test_rejected_assertion_all_roles(tmpdir, monkeypatch):
+    print("running rejected reused assertion test with all roles")
+    patch_adfs(monkeypatch, tmpdir, [])
+    monkeypatch.setattr(StaticProvider, 'logins', [])
+    config = make_config(tmpdir, 'http://127.0.0.1:1/')
+    config.set('provider', 'reuse_assertion', 'True')
+    config.set('provider', 'assertion_file', os.path.join(str(tmpdir), 'assertion.json'))
+    monkeypatch.setattr(StaticProvider, 'login', lambda self: self.logins.append(1) or make_assertion(role_arns(2)))
+    options = argparse.Namespace(all_roles=True)
+    provider = StaticProvider(logging.getLogger('test'), config, options).authenticate()
+    revoked = provider.assertions.get(provider.idp(), username=provider.username())
+
+    # STS rejects every role of the reused assertion, a new one is fetched instead of storing no profile
+    assume_role = abstract_adfs.AbstractADFS.assume_role
+
+    def reject_revoked(self, role_arn, principal_arn, assertion):
+        if assertion == revoked:
+            raise Exception('AccessDenied')
+        return assume_role(self, role_arn, principal_arn, assertion)
+    monkeypatch.setattr(abstract_adfs.AbstractADFS, 'assume_role', reject_revoked)
+    provider = StaticProvider(logging.getLogger('test'), config, options).authenticate()
+    assert len(StaticProvider.logins) == 2
+    assert provider.source == 'login'
+    assert provider.assertions.get(provider.idp(), username=provider.username()) not in (None, revoked)
+    assert len(provider.adfs.cache.profiles()) == 2
@@ -0,0 +1,93 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import logging
+import time
+from aws_adfs_auth.role_selection import RoleHistory, RolePicker, fuzzy_score
+from aws_adfs_auth.saml import SamlAssertion
+from tests.benchmark import CHECK_BUDGETS
+from tests.mock_adfs import make_assertion, role_arns
+
+
+def make_picker(tmpdir, answers):
+    history = RoleHistory(logging.getLogger('test'), os.path.join(str(tmpdir), 'roles.json'))
+    answers = list(answers)
+    return RolePicker(logging.getLogger('test'), history, input_function=lambda prompt='': answers.pop(0))
+
+
+def test_fuzzy_score():
+    print("running fuzzy matching test")
+    assert fuzzy_score('stag', '100000000001 staging:role1') > fuzzy_score('sgr1', '100000000001 staging:role1')
+    assert fuzzy_score('sgr1', '100000000001 staging:role1') is not None
+    assert fuzzy_score('prod', '100000000001 staging:role1') is None
+
+
+def test_role_history_ranking(tmpdir):
+    print("running role history ranking test")
+    assertion = SamlAssertion(make_assertion(role_arns(12)), {'100000000001': 'Staging'})
+    picker = make_picker(tmpdir, [])
+    now = time.time()
+    picker.history.record(assertion.roles[9].role_arn, now - 3600)
+    picker.history.record(assertion.roles[9].role_arn, now - 3600)
+    picker.history.record(assertion.roles[2].role_arn, now - 60)
+    picker.history.save()
+
+    # the history is keyed by ARN, so it survives a different role order in the assertion
+    history = RoleHistory(logging.getLogger('test'), picker.history.history_file)
+    ranked = RolePicker(logging.getLogger('test'), history).rank(list(reversed(assertion.roles)), now)
+    assert ranked[:2] == [assertion.roles[9], assertion.roles[2]]
+    assert history.last_used(assertion.roles) == assertion.roles[2]
+
+    # concurrent runs add their selections instead of overwriting each other's
+    first = RoleHistory(logging.getLogger('test'), picker.history.history_file)
+    second = RoleHistory(logging.getLogger('test'), picker.history.history_file)
+    first.record(assertion.roles[2].role_arn, now)
+    second.record(assertion.roles[2].role_arn, now)
+    second.record(assertion.roles[4].role_arn, now)
+    first.save()
+    second.save()
+    history = RoleHistory(logging.getLogger('test'), picker.history.history_file)
+    assert history.load()[assertion.roles[2].role_arn]['count'] == 3
+    assert history.load()[assertion.roles[9].role_arn]['count'] == 2
+    assert assertion.roles[4].role_arn in history.load()
+
+
+def test_role_picker(tmpdir):
+    print("running role picker test")
+    assertion = SamlAssertion(make_assertion(role_arns(12)), {'100000000001': 'Staging'})
+    # a filter with several matches narrows the list, then the index refers to the narrowed list
+    assert make_picker(tmpdir, ['staging', '1']).pick(assertion.roles) == assertion.roles[5]
+    # a filter with a single match selects it
+    assert make_picker(tmpdir, ['stagingrole2']).pick(assertion.roles) == assertion.roles[6]
+    # an invalid index and a filter without matches ask again
+    assert make_picker(tmpdir, ['99', 'production', '0']).pick(assertion.roles) == assertion.roles[0]
+    # a number which is not a listed index filters, e.g. by the id of an account without alias
+    assert make_picker(tmpdir, ['100000000002', '0']).pick(assertion.roles) == assertion.roles[8]
+    assert make_picker(tmpdir, ['100000000002', '3']).pick(assertion.roles) == assertion.roles[11]
+
+    picker = make_picker(tmpdir, [''])
+    picker.history.record(assertion.roles[7].role_arn)
+    assert picker.pick(assertion.roles) == assertion.roles[7]
+
+
+def test_benchmark_large_assertion(tmpdir):
+    print("running role selection benchmark")
+    for count in (200, 2000, 10000):
+        aliases = dict(('1{0:011d}'.format(account), 'account-{0}'.format(account)) for account in range(count // 4))
+        assertion = SamlAssertion(make_assertion(role_arns(count)), aliases)
+        picker = make_picker(tmpdir, [])
+        for role in assertion.roles[::50]:
+            picker.history.record(role.role_arn)
+
+        start = time.perf_counter()
+        ranked = picker.rank(assertion.roles)
+        rank_time = time.perf_counter() - start
+        start = time.perf_counter()
+        matching = picker.filter(ranked, 'account-12role3')
+        filter_time = time.perf_counter() - start
+
+        print('{0:6d} roles: rank {1:8.2f} ms, filter {2:8.2f} ms'.format(count, rank_time * 1000, filter_time * 1000))
+        assert matching[0].alias == 'account-12' and matching[0].role_name == 'Role3'
+        # selection has to stay interactive on the largest assertions
+        if CHECK_BUDGETS:
+            assert rank_time + filter_time < 0.5
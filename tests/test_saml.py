@@ -0,0 +1,41 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datetime
+from aws_adfs_auth.saml import SamlAssertion
+from tests.mock_adfs import make_assertion, role_arns
+
+
+def test_saml_assertion():
+    print("running SAML assertion model test")
+    roles = role_arns(6)
+    # some IdPs send principal_arn,role_arn
+    roles[1] = ','.join(reversed(roles[1].split(',')))
+    assertion = SamlAssertion(make_assertion(roles, not_on_or_after='2030-01-01T10:05:00.000Z', session_duration=28800),
+                              {'100000000001': 'Staging'})
+    assert [role.role_arn for role in assertion.roles] == [role.split(',')[0] for role in role_arns(6)]
+    assert assertion.roles[1].principal_arn == 'arn:aws:iam::100000000000:saml-provider/ADFS'
+    assert assertion.roles[1].resource == 'role/Role1'
+    assert assertion.roles[1].role_name == 'Role1'
+    assert [role.role_name for role in assertion.by_account['100000000001']] == ['Role0', 'Role1']
+    assert [role.account_id for role in assertion.by_role_name['Role1']] == ['100000000000', '100000000001']
+    assert len(assertion.by_alias['Staging']) == 2
+
+    assert assertion.find('Staging:Role1') == [assertion.roles[5]]
+    assert assertion.find('100000000000:Role2') == [assertion.roles[2]]
+    assert assertion.find(assertion.roles[3].role_arn) == [assertion.roles[3]]
+    assert assertion.find('Production:Role1') == []
+
+    assert assertion.not_on_or_after == datetime.datetime(2030, 1, 1, 10, 5, tzinfo=datetime.timezone.utc)
+    assert assertion.session_duration == 28800
+    assert assertion.duration() == 28800
+    assert assertion.duration(28800) == 28800
+    assert assertion.duration(100000) == 43200
+
+
+def test_saml_assertion_without_session_duration():
+    print("running SAML assertion default duration test")
+    assertion = SamlAssertion(make_assertion(role_arns(1), session_duration=''))
+    assert assertion.session_duration is None
+    assert assertion.duration() == 3600
+    assert SamlAssertion(make_assertion(role_arns(1), session_duration=1800)).duration() == 1800
@@ -0,0 +1,100 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import base64
+import gc
+import logging
+import tracemalloc
+from urllib.parse import urlencode
+from aws_adfs_auth import abstract_adfs, secret
+from aws_adfs_auth.ms_adfs import MicrosoftADFS
+from tests.mock_adfs import MockADFSServer
+from tests.test_ms_adfs import make_config, patch_adfs
+
+# only characters which are not url encoded, so that the encoded form contains it as well
+PASSWORD = 'Zq8-unique-P4ssw0rd-7Kx'
+
+
+def test_secret_buffer():
+    print("running secret buffer test")
+    for value in ['secret', 'pä ss+&=wörd€😀', '']:
+        with secret.SecretBuffer.from_str(value) as buffer:
+            assert bytes(buffer.buffer) == value.encode('utf-8')
+            assert bytes(buffer.read(3)) + bytes(buffer.read()) == value.encode('utf-8')
+            assert buffer.seek(0) == 0
+        assert buffer.buffer == bytearray(len(value.encode('utf-8')))
+        assert value not in repr(buffer) or not value
+
+
+def test_encode_form():
+    print("running form encoding test")
+    fields = {'UserName': 'user@example.com', 'Password': '', 'AuthMethod': 'FormsAuthentication'}
+    password = 'p ä&=+%/'
+    body = secret.encode_form(fields, {'Password': secret.SecretBuffer.from_str(password)})
+    assert bytes(body.buffer).decode('ascii') == urlencode(dict(fields, Password=password))
+    assert len(body) == len(body.buffer)
+
+
+def test_decode_base64():
+    print("running chunked base64 decoding test")
+    data = bytes(range(256)) * 400
+    encoded = base64.b64encode(data).decode('ascii')
+    assert b''.join(secret.decode_base64(encoded, chunk_size=1000)) == data
+    assert b''.join(secret.decode_base64(encoded[:77] + '\r\n' + encoded[77:])) == data
+
+
+def live_copies(needle):
+    """Function to return the reachable str and bytes objects (other than needle itself) containing needle."""
+    gc.collect()
+    copies = []
+    for container in gc.get_objects():
+        for value in gc.get_referents(container):
+            if value is needle or not isinstance(value, (str, bytes, bytearray)):
+                continue
+            if isinstance(value, str) and isinstance(needle, str) and needle in value:
+                copies.append(value)
+            elif not isinstance(value, str) and isinstance(needle, bytes) and needle in value:
+                copies.append(value)
+    return copies
+
+
+def test_login_secrets(tmpdir, monkeypatch):
+    print("running login secret hygiene test")
+    patch_adfs(monkeypatch, tmpdir, [])
+    monkeypatch.setattr('builtins.input', lambda prompt='': '0')
+
+    def get_username_password(self):
+        # a new str, as getpass returns it
+        self.username, self.password = 'user@example.com', ''.join(PASSWORD.split('-unique-'))
+        return self.username, self.password
+    monkeypatch.setattr(abstract_adfs.AbstractADFS, 'get_username_password', get_username_password)
+    bodies = []
+    original_encode_form = secret.encode_form
+
+    def encode_form(fields, secrets):
+        bodies.append(original_encode_form(fields, secrets))
+        return bodies[-1]
+    monkeypatch.setattr(abstract_adfs.secret, 'encode_form', encode_form)
+
+    with MockADFSServer(role_count=1000, password=''.join(PASSWORD.split('-unique-'))) as server:
+        config = make_config(tmpdir, server.url)
+        provider = MicrosoftADFS(logging.getLogger('test'), config)
+        assertion = provider.login()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            roles = provider.adfs.parse_roles(assertion)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        print("assertion of %d bytes, roles of %d bytes, peak memory %d bytes" % (len(assertion), current, peak))
+        # the decoded assertion and its tree are never held as a whole next to the encoded assertion and the roles
+        assert peak - current < 1.5 * len(assertion)
+        assert len(roles) == 1000
+        provider.adfs.handle_saml(assertion)
+        password = server.password
+        del server.password
+
+        assert [bytes(body.buffer) for body in bodies] == [bytes(len(bodies[0]))]
+        assert live_copies(password) == []
+        assert live_copies(b'SignatureValue') == []
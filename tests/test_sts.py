@@ -0,0 +1,109 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import configparser
+import json
+import logging
+import subprocess
+import pytest
+from aws_adfs_auth import abstract_adfs, sts
+from tests.mock_adfs import MockSTSServer, make_assertion, role_arns
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+ROLES = role_arns(2)
+
+BENCHMARK = """
+import json, sys, time, tracemalloc, configparser
+tracemalloc.start()
+start = time.perf_counter()
+from aws_adfs_auth import sts
+config = configparser.RawConfigParser()
+config.read_dict({'aws': {'region': 'eu-west-1', 'sts_client': sys.argv[1], 'sts_endpoint': sys.argv[2]}})
+client = sts.create_client(config)
+created = time.perf_counter()
+for i in range(20):
+    client.assume_role_with_saml(RoleArn=sys.argv[3], PrincipalArn=sys.argv[4], SAMLAssertion=sys.argv[5])
+done = time.perf_counter()
+print(json.dumps({'create': created - start, 'call': (done - created) / 20, 'peak': tracemalloc.get_traced_memory()[1]}))
+"""
+
+
+def make_config(client, endpoint):
+    config = configparser.RawConfigParser()
+    config.read_dict({'aws': {'region': 'eu-west-1', 'sts_client': client, 'sts_endpoint': endpoint}})
+    return config
+
+
+def test_native_client():
+    print("running native sts client test")
+    with MockSTSServer() as server:
+        client = sts.create_client(make_config('native', server.url))
+        assert isinstance(client, sts.StsClient)
+        role_arn, principal_arn = ROLES[1].split(',')
+        response = client.assume_role_with_saml(RoleArn=role_arn, PrincipalArn=principal_arn,
+                                                SAMLAssertion=make_assertion(ROLES), DurationSeconds=900)
+        assert response['Credentials']['AccessKeyId'].startswith('ASIA')
+        assert response['Credentials']['Expiration'].tzinfo is not None
+        assert response['AssumedRoleUser']['Arn'].endswith(':assumed-role/Role1/user@example.com')
+        assert server.requests[0]['DurationSeconds'] == '900'
+
+        with pytest.raises(sts.StsError) as error:
+            client.assume_role_with_saml(RoleArn=role_arn, PrincipalArn=principal_arn,
+                                         SAMLAssertion=make_assertion(ROLES[:1]))
+        assert error.value.code == 'AccessDenied'
+
+
+def test_session_duration(tmpdir):
+    print("running session duration test")
+    with MockSTSServer() as server:
+        config = make_config('native', server.url)
+        config.set('aws', 'credential_cache_file', os.path.join(str(tmpdir), 'cache.json'))
+        adfs = abstract_adfs.AbstractADFS(logging.getLogger('test'), config)
+        assertion = make_assertion(ROLES, session_duration=28800)
+        adfs.parse_roles(assertion)
+        role_arn, principal_arn = ROLES[1].split(',')
+        adfs.assume_role(role_arn, principal_arn, assertion)
+        assert [request['DurationSeconds'] for request in server.requests] == ['28800']
+
+        # a role with the default MaxSessionDuration gets one hour
+        server.max_session_duration = 3600
+        del server.requests[:]
+        adfs.assume_role(role_arn, principal_arn, assertion)
+        assert [request['DurationSeconds'] for request in server.requests] == ['28800', '3600']
+
+        config.set('aws', 'duration_seconds', '1800')
+        server.max_session_duration = 900
+        with pytest.raises(abstract_adfs.StsRequestError) as error:
+            adfs.assume_role(role_arn, principal_arn, assertion)
+        assert error.value.code == 'ValidationError'
+
+
+def test_regional_endpoint():
+    print("running sts endpoint selection test")
+    config = configparser.RawConfigParser()
+    config.read_dict({'aws': {'region': 'ap-southeast-2', 'sts_client': 'native'}})
+    assert sts.create_client(config).endpoint_url == 'https://sts.ap-southeast-2.amazonaws.com/'
+    config.set('aws', 'region', 'cn-north-1')
+    assert sts.create_client(config).endpoint_url == 'https://sts.cn-north-1.amazonaws.com.cn/'
+    assert sts.regional_endpoint('us-gov-west-1') == 'https://sts.us-gov-west-1.amazonaws.com/'
+    assert sts.regional_endpoint('us-isob-east-1') == 'https://sts.us-isob-east-1.sc2s.sgov.gov/'
+    assert sts.regional_endpoint(None) == 'https://sts.amazonaws.com/'
+
+
+def test_benchmark_against_boto3():
+    pytest.importorskip('boto3')
+    print("running sts client benchmark against boto3")
+    role_arn, principal_arn = ROLES[0].split(',')
+    results = {}
+    with MockSTSServer() as server:
+        for client in ('boto3', 'native'):
+            output = subprocess.check_output(
+                [sys.executable, '-c', BENCHMARK, client, server.url, role_arn, principal_arn, make_assertion(ROLES)],
+                env=dict(os.environ, PYTHONPATH=ROOT, AWS_ACCESS_KEY_ID='', AWS_SECRET_ACCESS_KEY=''),
+                universal_newlines=True, timeout=120)
+            results[client] = json.loads(output)
+            print('{0:6s}: import+create {1:7.1f} ms, call {2:6.2f} ms, peak memory {3:7.1f} kB'.format(
+                client, results[client]['create'] * 1000, results[client]['call'] * 1000,
+                results[client]['peak'] / 1024.0))
+    assert results['native']['peak'] < results['boto3']['peak']
@@ -0,0 +1,78 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import logging
+import threading
+from aws_adfs_auth import timings
+from aws_adfs_auth.ms_adfs import MicrosoftADFS
+from tests.mock_adfs import MockADFSServer, MockSTSServer
+from tests.test_ms_adfs import make_config, patch_adfs
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_spans():
+    print("running timing spans test")
+    clock = FakeClock()
+    recorder = timings.Timings(clock)
+    with recorder.span('disabled'):
+        clock.now += 1
+    recorder.enable()
+    with recorder.span('total'):
+        with recorder.span('idp_get'):
+            clock.now += 0.25
+        for i in range(3):
+            with recorder.span('sts', role_arn='arn:aws:iam::100000000000:role/Role{0}'.format(i)):
+                clock.now += 0.02 * (i + 1)
+
+        def worker():
+            with recorder.span('worker'):
+                clock.now += 0.0
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+    phases = recorder.summary()
+    assert list(phases) == ['total', 'idp_get', 'sts', 'worker']
+    assert phases['sts']['count'] == 3
+    assert abs(phases['sts']['total'] - 0.12) < 1e-9 and abs(phases['sts']['max'] - 0.06) < 1e-9
+
+    spans = [json.loads(line) for line in recorder.json_lines().splitlines()]
+    assert [(span['phase'], span['parent']) for span in spans][:3] == [('total', None), ('idp_get', 'total'), ('sts', 'total')]
+    assert spans[2]['role_arn'] == 'arn:aws:iam::100000000000:role/Role0'
+    assert spans[2]['duration_ms'] == 20.0
+    # the spans of other threads are not nested in the spans of the main thread
+    assert spans[-1]['phase'] == 'worker' and spans[-1]['parent'] is None
+
+    metrics = recorder.openmetrics().splitlines()
+    assert 'aws_adfs_auth_phase_seconds_bucket{phase="sts",le="0.05"} 2' in metrics
+    assert 'aws_adfs_auth_phase_seconds_count{phase="sts"} 3' in metrics
+    assert metrics[-1] == '# EOF'
+
+    table = recorder.table().splitlines()
+    assert table[1].split() == ['total', '1', '370.0', '370.0', '100.0%']
+
+
+def test_login_phases(tmpdir, monkeypatch):
+    print("running login phase timings test")
+    patch_adfs(monkeypatch, tmpdir, [], stub_sts=False)
+    monkeypatch.setattr(timings, 'RECORDER', timings.Timings())
+    timings.RECORDER.enable()
+    with MockADFSServer(role_count=1) as server, MockSTSServer() as sts_server:
+        config = make_config(tmpdir, server.url)
+        config.set('aws', 'sts_client', 'native')
+        config.set('aws', 'sts_endpoint', sts_server.url)
+        options = argparse.Namespace(non_interactive=True, role=None, profile=None, force=True)
+        MicrosoftADFS(logging.getLogger('test'), config, options).authenticate()
+    phases = timings.RECORDER.summary()
+    for phase in ('login', 'idp_get', 'html_parse', 'credentials', 'idp_post', 'saml_decode', 'sts',
+                  'cache_write', 'credentials_write'):
+        assert phase in phases, phase
@@ -0,0 +1,119 @@
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import configparser
+import logging
+import time
+import pytest
+import requests
+from aws_adfs_auth import html_extract, sts, transport
+from aws_adfs_auth.abstract_adfs import AbstractADFS, AuthenticationError, StsRequestError
+from aws_adfs_auth.ms_adfs import MicrosoftADFS
+from tests.mock_adfs import MockADFSServer, MockSTSServer, make_assertion, role_arns
+from tests.test_ms_adfs import make_config, patch_adfs
+
+
+def make_transport_config(**settings):
+    config = configparser.RawConfigParser()
+    config.read_dict({'aws': {'region': 'eu-west-1', 'sts_client': 'native'},
+                      'transport': dict((key, str(value)) for key, value in settings.items())})
+    return config
+
+
+def test_tls_settings():
+    print("running transport TLS settings test")
+    assert transport.Transport(make_transport_config()).session().verify is True
+    config = make_transport_config()
+    config.set('aws', 'sslverification', 'False')
+    assert transport.Transport(config).session().verify is False
+    assert transport.Transport(make_transport_config(ca_bundle='/etc/ssl/corporate.pem')).session().verify == \
+        '/etc/ssl/corporate.pem'
+    session = transport.Transport(make_transport_config(connect_timeout=2, read_timeout=7)).session()
+    assert session.timeout == (2.0, 7.0)
+
+
+def test_keep_alive(tmpdir, monkeypatch):
+    print("running keep-alive test")
+    patch_adfs(monkeypatch, tmpdir, [])
+    monkeypatch.setattr('builtins.input', lambda prompt='': '0')
+    with MockADFSServer() as server:
+        provider = MicrosoftADFS(logging.getLogger('test'), make_config(tmpdir, server.url)).authenticate()
+        # the daemon fetches new assertions with the same session
+        assert provider.adfs.fetch_assertion() is not None
+        assert [method for method, path in server.requests] == ['GET', 'POST', 'GET']
+        assert server.connections == 1
+
+
+def test_timeout(tmpdir):
+    print("running IdP timeout test")
+    with MockADFSServer(latency=2) as server:
+        config = make_config(tmpdir, server.url)
+        config.add_section('transport')
+        config.set('transport', 'read_timeout', '0.2')
+        config.set('transport', 'retries', '0')
+        start = time.monotonic()
+        with pytest.raises(AuthenticationError):
+            AbstractADFS(logging.getLogger('test'), config).init_browser()
+        assert time.monotonic() - start < 1.5
+
+
+def test_sts_retries():
+    print("running STS retry test")
+    assertion = make_assertion(role_arns(2))
+    role_arn, principal_arn = role_arns(2)[1].split(',')
+    with MockSTSServer() as server:
+        config = make_transport_config(backoff_factor=0.01)
+        config.set('aws', 'sts_endpoint', server.url)
+        client = sts.create_client(config)
+
+        server.failures.extend(['Throttling', 503])
+        response = client.assume_role_with_saml(RoleArn=role_arn, PrincipalArn=principal_arn, SAMLAssertion=assertion)
+        assert response['Credentials']['AccessKeyId'].startswith('ASIA')
+        assert len(server.requests) == 3
+        assert server.connections == 1
+
+        # errors which are not transient are not repeated
+        del server.requests[:]
+        with pytest.raises(sts.StsError) as error:
+            client.assume_role_with_saml(RoleArn=role_arn.replace('Role1', 'Other'), PrincipalArn=principal_arn,
+                                         SAMLAssertion=assertion)
+        assert error.value.code == 'AccessDenied'
+        assert len(server.requests) == 1
+
+        # a single retry layer: one attempt plus the configured retries (3), for http errors as well
+        del server.requests[:]
+        server.failures.extend(['Throttling'] * 5)
+        with pytest.raises(sts.StsError) as error:
+            client.assume_role_with_saml(RoleArn=role_arn, PrincipalArn=principal_arn, SAMLAssertion=assertion)
+        assert error.value.code == 'Throttling'
+        assert len(server.requests) == 4
+
+        del server.requests[:]
+        del server.failures[:]
+        server.failures.extend([503] * 5)
+        with pytest.raises(sts.StsError):
+            client.assume_role_with_saml(RoleArn=role_arn, PrincipalArn=principal_arn, SAMLAssertion=assertion)
+        assert len(server.requests) == 4
+
+
+def test_errors_are_authentication_errors(tmpdir, monkeypatch):
+    print("running IdP and STS error mapping test")
+    def broken_body(response, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError('connection broken')
+    with MockADFSServer() as server:
+        adfs = AbstractADFS(logging.getLogger('test'), make_config(tmpdir, server.url))
+        monkeypatch.setattr(html_extract, 'extract_response', broken_body)
+        with pytest.raises(AuthenticationError) as error:
+            adfs.init_browser()
+        assert 'could not read the response' in str(error.value)
+
+    assertion = make_assertion(role_arns(1))
+    role_arn, principal_arn = role_arns(1)[0].split(',')
+    with MockSTSServer() as server:
+        config = make_transport_config()
+        config.set('aws', 'sts_endpoint', server.url)
+        adfs = AbstractADFS(logging.getLogger('test'), config)
+        server.failures.append('AccessDenied')
+        with pytest.raises(StsRequestError) as error:
+            adfs.assume_role(role_arn, principal_arn, assertion)
+        assert error.value.code == 'AccessDenied'